@@ -0,0 +1,12 @@
+"""
+Benchmarks for the hot paths of pytech.
+
+Run every benchmark and save the results so they can be compared against
+another commit::
+
+    python -m benchmarks --output before.json
+    python -m benchmarks --compare before.json
+
+All of the market data is generated by :mod:`pytech.data.synthetic` so the
+results only depend on the code being benchmarked.
+"""
@@ -0,0 +1,76 @@
+"""
+Run the benchmarks from the command line.
+
+``python -m benchmarks --help`` for the options.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+from benchmarks import harness
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Run the pytech benchmarks.')
+    parser.add_argument('-f', '--filter', default=None,
+                        help='Only run benchmarks matching this glob, '
+                             'e.g. "technical.*"')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Where to write the JSON results. Defaults to '
+                             'benchmarks/results/<commit>.json')
+    parser.add_argument('-c', '--compare', default=None,
+                        help='A previous results file to compare against.')
+    parser.add_argument('-t', '--threshold', type=float, default=.1,
+                        help='The relative change that counts as faster or '
+                             'slower when comparing.')
+    parser.add_argument('-l', '--list', action='store_true',
+                        help='List the benchmarks and exit.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.list:
+        for bench in harness.select(args.filter):
+            print(bench.name)
+        return 0
+
+    results = harness.run(args.filter)
+    output = args.output
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR,
+                              f'{results["meta"]["commit"][:10]}.json')
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    print(f'Wrote results to {output}')
+
+    for name, result in sorted(results['results'].items()):
+        line = f'{name:<45} {result["median"] * 1000:>12.3f}ms'
+
+        if 'per_second' in result:
+            line += f' {result["per_second"]:>14,.0f}/s'
+
+        if 'bytes_per_item' in result:
+            line += f' {result["bytes_per_item"]:>10,.0f}B/item'
+
+        print(line)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        print(harness.compare(baseline, results, args.threshold).to_string())
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Benchmarks for the event driven backtest engine."""
+import datetime as dt
+import functools
+import queue
+
+from benchmarks.harness import benchmark
+from pytech.algo.strategy import BuyAndHold, CrossOverStrategy
+from pytech.backtest.backtest import Backtest
+from pytech.data.synthetic import SimulatedBars, SyntheticBars, make_tickers
+from pytech.trading.blotter import Blotter
+from pytech.utils.enums import OrderType, PersistencePolicy, TradeAction
+
+START_DATE = dt.datetime(2010, 1, 4)
+
+
+def _bars(n_tickers: int, n_days: int) -> SyntheticBars:
+    end_date = START_DATE + dt.timedelta(days=int(n_days * 7 / 5))
+    bars = SyntheticBars(queue.Queue(), make_tickers(n_tickers),
+                         START_DATE, end_date)
+    # generate the data outside of the timed section.
+    bars.ticker_data
+    return bars
+
+
+def _backtest(strategy) -> Backtest:
+    return Backtest(ticker_list=make_tickers(10),
+                    initial_capital=100000,
+                    start_date=START_DATE,
+                    end_date=START_DATE + dt.timedelta(days=365),
+                    strategy=strategy,
+                    data_handler=functools.partial(SyntheticBars, seed=0),
+                    persistence=PersistencePolicy.NONE)
+
+
+def _blotter_with_orders(n: int = 10000) -> Blotter:
+    """A blotter with ``n`` resting orders that never trigger."""
+    bars = _bars(100, 5)
+    bars.update_bars()
+    blotter = Blotter(queue.Queue())
+    blotter.bars = bars
+
+    for i in range(n):
+        ticker = bars.tickers[i % len(bars.tickers)]
+        if i % 2:
+            blotter.place_order(ticker, 100, TradeAction.BUY,
+                                OrderType.STOP, stop_price=1e6)
+        else:
+            blotter.place_order(ticker, -100, TradeAction.SELL,
+                                OrderType.STOP, stop_price=.01)
+
+    return blotter
+
+
+@benchmark(name='bars.update_bars_100x1000',
+           setup=lambda: _bars(100, 1000), repeat=3)
+def update_bars(bars):
+    while bars.continue_backtest:
+        bars.update_bars()
+
+
+@benchmark(name='simulated_bars.update_bars_5000x252', repeat=3,
+           setup=lambda: SimulatedBars(queue.Queue(), make_tickers(5000),
+                                       START_DATE,
+                                       START_DATE + dt.timedelta(days=365),
+                                       correlation=.3, jump_intensity=2))
+def simulated_update_bars(bars):
+    while bars.continue_backtest:
+        bars.update_bars()
+
+
+@benchmark(name='backtest.run_buy_and_hold',
+           setup=lambda: _backtest(BuyAndHold), repeat=3)
+def run_buy_and_hold(backtest):
+    backtest._run()
+
+
+@benchmark(name='backtest.run_cross_over',
+           setup=lambda: _backtest(CrossOverStrategy), repeat=3)
+def run_cross_over(backtest):
+    backtest._run()
+
+
+@benchmark(name='blotter.check_order_triggers_10k',
+           setup=_blotter_with_orders, repeat=5)
+def check_order_triggers(blotter):
+    blotter.check_order_triggers()
+
+
+@benchmark(name='blotter.check_order_triggers_100k',
+           setup=lambda: _blotter_with_orders(100000), repeat=5)
+def check_order_triggers_100k(blotter):
+    blotter.check_order_triggers()
@@ -0,0 +1,55 @@
+"""Benchmarks for :class:`pytech.fin.analysis.portfolio.EfficientFrontier`."""
+import numpy as np
+import pandas as pd
+
+from benchmarks.harness import benchmark
+from pytech.data.synthetic import make_ohlcv, make_tickers
+from pytech.fin.analysis.portfolio import EfficientFrontier, solve_tangency
+from pytech.utils.pandas_utils import CLOSE_COL
+
+N_TICKERS = 20
+N_BARS = 1000
+# the size of a daily mean-variance rebalance inside a backtest.
+N_NAMES = 200
+
+
+def _frontier() -> EfficientFrontier:
+    data = make_ohlcv(make_tickers(N_TICKERS), periods=N_BARS)
+    prices = pd.DataFrame({t: df[CLOSE_COL] for t, df in data.items()})
+    return EfficientFrontier(prices=prices)
+
+
+def _frontier_and_estimates():
+    frontier = _frontier()
+    return frontier, frontier._returns_covar()
+
+
+@benchmark(name='frontier.returns_covar', setup=_frontier)
+def returns_covar(frontier):
+    frontier._returns_covar()
+
+
+@benchmark(name='frontier.solve_weights', setup=_frontier_and_estimates)
+def solve_weights(args):
+    frontier, (returns, covar) = args
+    frontier._solve_weights(returns, covar)
+
+
+@benchmark(name='frontier.full', setup=_frontier, repeat=3)
+def full(frontier):
+    frontier()
+
+
+def _tangency_estimates():
+    returns = np.random.RandomState(0).normal(.0005, .01, (252, N_NAMES))
+    returns += np.random.RandomState(1).normal(0, .005, (252, 1))
+    expected = (1 + returns.mean(axis=0)) ** 252 - 1
+    covar = np.cov(returns.T) * 252
+    return expected, covar, solve_tangency(expected, covar, .015).x
+
+
+@benchmark(name='frontier.solve_tangency_200_warm',
+           setup=_tangency_estimates)
+def solve_tangency_warm(args):
+    expected, covar, last = args
+    solve_tangency(expected, covar, .015, x0=last)
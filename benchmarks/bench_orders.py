@@ -0,0 +1,93 @@
+"""Benchmarks for creating orders and trades and analyzing the trades."""
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.harness import benchmark
+from pytech.trading.commission import TieredCommissionModel
+from pytech.trading.order import LimitOrder, MarketOrder, StopOrder
+from pytech.trading.trade import Trade
+from pytech.trading.trade_log import COLUMNS, DTYPES, TradeLog
+from pytech.utils.enums import TradeAction
+
+N_ORDERS = 100000
+# enough distinct tickers to show any per ticker cost.
+TICKERS = [f'T{i:04d}' for i in range(1000)]
+TRADE_DATE = dt.datetime(2017, 1, 3)
+N_FILLS = 10000000
+N_COMMISSIONS = 1000000
+
+
+@benchmark(name='order.create_market_100k', repeat=3, items=N_ORDERS,
+           memory=True)
+def create_market_orders(_):
+    return [MarketOrder(TICKERS[i % len(TICKERS)], TradeAction.BUY, 100)
+            for i in range(N_ORDERS)]
+
+
+@benchmark(name='order.create_limit_100k', repeat=3, items=N_ORDERS,
+           memory=True)
+def create_limit_orders(_):
+    return [LimitOrder(TICKERS[i % len(TICKERS)], TradeAction.BUY, 100,
+                       limit_price=100.0 + i % 100)
+            for i in range(N_ORDERS)]
+
+
+@benchmark(name='order.create_stop_100k', repeat=3, items=N_ORDERS,
+           memory=True)
+def create_stop_orders(_):
+    return [StopOrder(TICKERS[i % len(TICKERS)], TradeAction.SELL, 100,
+                      stop_price=100.0 - i % 100)
+            for i in range(N_ORDERS)]
+
+
+def _triggered_orders():
+    return [MarketOrder(TICKERS[i % len(TICKERS)], TradeAction.BUY, 100)
+            for i in range(N_ORDERS)]
+
+
+@benchmark(name='trade.from_order_100k', setup=_triggered_orders, repeat=3,
+           items=N_ORDERS, memory=True)
+def create_trades(orders):
+    return [Trade.from_order(order, TRADE_DATE, 1.0, 100.0, 100, 100.01)
+            for order in orders]
+
+
+def _trade_log() -> TradeLog:
+    """A log of 10 million random fills."""
+    rs = np.random.RandomState(0)
+    columns = {name: np.zeros(N_FILLS, dtype=DTYPES[name])
+               for name in COLUMNS}
+    columns['timestamp'][:] = np.arange(N_FILLS) * 60 * 10 ** 9
+    columns['ticker'][:] = rs.randint(0, len(TICKERS), N_FILLS)
+    columns['side'][:] = rs.choice([-1, 1], N_FILLS)
+    columns['qty'][:] = rs.randint(1, 1000, N_FILLS)
+    columns['price'][:] = rs.uniform(10, 200, N_FILLS)
+    columns['avg_price'][:] = columns['price']
+    columns['order_id'][:] = np.arange(N_FILLS)
+
+    log = TradeLog(capacity=N_FILLS)
+    log.extend((TICKERS, [], columns))
+    return log
+
+
+@benchmark(name='trade_log.by_ticker_10m', setup=_trade_log, repeat=3,
+           items=N_FILLS)
+def trade_log_by_ticker(log):
+    log.by_ticker()
+
+
+def _fills():
+    """A million fills a minute apart, over about two months."""
+    rs = np.random.RandomState(0)
+    qty = rs.randint(1, 1000, N_COMMISSIONS)
+    price = rs.uniform(10, 200, N_COMMISSIONS)
+    dates = pd.date_range(TRADE_DATE, periods=N_COMMISSIONS, freq='min')
+    return qty, price, dates
+
+
+@benchmark(name='commission.tiered_1m', setup=_fills, repeat=3,
+           items=N_COMMISSIONS)
+def tiered_commission(fills):
+    TieredCommissionModel().calculate_many(*fills)
@@ -0,0 +1,26 @@
+"""Benchmarks for :mod:`pytech.fin.analysis.performance`."""
+import numpy as np
+import pandas as pd
+
+from benchmarks.harness import benchmark
+from pytech.fin.analysis.performance import Tearsheet
+
+# 2000 runs of 10 years of daily bars, about the size of a sweep.
+N_BARS = 252 * 10
+N_RUNS = 2000
+
+
+def _curves() -> pd.DataFrame:
+    index = pd.bdate_range('2000-01-03', periods=N_BARS)
+    returns = np.random.RandomState(0).normal(.0003, .01, (N_BARS, N_RUNS))
+    return pd.DataFrame(np.cumprod(1 + returns, axis=0), index=index)
+
+
+@benchmark(name='performance.tearsheet_2000x10y', setup=_curves, repeat=3)
+def full_tearsheet(curves):
+    sheet = Tearsheet(curves, benchmark=curves[0])
+    sheet.summary()
+    sheet.drawdown_table()
+    sheet.rolling_sharpe()
+    sheet.rolling_beta()
+    sheet.monthly_heatmap()
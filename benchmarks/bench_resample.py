@@ -0,0 +1,34 @@
+"""Benchmarks for :mod:`pytech.fin.analysis.resample`."""
+import pandas as pd
+
+from benchmarks.harness import benchmark
+from pytech.data.synthetic import make_ohlcv
+from pytech.fin.analysis.resample import bootstrap, permute_trades
+from pytech.utils.pandas_utils import CLOSE_COL
+
+# 20 years of daily bars.
+N_BARS = 252 * 20
+N_SAMPLES = 10000
+
+
+def _equity() -> pd.DataFrame:
+    close = make_ohlcv(['SYN'], periods=N_BARS)['SYN'][CLOSE_COL]
+    return pd.DataFrame({'total': close * 1000})
+
+
+def _equity_and_trades():
+    equity = _equity()
+    # a trade about once a month.
+    return equity, equity.index[::21]
+
+
+@benchmark(name='resample.bootstrap_10000x20y', setup=_equity, repeat=3)
+def bootstrap_paths(equity):
+    bootstrap(equity, n_samples=N_SAMPLES, seed=0)
+
+
+@benchmark(name='resample.permute_trades_10000x20y',
+           setup=_equity_and_trades, repeat=3)
+def permute_trade_order(args):
+    equity, trades = args
+    permute_trades(equity, trades, n_samples=N_SAMPLES, seed=0)
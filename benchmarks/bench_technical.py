@@ -0,0 +1,34 @@
+"""Benchmarks for every indicator in :mod:`pytech.fin.analysis.technical`."""
+import inspect
+
+import pandas as pd
+
+import pytech.fin.analysis.technical as technical
+from benchmarks.harness import Benchmark, register
+from pytech.data.synthetic import make_ohlcv
+
+N_BARS = 5000
+
+
+def _ohlcv() -> pd.DataFrame:
+    return make_ohlcv(['SYN'], periods=N_BARS)['SYN']
+
+
+def _indicators():
+    """Every public function defined in the technical module."""
+    for name, func in inspect.getmembers(technical, inspect.isfunction):
+        if not name.startswith('_') and func.__module__ == technical.__name__:
+            yield name, func
+
+
+def _register_all():
+    df = _ohlcv()
+
+    for name, func in _indicators():
+        # bind ``func`` now, the loop variable changes.
+        register(Benchmark(f'technical.{name}',
+                           lambda _, func=func: func(df),
+                           repeat=5))
+
+
+_register_all()
@@ -0,0 +1,238 @@
+"""A small harness to time benchmarks and compare results across commits."""
+import datetime as dt
+import fnmatch
+import gc
+import importlib
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# the modules that register benchmarks when they are imported.
+BENCHMARK_MODULES = (
+    'benchmarks.bench_engine',
+    'benchmarks.bench_technical',
+    'benchmarks.bench_frontier',
+    'benchmarks.bench_resample',
+    'benchmarks.bench_performance',
+    'benchmarks.bench_orders',
+)
+
+# name -> Benchmark
+REGISTRY: Dict[str, 'Benchmark'] = {}
+
+
+class Benchmark(object):
+    """A function to time and how to time it."""
+
+    def __init__(self,
+                 name: str,
+                 func: Callable[[Any], Any],
+                 setup: Callable[[], Any] = None,
+                 repeat: int = 5,
+                 number: int = 1,
+                 items: int = None,
+                 memory: bool = False):
+        """
+        :param name: The unique name of the benchmark.
+        :param func: The function to time. It is passed whatever ``setup``
+            returns.
+        :param setup: (optional) Called before every repeat and not timed.
+            Use it to build anything ``func`` mutates.
+        :param repeat: How many times to time ``func``.
+        :param number: How many times ``func`` is called per repeat.
+        :param items: (optional) How many things one call of ``func``
+            processes, to also report a throughput.
+        :param memory: Also measure the memory still allocated by what
+            ``func`` returns, once, outside of the timed repeats.
+        """
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.repeat = repeat
+        self.number = number
+        self.items = items
+        self.memory = memory
+
+    def run(self) -> Dict[str, float]:
+        """
+        Time the benchmark.
+
+        :return: The time per call in seconds of every repeat summarized.
+        """
+        times = []
+
+        for _ in range(self.repeat):
+            arg = self.setup() if self.setup is not None else None
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+
+            try:
+                start = perf_counter()
+                for _ in range(self.number):
+                    self.func(arg)
+                times.append((perf_counter() - start) / self.number)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+
+        result = {
+            'min': min(times),
+            'median': statistics.median(times),
+            'mean': statistics.mean(times),
+            'max': max(times),
+            'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+            'repeat': self.repeat,
+            'number': self.number,
+        }
+
+        if self.items:
+            result['per_second'] = self.items / result['median']
+
+        if self.memory:
+            result['bytes'] = self._measure_memory()
+
+            if self.items:
+                result['bytes_per_item'] = result['bytes'] / self.items
+
+        return result
+
+    def _measure_memory(self) -> int:
+        """The bytes still allocated after one call of ``func``."""
+        arg = self.setup() if self.setup is not None else None
+        tracemalloc.start()
+
+        try:
+            # keep the result alive until the memory is read.
+            out = self.func(arg)
+            allocated, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        del out
+        return allocated
+
+
+def benchmark(name: str = None, setup: Callable[[], Any] = None,
+              repeat: int = 5, number: int = 1, items: int = None,
+              memory: bool = False):
+    """Register the decorated function as a :class:`Benchmark`."""
+
+    def decorator(func):
+        module = func.__module__.split('.')[-1]
+        bench_name = name or f'{module}.{func.__name__}'
+        register(Benchmark(bench_name, func, setup, repeat, number, items,
+                           memory))
+        return func
+
+    return decorator
+
+
+def register(bench: Benchmark) -> None:
+    if bench.name in REGISTRY:
+        raise ValueError(f'A benchmark named {bench.name} already exists.')
+
+    REGISTRY[bench.name] = bench
+
+
+def load() -> None:
+    """Import every benchmark module so that the benchmarks are registered."""
+    for module in BENCHMARK_MODULES:
+        importlib.import_module(module)
+
+
+def select(pattern: str = None) -> List[Benchmark]:
+    """Every registered benchmark whose name matches the glob ``pattern``."""
+    load()
+    names = sorted(REGISTRY)
+
+    if pattern is not None:
+        names = [n for n in names if fnmatch.fnmatch(n, pattern)]
+
+    return [REGISTRY[n] for n in names]
+
+
+def run(pattern: str = None) -> Dict[str, Any]:
+    """
+    Run the benchmarks.
+
+    :param pattern: (optional) Only run benchmarks matching this glob.
+    :return: A JSON serializable dict of the environment and the results.
+    """
+    results = {}
+
+    for bench in select(pattern):
+        logger.info(f'Running benchmark: {bench.name}')
+        results[bench.name] = bench.run()
+
+    return {'meta': environment(), 'results': results}
+
+
+def environment() -> Dict[str, str]:
+    """What the results were produced with."""
+    return {
+        'commit': _git_commit(),
+        'timestamp': dt.datetime.utcnow().isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def compare(baseline: Dict[str, Any],
+            current: Dict[str, Any],
+            threshold: float = .1) -> pd.DataFrame:
+    """
+    Compare the median time of every benchmark in both results.
+
+    :param baseline: The results to compare against.
+    :param current: The new results.
+    :param threshold: How much slower or faster, as a fraction of the
+        baseline, a benchmark has to be to count as a change.
+    :return: A DataFrame with a row for every benchmark in both results.
+    """
+    rows = {}
+
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+
+        if base is None:
+            continue
+
+        ratio = result['median'] / base['median']
+
+        if ratio > 1 + threshold:
+            status = 'slower'
+        elif ratio < 1 - threshold:
+            status = 'faster'
+        else:
+            status = ''
+
+        rows[name] = {
+            'baseline': base['median'],
+            'current': result['median'],
+            'ratio': ratio,
+            'status': status,
+        }
+
+    return (pd.DataFrame.from_dict(rows, orient='index')
+            .reindex(columns=['baseline', 'current', 'ratio', 'status']))
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'],
+                stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
@@ -6,6 +6,7 @@ import pandas as pd
 
 import pytech.utils.pandas_utils as pd_utils
 from pytech.backtest.event import MarketEvent, SignalEvent
+from pytech.backtest.scheduler import Scheduler
 from pytech.data.handler import DataHandler
 from pytech.trading.order import get_order_types
 from pytech.utils.enums import EventType, Position, SignalType, TradeAction
@@ -15,6 +16,10 @@ OrderTypes = get_order_types()
 
 
 class Strategy(metaclass=ABCMeta):
+    # strategies that only act in scheduled callbacks should set this to
+    # False so generate_signals is not called on every bar.
+    signals_every_bar = True
+
     def __init__(self, data_handler: DataHandler, events):
         self.logger = logging.getLogger(__name__)
 
@@ -33,6 +38,17 @@ class Strategy(metaclass=ABCMeta):
 
         raise NotImplementedError('Must implement generate_signals()')
 
+    def schedule_callbacks(self, scheduler: Scheduler) -> None:
+        """
+        Register any calendar driven callbacks with the ``scheduler``.
+
+        This is called once before the backtest starts. It does nothing by
+        default.
+
+        :param scheduler: The scheduler for this strategy.
+        """
+        pass
+
 
 class BuyAndHold(Strategy):
     def __init__(self, data_handler, events):
@@ -68,7 +84,8 @@ class BuyAndHold(Strategy):
                 bars = self.bars.get_latest_bar_value(ticker,
                                                       pd_utils.ADJ_CLOSE_COL)
 
-                if bars is not None:
+                # tickers that haven't started trading yet have no bars.
+                if bars is not None and len(bars):
                     if not self.bought[ticker]:
                         signal = SignalEvent(ticker, 'LONG', bars[0])
                         self.events.put(signal)
@@ -98,6 +115,10 @@ class CrossOverStrategy(Strategy):
 
         for ticker in self.ticker_list:
             bar = self.bars.get_latest_bars(ticker, n=self.long_window)
+
+            if not bar:
+                continue
+
             signals = pd.DataFrame(bar)
 
             signals['short_mavg'] = (
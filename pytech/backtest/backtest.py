@@ -1,14 +1,60 @@
 import datetime as dt
 import logging
 import queue
+from typing import Dict, Iterable, List, Union
 
+import pandas as pd
+
+import pytech.backtest.checkpoint as checkpoint
+import pytech.backtest.profiling as profiling
 import pytech.utils.common_utils as com_utils
 import pytech.utils.dt_utils as dt_utils
+from pytech.algo.strategy import Strategy
+from pytech.backtest.scheduler import Scheduler
 from pytech.data.handler import Bars
-from pytech.fin.portfolio import BasicPortfolio
+from pytech.fin.balancer import AbstractBalancer
+from pytech.fin.portfolio import AbstractPortfolio, BasicPortfolio
 from pytech.trading.blotter import Blotter
-from pytech.trading.execution import SimpleExecutionHandler
-from pytech.utils.enums import EventType
+from pytech.trading.execution import ExecutionHandler, SimpleExecutionHandler
+from pytech.utils.enums import EventType, PersistencePolicy
+
+logger = logging.getLogger(__name__)
+
+
+class TradingContext(object):
+    """
+    Holds everything that belongs to a single strategy in a
+    :class:`Backtest`.
+
+    Every strategy gets its own event queue, :class:`Blotter`, portfolio and
+    execution handler so that signals, orders and fills never leak between
+    strategies. The :class:`DataHandler` is **shared** and owned by the
+    :class:`Backtest`.
+    """
+
+    def __init__(self,
+                 name: str,
+                 strategy: Strategy,
+                 portfolio: AbstractPortfolio,
+                 blotter: Blotter,
+                 execution_handler: ExecutionHandler,
+                 events: queue.Queue,
+                 scheduler: Scheduler = None,
+                 balancer: AbstractBalancer = None):
+        self.name = name
+        self.strategy = strategy
+        self.portfolio = portfolio
+        self.blotter = blotter
+        self.execution_handler = execution_handler
+        self.events = events
+        self.scheduler = scheduler or Scheduler()
+        self.balancer = balancer
+        self.signals = 0
+        self.orders = 0
+        self.fills = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.name})'
 
 
 class Backtest(object):
@@ -27,20 +73,53 @@ class Backtest(object):
                  data_handler=None,
                  execution_handler=None,
                  portfolio=None,
-                 balancer=None):
+                 balancer=None,
+                 checkpoint_path: str = None,
+                 checkpoint_freq: int = 1000,
+                 profile: Union[bool, str] = False,
+                 persistence=PersistencePolicy.END_OF_RUN,
+                 persist_every: int = 1000,
+                 metrics: Dict = None):
         """
         Initialize the backtest.
 
         :param iterable ticker_list: A list of tickers.
-        :param initial_capital: Amount of starting capital.
+        :param initial_capital: Amount of starting capital. Every strategy
+            starts with this amount.
         :param start_date: The date to start the backtest as of.
-        :param strategy: The strategy to backtest.
+        :param strategy: The strategy to backtest or an iterable of
+            strategies to run side by side against the same market data.
+            Use :func:`functools.partial` to pass extra arguments to a
+            strategy's constructor.
         :param data_handler:
         :param execution_handler:
         :param portfolio:
+        :param balancer: (optional) A balancer class that every strategy's
+            portfolio is rebalanced with on the sessions picked by its
+            ``date_rule``.
+        :param checkpoint_path: (optional) If given the state of the
+            backtest will periodically be written to this file so that it
+            can be continued with :meth:`resume`.
+        :param checkpoint_freq: The number of bars between checkpoints.
+        :param profile: (optional) Time each phase of the backtest and log a
+            report when it finishes. ``True`` for timers only, or one of
+            ``timers``, ``cprofile`` or ``sampling``.
+            See :mod:`pytech.backtest.profiling`.
+        :param persistence: When each portfolio is written to the DB. See
+            :class:`PersistencePolicy`.
+        :param persist_every: How many bars to wait between writes when
+            ``persistence`` is ``EVERY_N_BARS``.
+        :param metrics: (optional) Keyword arguments for each portfolio's
+            :class:`pytech.fin.metrics.MetricsTracker`. If every strategy
+            hits one of the abort rules given here, e.g. ``max_drawdown``,
+            the backtest stops early.
         """
         self.logger = logging.getLogger(__name__)
-        self.ticker_list = com_utils.iterable_to_set(ticker_list)
+        # the order every per ticker array is in. A checkpoint saves it so a
+        # resumed backtest lines up with the one that wrote it, see
+        # checkpoint._header.
+        self.tickers = list(dict.fromkeys(ticker_list))
+        self.ticker_list = com_utils.iterable_to_set(self.tickers)
         self.initial_capital = initial_capital
         self.start_date = dt_utils.parse_date(start_date)
 
@@ -48,8 +127,17 @@ class Backtest(object):
             self.end_date = dt.datetime.utcnow()
         else:
             self.end_date = dt_utils.parse_date(end_date)
+
         self.strategy_cls = strategy
 
+        if isinstance(strategy, Iterable):
+            self.strategy_clses = list(strategy)
+        else:
+            self.strategy_clses = [strategy]
+
+        if not self.strategy_clses:
+            raise ValueError('At least one strategy must be provided.')
+
         if data_handler is None:
             self.data_handler_cls = Bars
         else:
@@ -65,72 +153,422 @@ class Backtest(object):
         else:
             self.portfolio_cls = portfolio
 
+        self.balancer_cls = balancer
+        self.persistence = PersistencePolicy.check_if_valid(persistence)
+        self.persist_every = persist_every
+        self.metrics = metrics or {}
+        self.aborted = False
+
+        # only market events go on this queue, they are fanned out to
+        # each strategy's own queue.
         self.events = queue.Queue()
+        self.contexts: List[TradingContext] = []
+        # True if any strategy has scheduled callbacks.
+        self._scheduled = False
 
-        self.blotter = Blotter(self.events)
+        self._init_trading_instances()
 
-        self.signals = 0
-        self.orders = 0
-        self.fills = 0
-        self.num_strats = 1
+        if checkpoint_path is None:
+            self.checkpointer = None
+        else:
+            self.checkpointer = checkpoint.Checkpointer(checkpoint_path,
+                                                        checkpoint_freq)
+            self.checkpointer.start(self)
 
-        self._init_trading_instances()
+        if profile is True:
+            self.profiler = profiling.Profiler()
+        elif profile:
+            self.profiler = profiling.Profiler(profile)
+        else:
+            self.profiler = None
+
+        self.profile_report = None
+
+    @classmethod
+    def resume(cls, path: str, run: bool = True) -> 'Backtest':
+        """
+        Rebuild a backtest from the last checkpoint written to ``path`` and
+        continue running it.
+
+        New checkpoints keep getting appended to the same file.
+
+        :param path: The checkpoint file.
+        :param run: If ``False`` the backtest is restored but not run.
+        :return: The restored backtest.
+        """
+        header, checkpoints = checkpoint.read(path)
+        backtest = cls(**header['config'])
+        checkpoint.restore(backtest, checkpoints)
+        backtest._attach_checkpointer(path, header)
+        backtest.logger.info(
+                f'Resumed backtest at bar: {backtest.data_handler.bar_count}')
+
+        if run:
+            backtest._run()
+
+        return backtest
+
+    @classmethod
+    def extend(cls, path: str, end_date=None, run: bool = True) -> 'Backtest':
+        """
+        Continue a completed backtest with bars that have arrived since it
+        finished.
+
+        Only bars after the last bar the backtest saw are loaded, the
+        history is restored from the checkpoint file instead of being
+        re-run. The equity curve, positions and trades are appended to and
+        a new final checkpoint is written to ``path`` so that the backtest
+        can be extended again.
+
+        :param path: The checkpoint file of a completed backtest.
+        :param end_date: The new end date. Defaults to now.
+        :param run: If ``False`` the backtest is restored but not run.
+        :return: The extended backtest.
+        :raises ValueError: If the backtest in ``path`` never completed.
+        """
+        header, checkpoints = checkpoint.read(path)
+
+        if not checkpoints or 'latest_bars' not in checkpoints[-1]:
+            raise ValueError(f'{path} does not contain a completed backtest. '
+                             'Use Backtest.resume() instead.')
+
+        final = checkpoints[-1]
+        latest_bars = final['latest_bars']
+        config = dict(header['config'])
+        config['end_date'] = end_date
+        backtest = cls(**config)
+
+        # only load the bars that are new since the last run.
+        backtest.data_handler.start_date = min(
+                dt_utils.parse_date(bars[-1].name)
+                for bars in latest_bars.values() if bars)
+        backtest.data_handler.seed(latest_bars)
+        backtest.data_handler.bar_count = final['bar_count']
+
+        checkpoint.restore_contexts(backtest, checkpoints)
+
+        # the restored history was stored by the run that made it.
+        for context in backtest.contexts:
+            context.portfolio.writer.mark_written()
+
+        backtest._attach_checkpointer(path, header)
+        backtest.logger.info('Extending backtest from: '
+                             f'{backtest.data_handler.start_date}')
+
+        if run:
+            backtest._run()
+
+        return backtest
+
+    def _attach_checkpointer(self, path: str, header) -> None:
+        """Keep appending checkpoints to an existing file."""
+        self.checkpointer = checkpoint.Checkpointer(path, header['freq'],
+                                                    header['lookback'])
+        self.checkpointer.mark(self)
+
+    @property
+    def num_strats(self) -> int:
+        return len(self.contexts)
+
+    @property
+    def strategy(self) -> Strategy:
+        """The first strategy, kept for single strategy backtests."""
+        return self.contexts[0].strategy
+
+    @property
+    def portfolio(self) -> AbstractPortfolio:
+        """The first strategy's portfolio."""
+        return self.contexts[0].portfolio
+
+    @property
+    def blotter(self) -> Blotter:
+        """The first strategy's blotter."""
+        return self.contexts[0].blotter
+
+    @property
+    def execution_handler(self) -> ExecutionHandler:
+        """The first strategy's execution handler."""
+        return self.contexts[0].execution_handler
+
+    @property
+    def signals(self) -> int:
+        return sum(ctx.signals for ctx in self.contexts)
+
+    @property
+    def orders(self) -> int:
+        return sum(ctx.orders for ctx in self.contexts)
+
+    @property
+    def fills(self) -> int:
+        return sum(ctx.fills for ctx in self.contexts)
 
     def _init_trading_instances(self):
         self.data_handler = self.data_handler_cls(self.events,
-                                                  self.ticker_list,
+                                                  self.tickers,
                                                   self.start_date,
                                                   self.end_date)
-        self.blotter.bars = self.data_handler
-        self.strategy = self.strategy_cls(self.data_handler, self.events)
-        self.portfolio = self.portfolio_cls(self.data_handler,
-                                            self.events,
-                                            self.start_date,
-                                            self.blotter,
-                                            self.initial_capital)
-        self.execution_handler = self.execution_handler_cls(self.events)
+        names = set()
+
+        for strategy_cls in self.strategy_clses:
+            name = _unique_name(_strategy_name(strategy_cls), names)
+            names.add(name)
+            self.contexts.append(self._make_context(name, strategy_cls))
+
+    def _make_context(self, name: str, strategy_cls) -> TradingContext:
+        """Create the isolated trading instances for one strategy."""
+        events = queue.Queue()
+        blotter = Blotter(events)
+        blotter.bars = self.data_handler
+        strategy = strategy_cls(self.data_handler, events)
+        portfolio = self.portfolio_cls(self.data_handler,
+                                       events,
+                                       self.start_date,
+                                       blotter,
+                                       self.initial_capital,
+                                       persistence=self.persistence,
+                                       persist_every=self.persist_every,
+                                       name=name)
+
+        if self.metrics:
+            portfolio.track_metrics(**self.metrics)
+
+        execution_handler = self.execution_handler_cls(events)
+        scheduler = Scheduler(intraday=self.data_handler.intraday)
+        strategy.schedule_callbacks(scheduler)
+
+        if self.balancer_cls is not None:
+            balancer = self.balancer_cls(portfolio)
+            balancer.schedule_callbacks(scheduler)
+        else:
+            balancer = None
+
+        return TradingContext(name, strategy, portfolio, blotter,
+                              execution_handler, events, scheduler, balancer)
 
     def _run(self):
         iterations = 0
+        profiler = self.profiler
+
+        if profiler is not None:
+            self._instrument(profiler)
+            profiler.start()
+
+        self._start_schedulers()
 
         while True:
             iterations += 1
             self.logger.info(f'Iteration #{iterations}')
 
-            if self.data_handler.continue_backtest:
-                self.logger.debug('Updating bars.')
-                self.data_handler.update_bars()
-            else:
+            if not self.data_handler.continue_backtest:
+                self.logger.info('Backtest completed.')
+                break
+
+            if profiler is not None:
+                profiler.start_bar()
+
+            self.logger.debug('Updating bars.')
+            self.data_handler.update_bars()
+
+            if not self.data_handler.continue_backtest:
+                # the data ran out, so there is no bar to process or time.
                 self.logger.info('Backtest completed.')
                 break
 
-            # handle events
-            while True:
-                try:
-                    event = self.events.get(False)
-                except queue.Empty:
-                    self.logger.info('Event queue is empty. '
-                                     'Continuing to next day.')
-                    break
-                else:
-                    if event is not None:
-                        self._process_event(event)
-
-    def _process_event(self, event):
-        self.logger.debug(
-                f'Processing {event.event_type}')
-
-        if event.event_type is EventType.MARKET:
-            self.strategy.generate_signals(event)
-            self.portfolio.update_timeindex(event)
-        elif event.event_type is EventType.SIGNAL:
-            self.signals += 1
-            self.portfolio.update_signal(event)
-        elif event.event_type is EventType.TRADE:
-            self.orders += 1
-            self.execution_handler.execute_order(event)
-        elif event.event_type is EventType.FILL:
-            self.fills += 1
-            self.portfolio.update_fill(event)
+            self._dispatch_market_events()
+
+            if self.checkpointer is not None:
+                self.checkpointer.maybe_write(self)
+
+            if profiler is not None:
+                profiler.end_bar()
+
+            if self._all_aborted():
+                self.aborted = True
+                break
+
+        if self.checkpointer is not None:
+            self.checkpointer.write(self, final=True)
+
+        for context in self.contexts:
+            context.portfolio.close()
+
+        if profiler is not None:
+            profiler.stop()
+            self.profile_report = profiler.report()
+            self.logger.info(f'\n{self.profile_report}')
+
+    def _all_aborted(self) -> bool:
+        """True once every strategy has hit one of its abort rules."""
+        if not self.metrics:
+            return False
+
+        for context in self.contexts:
+            if context.portfolio.metrics.abort_reason is None:
+                return False
+
+        for context in self.contexts:
+            self.logger.info(f'Aborting {context.name}: '
+                             f'{context.portfolio.metrics.abort_reason}')
+
+        return True
+
+    def _instrument(self, profiler: profiling.Profiler) -> None:
+        """Wrap each phase of the event loop in a timer."""
+        profiler.wrap(self.data_handler, 'update_bars')
+        profiler.wrap(self, '_process_event', key=_event_phase)
+
+        for context in self.contexts:
+            profiler.wrap(context.strategy, 'generate_signals')
+            profiler.wrap(context.portfolio, 'update_timeindex')
+            profiler.wrap(context.blotter, 'check_order_triggers')
+            profiler.wrap(context.portfolio.writer, 'flush',
+                          'persistence.flush')
+            profiler.wrap(context.portfolio.writer, '_write_snapshot',
+                          'persistence.write_snapshot')
+            profiler.wrap(context.scheduler, 'fire', 'scheduler.fire')
+
+    def _start_schedulers(self) -> None:
+        """Work out when every scheduled callback should fire."""
+        if self.data_handler.bar_count:
+            # resumed or extended, only fire on bars that haven't been seen.
+            after = self._current_dt()
         else:
-            return
+            after = None
+
+        for context in self.contexts:
+            context.scheduler.start(self.start_date, self.end_date, after)
+
+        self._scheduled = any(c.scheduler for c in self.contexts)
+
+    def _current_dt(self):
+        return self.data_handler.current_dt
+
+    def _dispatch_market_events(self):
+        """
+        Hand every event the data handler produced to each strategy and
+        then let each strategy work through its own queue.
+        """
+        while True:
+            try:
+                event = self.events.get(False)
+            except queue.Empty:
+                break
+            else:
+                if event is None:
+                    continue
+
+                if self._scheduled:
+                    current_dt = self._current_dt()
+
+                for context in self.contexts:
+                    context.events.put(event)
+
+                    if context.scheduler:
+                        context.scheduler.fire(current_dt)
+
+                    self._handle_events(context)
+
+    def _handle_events(self, context: TradingContext):
+        while True:
+            try:
+                event = context.events.get(False)
+            except queue.Empty:
+                self.logger.debug(f'Event queue for {context.name} is empty.')
+                break
+            else:
+                if event is not None:
+                    self._process_event(event, context)
+
+    def _process_event(self, event, context: TradingContext = None):
+        if context is None:
+            context = self.contexts[0]
+
+        process_event(event, context)
+
+    def equity_curves(self) -> Dict[str, pd.DataFrame]:
+        """
+        Return each strategy's equity curve keyed by strategy name.
+        """
+        curves = {}
+
+        for context in self.contexts:
+            context.portfolio.create_equity_curve_df()
+            curves[context.name] = context.portfolio.equity_curve
+
+        return curves
+
+    def results(self) -> pd.DataFrame:
+        """
+        Summarize the backtest with one row per strategy.
+
+        :return: A :class:`pd.DataFrame` indexed by strategy name.
+        """
+        rows = {}
+
+        for name, curve in self.equity_curves().items():
+            context = self.get_context(name)
+            final_value = curve['total'].iat[-1]
+            rows[name] = {
+                'signals': context.signals,
+                'orders': context.orders,
+                'fills': context.fills,
+                'final_value': final_value,
+                'total_return': (final_value / self.initial_capital) - 1.0,
+                'commission': context.portfolio.total_commission,
+                'sharpe': context.portfolio.metrics.sharpe,
+                'max_drawdown': context.portfolio.metrics.max_drawdown,
+                'aborted': context.portfolio.metrics.abort_reason is not None,
+            }
+
+        return pd.DataFrame.from_dict(rows, orient='index')
+
+    def get_context(self, name: str) -> TradingContext:
+        """Return the :class:`TradingContext` for the given strategy name."""
+        for context in self.contexts:
+            if context.name == name:
+                return context
+
+        raise KeyError(f'No strategy named: {name} in the backtest.')
+
+
+def process_event(event, context: TradingContext) -> None:
+    """Hand an event to the part of ``context`` that acts on it."""
+    logger.debug(f'Processing {event.event_type} for {context.name}')
+
+    if event.event_type is EventType.MARKET:
+        if context.strategy.signals_every_bar:
+            context.strategy.generate_signals(event)
+        context.portfolio.update_timeindex(event)
+    elif event.event_type is EventType.SIGNAL:
+        context.signals += 1
+        context.portfolio.update_signal(event)
+    elif event.event_type is EventType.TRADE:
+        context.orders += 1
+        context.execution_handler.execute_order(event)
+    elif event.event_type is EventType.FILL:
+        context.fills += 1
+        context.portfolio.update_fill(event)
+
+
+def _event_phase(event, *args, **kwargs) -> str:
+    return f'event.{event.event_type.name.lower()}'
+
+
+def _strategy_name(strategy_cls) -> str:
+    """Get a readable name for a strategy class or partial."""
+    try:
+        return strategy_cls.__name__
+    except AttributeError:
+        # functools.partial
+        return strategy_cls.func.__name__
+
+
+def _unique_name(name: str, taken: Iterable[str]) -> str:
+    if name not in taken:
+        return name
+
+    i = 1
+    while f'{name}_{i}' in taken:
+        i += 1
+
+    return f'{name}_{i}'
@@ -0,0 +1,362 @@
+"""
+Checkpoint the state of a running :class:`pytech.backtest.backtest.Backtest`
+to a local file so that it can be resumed if the process dies.
+
+The checkpoint file is an append-only log of records. Each record is a
+pickle compressed with zlib and prefixed with its length. The first record
+is a header with everything needed to rebuild the backtest, every record
+after that only contains what changed since the record before it plus the
+small amount of state that is overwritten every bar (cash, open orders,
+owned assets, strategy state and where the order ids got to). This keeps
+the cost of a checkpoint proportional to the number of bars since the last
+one instead of the length of the whole backtest.
+
+When a backtest finishes a *final* checkpoint is written that also holds
+the most recent bars for every ticker. A completed backtest can then be
+extended with new data without replaying its history, see
+:meth:`pytech.backtest.backtest.Backtest.extend`.
+"""
+import logging
+import os
+import pickle
+import struct
+import zlib
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from pytech.backtest.profiling import TimedMethod
+from pytech.trading.order import next_order_id
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'header'
+CHECKPOINT = 'checkpoint'
+VERSION = 5
+
+# how many of the latest bars per ticker a final checkpoint keeps.
+DEFAULT_LOOKBACK = 252
+
+# length prefix for every record.
+_LEN = struct.Struct('>I')
+
+# strategy attributes that are rebuilt with the backtest and never saved.
+STRATEGY_EXCLUDE = frozenset({'bars', 'events', 'logger', 'ticker_list'})
+
+
+class Checkpointer(object):
+    """Write periodic checkpoints of a backtest to ``path``."""
+
+    def __init__(self, path: str, freq: int = 1000,
+                 lookback: int = DEFAULT_LOOKBACK):
+        """
+        :param path: The file to write the checkpoints to.
+        :param freq: How many bars to wait between checkpoints.
+        :param lookback: How many of the latest bars per ticker to keep in
+            the final checkpoint so strategies have history to look back on
+            when the backtest is extended.
+        """
+        if freq < 1:
+            raise ValueError(f'freq must be at least 1. {freq} was provided.')
+
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.freq = freq
+        self.lookback = lookback
+        self.last_bar_count = 0
+        # context name -> the length of each history when it was last saved.
+        self._marks: Dict[str, Dict[str, int]] = {}
+
+    def start(self, backtest) -> None:
+        """
+        Begin a new checkpoint file, replacing any file already at ``path``.
+        """
+        with open(self.path, 'wb') as f:
+            _dump(_header(backtest, self.freq, self.lookback), f)
+
+        self.mark(backtest)
+
+    def mark(self, backtest) -> None:
+        """
+        Remember how much history has been saved so that the next checkpoint
+        only contains what is new.
+        """
+        self.last_bar_count = backtest.data_handler.bar_count
+        self._marks = {c.name: _current_marks(c) for c in backtest.contexts}
+
+    def maybe_write(self, backtest) -> bool:
+        """
+        Write a checkpoint if ``freq`` bars have passed since the last one.
+
+        :return: True if a checkpoint was written.
+        """
+        if backtest.data_handler.bar_count - self.last_bar_count < self.freq:
+            return False
+
+        self.write(backtest)
+        return True
+
+    def write(self, backtest, final: bool = False) -> None:
+        """
+        Append a checkpoint to the file.
+
+        :param backtest: The backtest to checkpoint.
+        :param final: True if the backtest has run out of data. The latest
+            bars will be saved as well so the backtest can be extended.
+        """
+        record = {
+            'kind': CHECKPOINT,
+            'bar_count': backtest.data_handler.bar_count,
+            # ids are handed out across every strategy, and closed orders
+            # aren't saved, so the open orders don't tell where they got to.
+            'order_ids': {'last': next_order_id.last,
+                          'namespace': next_order_id.namespace},
+            'contexts': {
+                c.name: _context_state(c, self._marks[c.name])
+                for c in backtest.contexts
+            }
+        }
+
+        if final:
+            record['latest_bars'] = {
+                t: bars[-self.lookback:] for t, bars
+                in backtest.data_handler.latest_ticker_data.items()
+            }
+
+        with open(self.path, 'ab') as f:
+            _dump(record, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.logger.debug(
+                f'Wrote checkpoint at bar: {record["bar_count"]}')
+        self.mark(backtest)
+
+
+def read(path: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Read a checkpoint file.
+
+    If the last record was only partially written because the process died
+    while writing it, the file is truncated back to the last good record.
+
+    :param path: The checkpoint file.
+    :return: The header and a list of every checkpoint in the order they
+        were written.
+    """
+    records = []
+    good_offset = 0
+
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                record = _load(f)
+            except EOFError:
+                break
+            except (zlib.error, pickle.UnpicklingError):
+                logger.warning(f'Corrupt checkpoint record in {path} at '
+                               f'offset: {good_offset}. Ignoring it.')
+                break
+            else:
+                records.append(record)
+                good_offset = f.tell()
+
+    if os.path.getsize(path) != good_offset:
+        with open(path, 'r+b') as f:
+            f.truncate(good_offset)
+
+    if not records or records[0]['kind'] != HEADER:
+        raise ValueError(f'{path} is not a backtest checkpoint file.')
+
+    header = records[0]
+
+    if header['version'] != VERSION:
+        raise ValueError(f'Unsupported checkpoint version: '
+                         f'{header["version"]}')
+
+    return header, records[1:]
+
+
+def restore(backtest, checkpoints: List[Dict[str, Any]]) -> None:
+    """
+    Put a freshly built backtest back into the state it was in when the
+    last checkpoint was written.
+
+    :param backtest: A backtest built from the checkpoint's header.
+    :param checkpoints: Every checkpoint record in the file.
+    """
+    if not checkpoints:
+        return
+
+    backtest.data_handler.fast_forward(checkpoints[-1]['bar_count'])
+    restore_contexts(backtest, checkpoints)
+
+
+def restore_contexts(backtest, checkpoints: List[Dict[str, Any]]) -> None:
+    """
+    Restore each strategy's portfolio, blotter and strategy state without
+    touching the data handler.
+
+    :param backtest: A backtest built from the checkpoint's header.
+    :param checkpoints: Every checkpoint record in the file.
+    """
+    for context in backtest.contexts:
+        states = [c['contexts'][context.name] for c in checkpoints]
+        _restore_context(context, states)
+
+    # new orders must not reuse an id from before the checkpoint.
+    next_order_id.restore(**checkpoints[-1]['order_ids'])
+
+
+def _header(backtest, freq: int, lookback: int) -> Dict[str, Any]:
+    return {
+        'kind': HEADER,
+        'version': VERSION,
+        'freq': freq,
+        'lookback': lookback,
+        'config': {
+            # the data handler's order, not the order of a set which
+            # changes with the hash seed of the process.
+            'ticker_list': list(backtest.data_handler.tickers),
+            'initial_capital': backtest.initial_capital,
+            'start_date': backtest.start_date,
+            'end_date': backtest.end_date,
+            'strategy': backtest.strategy_clses,
+            'data_handler': backtest.data_handler_cls,
+            'execution_handler': backtest.execution_handler_cls,
+            'portfolio': backtest.portfolio_cls,
+            'balancer': backtest.balancer_cls,
+            'persistence': backtest.persistence,
+            'persist_every': backtest.persist_every,
+            'metrics': backtest.metrics,
+        }
+    }
+
+
+def _current_marks(context) -> Dict[str, int]:
+    return {
+        'holdings': len(context.portfolio.all_holdings_mv),
+        'positions': len(context.portfolio.all_positions_qty),
+        'trades': len(context.blotter.trades),
+        'lots': len(context.portfolio.lots.closed),
+    }
+
+
+def _context_state(context, marks: Dict[str, int]) -> Dict[str, Any]:
+    """Everything needed to restore one :class:`TradingContext`."""
+    portfolio = context.portfolio
+    blotter = context.blotter
+
+    # closed orders are never acted on again so there is no need to save them.
+    open_orders = {}
+    for ticker, asset_orders in blotter.orders.items():
+        asset_open = {k: v for k, v in asset_orders.items() if v.open}
+        if asset_open:
+            open_orders[ticker] = asset_open
+
+    return {
+        'tickers': list(portfolio.ticker_list),
+        'signals': context.signals,
+        'orders': context.orders,
+        'fills': context.fills,
+        'strategy': {k: v for k, v in vars(context.strategy).items()
+                     if k not in STRATEGY_EXCLUDE
+                     and not isinstance(v, TimedMethod)},
+        'cash': portfolio.cash,
+        'total_commission': portfolio.total_commission,
+        'owned_assets': portfolio.owned_assets,
+        'marks': portfolio.marks.copy(),
+        'marks_dt': portfolio.marks_dt,
+        'metrics': portfolio.metrics,
+        # only the lots closed since the last checkpoint are saved.
+        'lots': portfolio.lots.without_closed(),
+        'closed_lots': portfolio.lots.rows_since(marks['lots']),
+        'holdings': portfolio.all_holdings_mv.rows_since(marks['holdings']),
+        'positions': portfolio.all_positions_qty.rows_since(
+                marks['positions']),
+        'open_orders': open_orders,
+        'trades': blotter.trades.rows_since(marks['trades']),
+        'current_dt': blotter.current_dt,
+    }
+
+
+def _restore_context(context, states: List[Dict[str, Any]]) -> None:
+    latest = states[-1]
+    portfolio = context.portfolio
+    blotter = context.blotter
+
+    context.signals = latest['signals']
+    context.orders = latest['orders']
+    context.fills = latest['fills']
+    vars(context.strategy).update(latest['strategy'])
+
+    portfolio.cash = latest['cash']
+    portfolio.total_commission = latest['total_commission']
+    portfolio.owned_assets = latest['owned_assets']
+    tickers = list(portfolio.ticker_list)
+    portfolio.marks[:] = latest['marks'][_positions(latest['tickers'],
+                                                    tickers)]
+    portfolio.marks_dt = latest['marks_dt']
+    portfolio.metrics = latest['metrics']
+    portfolio.lots = latest['lots']
+
+    if portfolio.lots.tickers != tickers:
+        portfolio.lots.reorder(tickers)
+
+    for state in states:
+        positions = _positions(state['tickers'], tickers)
+        # cash, commission and total come after the tickers.
+        extra = np.arange(len(tickers), len(portfolio.all_holdings_mv.columns))
+        portfolio.all_holdings_mv.extend(
+                _take_columns(state['holdings'],
+                              np.concatenate([positions, extra])))
+        portfolio.all_positions_qty.extend(
+                _take_columns(state['positions'], positions))
+        blotter.trades.extend(state['trades'])
+        portfolio.lots.extend(state['closed_lots'])
+
+    blotter.orders = latest['open_orders']
+    blotter.current_dt = latest['current_dt']
+
+
+def _positions(saved: Sequence[str], tickers: Sequence[str]) -> np.ndarray:
+    """
+    Where each of ``tickers`` is in ``saved``, to put values that were saved
+    in the order of ``saved`` in the order of ``tickers``.
+
+    :raises ValueError: If the tickers aren't the same.
+    """
+    if set(saved) != set(tickers) or len(saved) != len(tickers):
+        raise ValueError(f'The checkpoint is for tickers: {list(saved)} '
+                         f'not: {list(tickers)}')
+
+    index = {t: i for i, t in enumerate(saved)}
+    return np.array([index[t] for t in tickers], dtype=np.intp)
+
+
+def _take_columns(rows: Tuple[np.ndarray, np.ndarray],
+                  columns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    dates, values = rows
+    return dates, values[:, columns]
+
+
+def _dump(record: Dict[str, Any], f) -> None:
+    data = zlib.compress(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+    f.write(_LEN.pack(len(data)))
+    f.write(data)
+
+
+def _load(f) -> Dict[str, Any]:
+    prefix = f.read(_LEN.size)
+
+    if len(prefix) < _LEN.size:
+        raise EOFError
+
+    size, = _LEN.unpack(prefix)
+    data = f.read(size)
+
+    if len(data) < size:
+        # the process died while this record was being written.
+        raise EOFError
+
+    return pickle.loads(zlib.decompress(data))
@@ -0,0 +1,350 @@
+"""
+Instrumentation for the backtest event loop.
+
+A :class:`Profiler` times the phases of a backtest by swapping methods on
+the objects taking part in the backtest for :class:`TimedMethod` wrappers
+when the backtest starts and putting the originals back when it ends.
+Nothing is wrapped unless profiling is turned on, so a backtest that is not
+being profiled pays nothing for it.
+
+Phase timings are inclusive, e.g. the time spent in ``check_order_triggers``
+is also part of ``update_timeindex`` and ``event.market``.
+
+Modes:
+    * timers: Only the phase timers and counters.
+    * cprofile: Timers plus a :mod:`cProfile` run of the whole loop.
+    * sampling: Timers plus a sampling profiler that periodically records
+      the stack of the thread running the backtest. Much cheaper than
+      cProfile for long runs.
+"""
+import collections
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TIMERS = 'timers'
+CPROFILE = 'cprofile'
+SAMPLING = 'sampling'
+
+MODES = frozenset({TIMERS, CPROFILE, SAMPLING})
+
+
+class TimedMethod(object):
+    """Stands in for a method on an instance and times every call to it."""
+
+    __slots__ = ('profiler', 'phase', 'func', 'key')
+
+    def __init__(self,
+                 profiler: 'Profiler',
+                 phase: str,
+                 func: Callable,
+                 key: Callable[..., str] = None):
+        self.profiler = profiler
+        self.phase = phase
+        self.func = func
+        self.key = key
+
+    def __call__(self, *args, **kwargs):
+        start = perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            if self.key is None:
+                self.profiler.add(self.phase, elapsed)
+            else:
+                self.profiler.add(self.key(*args, **kwargs), elapsed)
+
+
+class Profiler(object):
+    """Collect per phase timings for a backtest."""
+
+    def __init__(self,
+                 mode: str = TIMERS,
+                 sample_interval: float = .005,
+                 top_n: int = 25):
+        """
+        :param mode: One of ``timers``, ``cprofile`` or ``sampling``.
+        :param sample_interval: Seconds between samples in ``sampling`` mode.
+        :param top_n: How many functions to include in the report when
+            running in ``cprofile`` or ``sampling`` mode.
+        """
+        if mode not in MODES:
+            raise ValueError(f'mode must be one of {sorted(MODES)}. '
+                             f'{mode} was provided.')
+
+        self.logger = logging.getLogger(__name__)
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.top_n = top_n
+        self.totals = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        # phase -> time spent in each bar that the phase ran in.
+        self.per_bar = collections.defaultdict(list)
+        self.bar_times = []
+        self.elapsed = 0.0
+        self._current_bar = collections.defaultdict(float)
+        self._bar_start = None
+        self._start = None
+        self._wrapped: List[Tuple[Any, str, bool, Any]] = []
+        self._wrapped_ids = set()
+        self._cprofile = None
+        self._sampler = None
+
+    def wrap(self,
+             obj: Any,
+             attr: str,
+             phase: str = None,
+             key: Callable[..., str] = None) -> None:
+        """
+        Replace ``obj.attr`` with a :class:`TimedMethod` until
+        :meth:`stop` is called.
+
+        :param obj: The instance that owns the method.
+        :param attr: The name of the method.
+        :param phase: The phase to record the time under. Defaults to
+            ``attr``.
+        :param key: (optional) Called with the method's arguments to get the
+            phase name on every call.
+        """
+        if (id(obj), attr) in self._wrapped_ids:
+            # shared objects only get wrapped once.
+            return
+
+        had_own = attr in vars(obj)
+        original = getattr(obj, attr)
+        setattr(obj, attr, TimedMethod(self, phase or attr, original, key))
+        self._wrapped.append((obj, attr, had_own, original))
+        self._wrapped_ids.add((id(obj), attr))
+
+    def unwrap_all(self) -> None:
+        """Put back every method that was wrapped."""
+        for obj, attr, had_own, original in reversed(self._wrapped):
+            if had_own:
+                setattr(obj, attr, original)
+            else:
+                delattr(obj, attr)
+
+        self._wrapped = []
+        self._wrapped_ids = set()
+
+    def add(self, phase: str, elapsed: float) -> None:
+        self.totals[phase] += elapsed
+        self.calls[phase] += 1
+        self._current_bar[phase] += elapsed
+
+    def start(self) -> None:
+        """Start timing the run."""
+        if self.mode == CPROFILE:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif self.mode == SAMPLING:
+            self._sampler = _Sampler(threading.get_ident(),
+                                     self.sample_interval)
+            self._sampler.start()
+
+        self._start = perf_counter()
+
+    def start_bar(self) -> None:
+        self._bar_start = perf_counter()
+
+    def end_bar(self) -> None:
+        self.bar_times.append(perf_counter() - self._bar_start)
+
+        for phase, elapsed in self._current_bar.items():
+            self.per_bar[phase].append(elapsed)
+
+        self._current_bar.clear()
+
+    def stop(self) -> None:
+        """Stop timing and put back all of the wrapped methods."""
+        self.elapsed += perf_counter() - self._start
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+
+        if self._sampler is not None:
+            self._sampler.stop()
+
+        self.unwrap_all()
+
+    def report(self) -> 'ProfileReport':
+        """Summarize everything that was collected."""
+        n_bars = len(self.bar_times)
+        rows = {}
+
+        for phase, total in self.totals.items():
+            per_bar = _pad(self.per_bar[phase], n_bars)
+            rows[phase] = {
+                'total_s': total,
+                'calls': self.calls[phase],
+                'pct': total / self.elapsed * 100 if self.elapsed else np.nan,
+                'p50_ms': _percentile(per_bar, 50) * 1000,
+                'p99_ms': _percentile(per_bar, 99) * 1000,
+            }
+
+        phases = (pd.DataFrame.from_dict(rows, orient='index')
+                  .reindex(columns=['total_s', 'calls', 'pct',
+                                    'p50_ms', 'p99_ms']))
+        phases.sort_values('total_s', ascending=False, inplace=True)
+
+        events = sum(v for k, v in self.calls.items()
+                     if k.startswith('event.'))
+        bar_times = np.asarray(self.bar_times)
+
+        return ProfileReport(phases=phases,
+                             bars=n_bars,
+                             events=events,
+                             elapsed=self.elapsed,
+                             bar_p50_ms=_percentile(bar_times, 50) * 1000,
+                             bar_p99_ms=_percentile(bar_times, 99) * 1000,
+                             functions=self._functions())
+
+    def _functions(self) -> str:
+        """The cProfile or sampling output, if any."""
+        if self._cprofile is not None:
+            out = io.StringIO()
+            stats = pstats.Stats(self._cprofile, stream=out)
+            stats.sort_stats('cumulative').print_stats(self.top_n)
+            return out.getvalue()
+
+        if self._sampler is not None:
+            return self._sampler.format(self.top_n)
+
+        return ''
+
+
+class ProfileReport(object):
+    """The summary produced by a :class:`Profiler`."""
+
+    def __init__(self,
+                 phases: pd.DataFrame,
+                 bars: int,
+                 events: int,
+                 elapsed: float,
+                 bar_p50_ms: float,
+                 bar_p99_ms: float,
+                 functions: str = ''):
+        self.phases = phases
+        self.bars = bars
+        self.events = events
+        self.elapsed = elapsed
+        self.bar_p50_ms = bar_p50_ms
+        self.bar_p99_ms = bar_p99_ms
+        self.functions = functions
+
+    @property
+    def events_per_sec(self) -> float:
+        return self.events / self.elapsed if self.elapsed else np.nan
+
+    @property
+    def bars_per_sec(self) -> float:
+        return self.bars / self.elapsed if self.elapsed else np.nan
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'bars': self.bars,
+            'events': self.events,
+            'elapsed': self.elapsed,
+            'events_per_sec': self.events_per_sec,
+            'bars_per_sec': self.bars_per_sec,
+            'bar_p50_ms': self.bar_p50_ms,
+            'bar_p99_ms': self.bar_p99_ms,
+            'phases': self.phases.to_dict(orient='index'),
+        }
+
+    def __str__(self):
+        out = (f'Backtest profile: {self.bars} bars, {self.events} events '
+               f'in {self.elapsed:.3f}s '
+               f'({self.events_per_sec:.1f} events/sec, '
+               f'{self.bars_per_sec:.1f} bars/sec)\n'
+               f'Per bar: p50 {self.bar_p50_ms:.3f}ms, '
+               f'p99 {self.bar_p99_ms:.3f}ms\n'
+               f'{self.phases.to_string(float_format="{:.3f}".format)}')
+
+        if self.functions:
+            out += f'\n{self.functions}'
+
+        return out
+
+
+class _Sampler(threading.Thread):
+    """Periodically record the stack of another thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='pytech-profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        # samples where the function was running.
+        self.own = collections.Counter()
+        # samples where the function was anywhere on the stack.
+        self.cumulative = collections.Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+
+            if frame is None:
+                continue
+
+            self.samples += 1
+            self.own[_frame_key(frame)] += 1
+            seen = set()
+
+            while frame is not None:
+                seen.add(_frame_key(frame))
+                frame = frame.f_back
+
+            self.cumulative.update(seen)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def format(self, top_n: int) -> str:
+        if not self.samples:
+            return 'No samples collected.'
+
+        lines = [f'{self.samples} samples',
+                 f'{"own %":>8} {"cum %":>8}  function']
+
+        for func, cum in self.cumulative.most_common(top_n):
+            own = self.own.get(func, 0)
+            lines.append(f'{own / self.samples * 100:>8.2f} '
+                         f'{cum / self.samples * 100:>8.2f}  {func}')
+
+        return '\n'.join(lines)
+
+
+def _frame_key(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_filename}:{code.co_firstlineno}({code.co_name})'
+
+
+def _pad(values: List[float], n: int) -> np.ndarray:
+    """Bars where a phase didn't run count as 0 seconds."""
+    values = np.asarray(values, dtype=float)
+
+    if len(values) < n:
+        values = np.concatenate([values, np.zeros(n - len(values))])
+
+    return values
+
+
+def _percentile(values: np.ndarray, q: float) -> float:
+    if not len(values):
+        return np.nan
+
+    return float(np.percentile(values, q))
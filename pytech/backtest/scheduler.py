@@ -0,0 +1,309 @@
+"""
+Calendar driven callbacks for a backtest.
+
+Rather than having every strategy check the date on every bar, a callback
+is registered once with a :class:`DateRule` and an optional
+:class:`TimeRule`. When the backtest starts the :class:`Scheduler` turns
+the rules into a sorted array of trigger times from the trading calendar,
+so on a bar where nothing is due the only work done is one comparison
+against the next trigger.
+
+A callback fires on the first bar at or after its trigger and is called
+with the timestamp of that bar. If several of its triggers passed between
+two bars it only fires once.
+
+Example::
+
+    class MonthlyStrategy(Strategy):
+        signals_every_bar = False
+
+        def schedule_callbacks(self, scheduler):
+            scheduler.schedule(self.rebalance, MonthStart(),
+                               MarketOpen(minutes=30))
+"""
+import heapq
+import logging
+from abc import ABCMeta, abstractmethod
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+import pytech.utils.dt_utils as dt_utils
+
+logger = logging.getLogger(__name__)
+
+# extra calendar days of sessions to load on either side of the backtest so
+# that months at the edges are not mistaken for shorter ones.
+_PADDING = pd.Timedelta(days=40)
+
+
+class DateRule(metaclass=ABCMeta):
+    """Decides which trading sessions a callback fires on."""
+
+    @abstractmethod
+    def select(self, sessions: pd.DatetimeIndex, first: int) -> np.ndarray:
+        """
+        :param sessions: Every trading session in the schedule in order.
+            This includes some sessions before and after the backtest.
+        :param first: The position of the first session of the backtest.
+        :return: The positions in ``sessions`` to fire on.
+        """
+        raise NotImplementedError('Must implement select()')
+
+
+class EverySession(DateRule):
+    """Fire every ``n`` sessions."""
+
+    def __init__(self, n: int = 1, offset: int = 0):
+        """
+        :param n: How many sessions between each trigger.
+        :param offset: Skip this many sessions at the start of the backtest
+            before the first trigger.
+        """
+        if n < 1:
+            raise ValueError(f'n must be at least 1. {n} was provided.')
+
+        self.n = n
+        self.offset = offset
+
+    def select(self, sessions: pd.DatetimeIndex, first: int) -> np.ndarray:
+        return np.arange(first + self.offset, len(sessions), self.n)
+
+
+class MonthStart(DateRule):
+    """Fire on the first session of every month."""
+
+    def __init__(self, days_offset: int = 0):
+        """
+        :param days_offset: Fire this many sessions after the first session
+            of the month instead.
+        """
+        self.days_offset = days_offset
+
+    def select(self, sessions: pd.DatetimeIndex, first: int) -> np.ndarray:
+        months = _month_keys(sessions)
+        firsts = np.flatnonzero(np.concatenate([[True],
+                                                months[1:] != months[:-1]]))
+        return _shift_within(firsts + self.days_offset, firsts, months)
+
+
+class MonthEnd(DateRule):
+    """Fire on the last session of every month."""
+
+    def __init__(self, days_offset: int = 0):
+        """
+        :param days_offset: Fire this many sessions before the last session
+            of the month instead.
+        """
+        self.days_offset = days_offset
+
+    def select(self, sessions: pd.DatetimeIndex, first: int) -> np.ndarray:
+        months = _month_keys(sessions)
+        lasts = np.flatnonzero(np.concatenate([months[1:] != months[:-1],
+                                               [True]]))
+        return _shift_within(lasts - self.days_offset, lasts, months)
+
+
+class TimeRule(metaclass=ABCMeta):
+    """Decides when during a session a callback fires."""
+
+    def __init__(self, minutes: int = 0, hours: int = 0):
+        self.offset = pd.Timedelta(hours=hours, minutes=minutes)
+
+    @abstractmethod
+    def times(self, schedule: pd.DataFrame) -> pd.Series:
+        """
+        :param schedule: The calendar's schedule for the selected sessions.
+        :return: The time to fire on each session.
+        """
+        raise NotImplementedError('Must implement times()')
+
+
+class MarketOpen(TimeRule):
+    """Fire a given amount of time after the market opens."""
+
+    def times(self, schedule: pd.DataFrame) -> pd.Series:
+        return schedule['market_open'] + self.offset
+
+
+class MarketClose(TimeRule):
+    """
+    Fire a given amount of time before the market closes.
+
+    Bars are labelled with the time they start, so the offset should be at
+    least the length of a bar for the callback to fire on the last bar of
+    the session.
+    """
+
+    def __init__(self, minutes: int = 1, hours: int = 0):
+        super().__init__(minutes, hours)
+
+    def times(self, schedule: pd.DataFrame) -> pd.Series:
+        return schedule['market_close'] - self.offset
+
+
+class ScheduledCallback(object):
+    """A callback and the rules that decide when it fires."""
+
+    def __init__(self,
+                 func: Callable,
+                 date_rule: DateRule,
+                 time_rule: TimeRule = None,
+                 name: str = None):
+        self.func = func
+        self.date_rule = date_rule
+        self.time_rule = time_rule
+        self.name = name or getattr(func, '__name__', repr(func))
+        # trigger times as int64 nanoseconds since the epoch in UTC.
+        self.triggers = np.empty(0, dtype=np.int64)
+        self.calls = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.name})'
+
+
+class Scheduler(object):
+    """Fire callbacks on the bars picked by their calendar rules."""
+
+    def __init__(self, calendar=None, intraday: bool = False):
+        """
+        :param calendar: A :mod:`pandas_market_calendars` calendar.
+            Defaults to the NYSE.
+        :param intraday: True if there is more than one bar per session. If
+            False time rules are ignored and callbacks fire on the bar of
+            the session.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.calendar = calendar if calendar is not None else dt_utils.NYSE
+        self.intraday = intraday
+        self.callbacks: List[ScheduledCallback] = []
+        # (next trigger, position in callbacks)
+        self._heap = []
+
+    def __len__(self):
+        return len(self.callbacks)
+
+    def schedule(self,
+                 func: Callable,
+                 date_rule: DateRule = None,
+                 time_rule: TimeRule = None,
+                 name: str = None) -> ScheduledCallback:
+        """
+        Register a callback.
+
+        Callbacks must be registered before :meth:`start` is called.
+
+        :param func: Called with the timestamp of the bar it fires on.
+        :param date_rule: Which sessions to fire on. Defaults to every
+            session.
+        :param time_rule: When during the session to fire. Defaults to the
+            first bar of the session.
+        :param name: (optional) A name for logging.
+        :return: The registered callback.
+        """
+        callback = ScheduledCallback(func, date_rule or EverySession(),
+                                     time_rule, name)
+        self.callbacks.append(callback)
+        return callback
+
+    def start(self, start_date, end_date, after=None) -> None:
+        """
+        Work out every trigger between ``start_date`` and ``end_date``.
+
+        :param start_date: The first bar of the backtest.
+        :param end_date: The last bar of the backtest.
+        :param after: (optional) Only triggers after this time are kept.
+            Used when continuing a backtest that already ran up to ``after``.
+        """
+        self._heap = []
+
+        if not self.callbacks:
+            return
+
+        start_date = dt_utils.parse_date(start_date)
+        end_date = dt_utils.parse_date(end_date)
+        schedule = self.calendar.schedule(
+                start_date=(start_date - _PADDING).strftime('%Y-%m-%d'),
+                end_date=(end_date + _PADDING).strftime('%Y-%m-%d'))
+        sessions = pd.DatetimeIndex(schedule.index)
+        first = np.searchsorted(_to_ns(sessions),
+                                start_date.tz_convert(None).normalize().value)
+        lower = start_date.value
+
+        if after is not None:
+            lower = max(lower, dt_utils.parse_date(after).value + 1)
+
+        for i, callback in enumerate(self.callbacks):
+            positions = callback.date_rule.select(sessions, first)
+            selected = schedule.iloc[positions]
+
+            if self.intraday and callback.time_rule is not None:
+                times = pd.DatetimeIndex(callback.time_rule.times(selected))
+            else:
+                times = pd.DatetimeIndex(selected.index)
+
+            triggers = np.sort(_to_ns(times))
+            start = np.searchsorted(triggers, lower)
+            end = np.searchsorted(triggers, end_date.value, side='right')
+            callback.triggers = triggers[start:end]
+
+            if len(callback.triggers):
+                self._heap.append((callback.triggers[0], i))
+
+        heapq.heapify(self._heap)
+
+    def fire(self, current_dt) -> int:
+        """
+        Run every callback that is due at ``current_dt``.
+
+        :param current_dt: The timestamp of the current bar.
+        :return: The number of callbacks that were run.
+        """
+        heap = self._heap
+
+        if not heap:
+            return 0
+
+        now = dt_utils.parse_date(current_dt).value
+
+        if heap[0][0] > now:
+            return 0
+
+        fired = 0
+
+        while heap and heap[0][0] <= now:
+            _, i = heapq.heappop(heap)
+            callback = self.callbacks[i]
+            callback.calls += 1
+            fired += 1
+            self.logger.debug(f'Firing {callback} at {current_dt}')
+            callback.func(current_dt)
+            # skip any other triggers that passed since the last bar.
+            nxt = np.searchsorted(callback.triggers, now, side='right')
+
+            if nxt < len(callback.triggers):
+                heapq.heappush(heap, (callback.triggers[nxt], i))
+
+        return fired
+
+
+def _to_ns(index: pd.DatetimeIndex) -> np.ndarray:
+    """Nanoseconds since the epoch in UTC, naive times are taken as UTC."""
+    if index.tz is not None:
+        index = index.tz_convert(None)
+
+    return np.asarray(index, dtype='datetime64[ns]').view(np.int64)
+
+
+def _month_keys(sessions: pd.DatetimeIndex) -> np.ndarray:
+    return np.asarray(sessions.year * 12 + sessions.month)
+
+
+def _shift_within(positions: np.ndarray,
+                  anchors: np.ndarray,
+                  months: np.ndarray) -> np.ndarray:
+    """Drop shifted positions that fall outside of their anchor's month."""
+    valid = (positions >= 0) & (positions < len(months))
+    positions, anchors = positions[valid], anchors[valid]
+    return positions[months[positions] == months[anchors]]
@@ -2,7 +2,7 @@ import datetime as dt
 import logging
 import queue
 from abc import ABCMeta, abstractmethod
-from typing import Dict, Iterable, Union
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -11,11 +11,17 @@ import pytech.utils as utils
 from pytech.decorators.decorators import memoize, lazy_property
 from pytech.backtest.event import MarketEvent
 from pytech.data.reader import BarReader
+from pytech.data.timeline import Step, Timeline
+from pytech.utils.enums import FillPolicy
 
 
 class DataHandler(metaclass=ABCMeta):
 
     CHUNK_SIZE = 'D'
+    # True if there is more than one bar per trading session.
+    intraday = False
+    # how many bars make up a year, used to annualize metrics.
+    periods_per_year = 252
 
     def __init__(self,
                  events: queue.Queue,
@@ -44,18 +50,36 @@ class DataHandler(metaclass=ABCMeta):
         # self._ticker_data = {}
         self.latest_ticker_data = {}
         self.continue_backtest = True
+        # number of times the bars have been advanced.
+        self.bar_count = 0
+        # the time of the latest bars.
+        self.current_dt = None
         self.start_date = utils.parse_date(start_date)
         self.end_date = utils.parse_date(end_date)
         self.asset_lib_name = asset_lib_name
         self.market_lib_name = market_lib_name
-        self.asset_reader = BarReader(asset_lib_name)
-        self.market_reader = BarReader(market_lib_name)
+        # val_type -> (bar_count, prices) of get_latest_prices calls.
+        self._price_cache = {}
         # self._populate_ticker_data()
 
+    @lazy_property
+    def ticker_index(self) -> Dict[str, int]:
+        """The position of each ticker on the ticker axis."""
+        return {t: i for i, t in enumerate(self.tickers)}
+
     @lazy_property
     def ticker_data(self):
         return self._populate_ticker_data()
 
+    @lazy_property
+    def asset_reader(self) -> BarReader:
+        # only connect to the DB if data is actually read from it.
+        return BarReader(self.asset_lib_name)
+
+    @lazy_property
+    def market_reader(self) -> BarReader:
+        return BarReader(self.market_lib_name)
+
     @abstractmethod
     def get_latest_bar(self, ticker: str):
         """
@@ -100,6 +124,33 @@ class DataHandler(metaclass=ABCMeta):
         """
         raise NotImplementedError('Must implement get_latest_bar_value()')
 
+    def get_latest_prices(self, val_type) -> np.ndarray:
+        """
+        The latest ``val_type`` of every ticker in the order of ``tickers``.
+
+        Tickers without a bar yet are NaN. The array may be shared, so it
+        must not be modified. Subclasses that can look the values up
+        without a loop over every ticker should override this.
+
+        :param val_type: The column to get, e.g. ``adj_close``.
+        :return: A float array with a value per ticker.
+        """
+        cached_count, prices = self._price_cache.get(val_type, (None, None))
+
+        if cached_count == self.bar_count:
+            return prices
+
+        prices = np.full(len(self.tickers), np.nan)
+
+        for i, ticker in enumerate(self.tickers):
+            bars = self.latest_ticker_data.get(ticker)
+
+            if bars:
+                prices[i] = bars[-1][val_type]
+
+        self._price_cache[val_type] = (self.bar_count, prices)
+        return prices
+
     @abstractmethod
     def update_bars(self):
         """
@@ -108,6 +159,37 @@ class DataHandler(metaclass=ABCMeta):
         """
         raise NotImplementedError('Must implement update_bars()')
 
+    def fast_forward(self, n: int) -> None:
+        """
+        Advance the bars ``n`` times **without** putting any
+        :class:`MarketEvent` on the queue.
+
+        This is used to put a data handler back to where it was when a
+        backtest is restored from a checkpoint.
+
+        :param n: The number of bars to advance.
+        """
+        raise NotImplementedError('Must implement fast_forward()')
+
+    def seed(self, latest_bars: Dict[str, List[pd.Series]]) -> None:
+        """
+        Prime ``latest_ticker_data`` with bars from a previous run so that
+        lookback windows are already full when the first new bar arrives.
+
+        Must be called before any bars are loaded. Bars that are at or
+        before the last seeded bar for a ticker will be skipped.
+
+        :param latest_bars: The most recent bars for each ticker.
+        """
+        for ticker, bars in latest_bars.items():
+            self.latest_ticker_data[ticker] = list(bars)
+
+            if bars and (self.current_dt is None
+                         or bars[-1].name > self.current_dt):
+                self.current_dt = bars[-1].name
+
+        self._price_cache = {}
+
     @abstractmethod
     def _populate_ticker_data(self):
         """
@@ -121,6 +203,17 @@ class DataHandler(metaclass=ABCMeta):
 
 
 class Bars(DataHandler):
+    """
+    Serve bars from the DB one timestamp at a time.
+
+    Tickers do not need to have bars at the same times. Every step of the
+    backtest is a timestamp that at least one ticker has a bar at (or a
+    timestamp in ``calendar``), and the tickers without a bar at that time
+    are handled according to their :class:`FillPolicy`. Tickers are not
+    available until their first bar and the backtest ends when every
+    ticker has run out of bars.
+    """
+
     def __init__(self,
                  events: queue.Queue,
                  tickers: Iterable,
@@ -128,34 +221,50 @@ class Bars(DataHandler):
                  end_date: dt.datetime,
                  source: str = 'google',
                  asset_lib_name: str = 'pytech.bars',
-                 market_lib_name: str = 'pytech.market'):
+                 market_lib_name: str = 'pytech.market',
+                 fill_policy: Union[FillPolicy, str,
+                                    Dict[str, FillPolicy]] = FillPolicy.FFILL,
+                 calendar: pd.DatetimeIndex = None):
+        """
+        :param fill_policy: What to do for a ticker without a bar at a
+            step. Either one policy for every ticker or a dict of ticker to
+            policy, tickers missing from the dict are forward filled.
+        :param calendar: (optional) The timestamps to step through instead
+            of the union of every ticker's timestamps.
+        """
         self.source = source
         super().__init__(events, tickers, start_date, end_date,
                          asset_lib_name, market_lib_name)
+        self.fill_policies = _fill_policies(fill_policy, self.tickers)
+        self.calendar = calendar
+        # the tickers with a real bar at the current step.
+        self.updated_tickers = set()
+        # val_type -> the latest value of every ticker, kept up to date by
+        # _apply_step once it has been asked for.
+        self._latest_prices: Dict[str, np.ndarray] = {}
+
+    @lazy_property
+    def timeline(self) -> Iterator[Step]:
+        return iter(Timeline(self.ticker_data, self.calendar))
 
-    def _populate_ticker_data(self) -> Dict[str, Iterable[pd.Series]]:
+    def _populate_ticker_data(self) -> Dict[str, pd.DataFrame]:
         """
         Populate the ticker_data dict with a pandas OHLCV
         df as the value and the ticker as the key.
         """
-        comb_index = None
         df_dict = self._get_data()
         out = {}
 
         for t in self.tickers:
             out[t] = df_dict[t]
+            seeded = self.latest_ticker_data.get(t)
 
-            # TODO needed?
-            if comb_index is None:
-                comb_index = out[t].index
+            if seeded:
+                # these bars were already seen in a previous run.
+                out[t] = out[t][out[t].index > seeded[-1].name]
             else:
-                comb_index.union(out[t].index)
-
-            self.latest_ticker_data[t] = []
+                self.latest_ticker_data[t] = []
 
-        for t in self.tickers:
-            out[t] = out[t].iterrows()
-            # self.ticker_data[t] = (self.ticker_data[t].iterrows())
         return out
 
     @memoize
@@ -208,16 +317,6 @@ class Bars(DataHandler):
                                           end=self.end_date,
                                           **kwargs)
 
-    def _get_new_bar(self, ticker: str):
-        """
-        Get the latest bar from the data feed and return it as a tuple.
-
-        :return: bar
-        """
-        # yield from self.ticker_data
-        for bar in self.ticker_data[ticker]:
-            yield bar
-
     def get_latest_bar(self, ticker: str):
 
         try:
@@ -279,16 +378,152 @@ class Bars(DataHandler):
         else:
             return np.array([getattr(bar, val_type) for bar in bars_list])
 
+    def seed(self, latest_bars: Dict[str, List[pd.Series]]) -> None:
+        super().seed(latest_bars)
+        self._latest_prices = {}
+
+    def get_latest_prices(self, val_type) -> np.ndarray:
+        try:
+            return self._latest_prices[val_type]
+        except KeyError:
+            # every step after this one updates the prices in place.
+            prices = super().get_latest_prices(val_type).copy()
+            self._latest_prices[val_type] = prices
+            return prices
+
     def update_bars(self):
+        if self._push_next_bars():
+            self.events.put(MarketEvent())
+
+    def fast_forward(self, n: int) -> None:
+        for _ in range(n):
+            if not self.continue_backtest:
+                break
+            self._push_next_bars()
+
+    def _push_next_bars(self) -> bool:
+        """
+        Push the bars at the next step of the timeline to
+        ``latest_ticker_data`` and fill in the tickers without one.
+
+        :return: False if every ticker has run out of bars.
+        """
+        try:
+            current_dt, bars = next(self.timeline)
+        except StopIteration:
+            self.continue_backtest = False
+            return False
+
+        self._apply_step(current_dt, bars)
+        return True
+
+    def _apply_step(self, current_dt, bars: List[Tuple[str, pd.Series]]):
+        """Add the bars of one step and fill in the tickers without one."""
+        latest = self.latest_ticker_data
+        prices = self._latest_prices.items()
+        ticker_index = self.ticker_index
+        updated = set()
+
+        for ticker, bar in bars:
+            latest[ticker].append(bar)
+            updated.add(ticker)
+
+            for val_type, values in prices:
+                values[ticker_index[ticker]] = bar[val_type]
+
         for ticker in self.tickers:
-            try:
-                bar = next(self._get_new_bar(ticker))
-                # bar is a tuple and we only care about the 2nd value in it.
-                bar = bar[1]
-            except StopIteration:
-                self.continue_backtest = False
-            else:
-                if bar is not None:
-                    self.latest_ticker_data[ticker].append(bar)
+            if ticker in updated:
+                continue
 
+            policy = self.fill_policies[ticker]
+            prev = latest[ticker]
+
+            if policy is FillPolicy.SKIP or not prev:
+                # nothing to fill with before a ticker's first bar.
+                continue
+
+            bar = _fill_bar(prev[-1], current_dt, policy)
+            prev.append(bar)
+
+            for val_type, values in prices:
+                values[ticker_index[ticker]] = bar[val_type]
+
+        self.updated_tickers = updated
+        self.current_dt = current_dt
+        self.bar_count += 1
+
+
+class LiveBars(Bars):
+    """
+    Bars that are pushed to the data handler as they arrive from a feed
+    instead of being read from the DB up front.
+    """
+
+    def __init__(self,
+                 events: queue.Queue,
+                 tickers: Iterable,
+                 start_date: dt.datetime,
+                 end_date: dt.datetime,
+                 fill_policy=FillPolicy.FFILL,
+                 periods_per_year: int = None):
+        """
+        :param fill_policy: See :class:`Bars`.
+        :param periods_per_year: (optional) How many bars the feed sends in
+            a year. Defaults to one a trading day.
+        """
+        super().__init__(events, tickers, start_date, end_date,
+                         fill_policy=fill_policy)
+
+        if periods_per_year:
+            self.periods_per_year = periods_per_year
+
+        for ticker in self.tickers:
+            self.latest_ticker_data.setdefault(ticker, [])
+
+    def push(self, current_dt, bars: List[Tuple[str, pd.Series]]) -> None:
+        """
+        Add the bars for ``current_dt`` and put a :class:`MarketEvent` on
+        the queue.
+
+        :param current_dt: The time of the bars.
+        :param bars: A ``(ticker, bar)`` tuple for every ticker with a bar.
+        """
+        self._apply_step(current_dt, bars)
         self.events.put(MarketEvent())
+
+    def update_bars(self):
+        # bars are pushed by the feed.
+        pass
+
+    def _populate_ticker_data(self) -> Dict[str, pd.DataFrame]:
+        return {}
+
+
+def _fill_policies(fill_policy, tickers: Iterable[str]
+                   ) -> Dict[str, FillPolicy]:
+    """Resolve the fill policy of every ticker."""
+    if isinstance(fill_policy, dict):
+        policies = {t: FillPolicy.FFILL for t in tickers}
+        policies.update({t: FillPolicy.check_if_valid(p)
+                         for t, p in fill_policy.items()})
+        return policies
+
+    policy = FillPolicy.check_if_valid(fill_policy)
+    return {t: policy for t in tickers}
+
+
+def _fill_bar(prev: pd.Series, current_dt, policy: FillPolicy) -> pd.Series:
+    """A stand in bar for a ticker that has no bar at ``current_dt``."""
+    if policy is FillPolicy.NAN:
+        return pd.Series(np.nan, index=prev.index, name=current_dt)
+
+    bar = prev.copy()
+    bar.name = current_dt
+    price_cols = [c for c in (utils.OPEN_COL, utils.HIGH_COL, utils.LOW_COL)
+                  if c in bar.index]
+    bar[price_cols] = prev[utils.CLOSE_COL]
+
+    if utils.VOL_COL in bar.index:
+        bar[utils.VOL_COL] = 0
+
+    return bar
@@ -0,0 +1,587 @@
+"""
+Generate deterministic synthetic market data.
+
+This is meant for tests and benchmarks that should not depend on what is
+in the DB or on having a network connection. The same arguments always
+produce the same bars, and each ticker's bars only depend on the seed and
+the ticker's name, so neither the order of the tickers nor adding tickers to
+a universe changes the bars of a ticker.
+
+:func:`make_ohlcv` and :class:`SyntheticBars` build every bar up front,
+which is fine for small universes. :class:`SimulatedBars` generates
+correlated bars on the fly in batches and only keeps a fixed window of
+history, so it can simulate thousands of tickers over any horizon.
+"""
+import datetime as dt
+import logging
+import queue
+import zlib
+from typing import Dict, Iterable, Iterator, List, Mapping, Union
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import BDay, Day, Tick
+
+import pytech.utils as utils
+import pytech.utils.pandas_utils as pd_utils
+from pytech.backtest.event import MarketEvent
+from pytech.data.handler import Bars, DataHandler
+from pytech.decorators.decorators import memoize
+from pytech.utils.enums import FillPolicy
+
+# trading days in a year.
+PERIODS_PER_YEAR = 252
+
+OHLCV_COLS = [
+    pd_utils.OPEN_COL,
+    pd_utils.HIGH_COL,
+    pd_utils.LOW_COL,
+    pd_utils.CLOSE_COL,
+    pd_utils.ADJ_CLOSE_COL,
+    pd_utils.VOL_COL,
+]
+
+
+def make_tickers(n: int, prefix: str = 'SYN') -> List[str]:
+    """
+    Make ``n`` unique ticker names.
+
+    :param n: The number of tickers.
+    :param prefix: What every ticker starts with.
+    :return: A list of tickers such as ``['SYN0', 'SYN1']``.
+    """
+    width = len(str(max(n - 1, 0)))
+    return [f'{prefix}{i:0{width}d}' for i in range(n)]
+
+
+def make_ohlcv(tickers: Iterable[str],
+               periods: int = None,
+               start: dt.datetime = '2000-01-03',
+               end: dt.datetime = None,
+               freq: str = 'B',
+               seed: int = 0,
+               start_price: float = 100.0,
+               mu: float = .07,
+               sigma: float = .25,
+               avg_volume: float = 1e6,
+               periods_per_year: int = PERIODS_PER_YEAR
+               ) -> Dict[str, pd.DataFrame]:
+    """
+    Generate OHLCV bars that follow a geometric brownian motion.
+
+    Exactly two of ``periods``, ``start`` and ``end`` should be given, see
+    :func:`pd.date_range`.
+
+    :param tickers: The tickers to generate bars for.
+    :param periods: The number of bars per ticker.
+    :param start: The first bar.
+    :param end: The last bar.
+    :param freq: The frequency of the bars, e.g. ``B`` or ``1min``.
+    :param seed: The random seed.
+    :param start_price: The first open of every ticker.
+    :param mu: The annual drift.
+    :param sigma: The annual volatility.
+    :param avg_volume: The average volume per bar.
+    :param periods_per_year: How many bars make up a year. Used to scale
+        ``mu`` and ``sigma`` to a single bar. Use ``252 * 390`` for minute
+        bars.
+    :return: A ``dict[ticker, DataFrame]`` in the same format the
+        :class:`pytech.data.reader.BarReader` returns.
+    """
+    if start is not None and end is not None:
+        periods = None
+
+    index = pd.date_range(start=start, end=end, periods=periods, freq=freq,
+                          name=pd_utils.DATE_COL)
+    n = len(index)
+    step = 1 / periods_per_year
+    bar_vol = sigma * np.sqrt(step)
+    bar_drift = (mu - .5 * sigma ** 2) * step
+    out = {}
+
+    for ticker in tickers:
+        # a stable hash, unlike hash() which changes with every process.
+        rng = np.random.RandomState([seed, zlib.crc32(ticker.encode())])
+        log_returns = bar_drift + bar_vol * rng.standard_normal(n)
+        close = start_price * np.exp(np.cumsum(log_returns))
+
+        # the open gaps a little from the previous close.
+        prev_close = np.concatenate([[start_price], close[:-1]])
+        open_ = prev_close * np.exp(.1 * bar_vol * rng.standard_normal(n))
+
+        wick = .5 * bar_vol * np.abs(rng.standard_normal((2, n)))
+        high = np.maximum(open_, close) * (1 + wick[0])
+        low = np.minimum(open_, close) * (1 - wick[1])
+        volume = np.floor(rng.lognormal(np.log(avg_volume), .3, n))
+
+        out[ticker] = pd.DataFrame({
+            pd_utils.OPEN_COL: open_,
+            pd_utils.HIGH_COL: high,
+            pd_utils.LOW_COL: low,
+            pd_utils.CLOSE_COL: close,
+            pd_utils.ADJ_CLOSE_COL: close,
+            pd_utils.VOL_COL: volume,
+        }, index=index, columns=OHLCV_COLS)
+
+    return out
+
+
+class SyntheticBars(Bars):
+    """
+    A :class:`Bars` data handler that serves bars from :func:`make_ohlcv`
+    instead of reading them from the DB.
+
+    Use :func:`functools.partial` to pass the extra arguments when giving it
+    to a :class:`pytech.backtest.backtest.Backtest`.
+    """
+
+    def __init__(self,
+                 events: queue.Queue,
+                 tickers: Iterable,
+                 start_date: dt.datetime,
+                 end_date: dt.datetime,
+                 freq: str = 'B',
+                 seed: int = 0,
+                 fill_policy=FillPolicy.FFILL,
+                 calendar: pd.DatetimeIndex = None,
+                 **kwargs):
+        """
+        :param freq: The frequency of the bars.
+        :param seed: The random seed.
+        :param fill_policy: See :class:`Bars`.
+        :param calendar: See :class:`Bars`.
+        :param kwargs: Passed to :func:`make_ohlcv`.
+        """
+        self.freq = freq
+        self.seed_value = seed
+        self.ohlcv_kwargs = kwargs
+        self.periods_per_year = kwargs.get('periods_per_year',
+                                           PERIODS_PER_YEAR)
+        super().__init__(events, tickers, start_date, end_date,
+                         fill_policy=fill_policy, calendar=calendar)
+
+    @memoize
+    def _get_data(self,
+                  tickers: Iterable[str] = None,
+                  **kwargs) -> Dict[str, pd.DataFrame]:
+        return make_ohlcv(self.tickers,
+                          start=self.start_date,
+                          end=self.end_date,
+                          freq=self.freq,
+                          seed=self.seed_value,
+                          **self.ohlcv_kwargs)
+
+
+class SimulatedBars(DataHandler):
+    """
+    A :class:`DataHandler` that simulates bars for a universe of tickers as
+    the backtest runs.
+
+    Log returns follow a geometric brownian motion with optional Merton
+    jumps. The diffusion part of every ticker is correlated either through a
+    single market factor (a scalar ``correlation``) or a full correlation
+    matrix. Bars are generated a batch at a time for every ticker at once
+    and only the latest ``lookback`` bars are kept, so memory does not grow
+    with the length of the simulation.
+    """
+
+    def __init__(self,
+                 events: queue.Queue,
+                 tickers: Iterable[str],
+                 start_date: dt.datetime,
+                 end_date: dt.datetime,
+                 freq: str = 'B',
+                 seed: int = 0,
+                 correlation: Union[float, np.ndarray] = 0.0,
+                 mu: Union[float, np.ndarray] = .07,
+                 sigma: Union[float, np.ndarray] = .25,
+                 jump_intensity: float = 0.0,
+                 jump_mean: float = 0.0,
+                 jump_std: float = .05,
+                 start_price: Union[float, np.ndarray] = 100.0,
+                 avg_volume: float = 1e6,
+                 lookback: int = PERIODS_PER_YEAR,
+                 batch_size: int = None,
+                 session_open: str = '09:30',
+                 session_close: str = '16:00',
+                 session_tz: str = 'America/New_York',
+                 periods_per_year: int = None):
+        """
+        :param freq: The frequency of the bars. Anything shorter than a day,
+            e.g. ``5min``, generates bars between ``session_open`` and
+            ``session_close`` on every business day.
+        :param seed: The random seed.
+        :param correlation: Either the correlation every pair of tickers
+            has with each other or a correlation matrix with a row and
+            column for every ticker.
+        :param mu: The annual drift, either for all tickers or per ticker.
+        :param sigma: The annual volatility, either for all tickers or per
+            ticker.
+        :param jump_intensity: The expected number of jumps per year. 0
+            means no jumps.
+        :param jump_mean: The mean of the log size of a jump.
+        :param jump_std: The standard deviation of the log size of a jump.
+        :param start_price: The first open, either for all tickers or per
+            ticker.
+        :param avg_volume: The average volume per bar.
+        :param lookback: How many of the latest bars to keep for every
+            ticker. Requests for more bars than this get ``lookback`` bars.
+        :param batch_size: (optional) How many bars to generate at once.
+            Defaults to about 250,000 bars across all tickers per batch.
+        :param session_open: When the first intraday bar of a session starts.
+        :param session_close: When the last intraday bar of a session ends.
+        :param session_tz: The timezone of ``session_open`` and
+            ``session_close``.
+        :param periods_per_year: How many bars make up a year. Defaults to
+            252 sessions times the number of bars in a session.
+        """
+        super().__init__(events, tickers, start_date, end_date)
+        self.logger = logging.getLogger(__name__)
+        self.freq = freq
+        self.seed_value = seed
+        self.lookback = lookback
+        self.offset = to_offset(freq)
+        self.intraday = (isinstance(self.offset, Tick)
+                         and self.offset.nanos < Day().nanos)
+
+        if self.intraday:
+            self.session_offsets = _session_offsets(session_open,
+                                                    session_close,
+                                                    self.offset)
+            self.session_tz = session_tz
+            bars_per_session = len(self.session_offsets)
+        else:
+            bars_per_session = 1
+
+        n = len(self.tickers)
+        self.batch_size = batch_size or max(1, 250000 // n)
+        self.periods_per_year = (periods_per_year
+                                 or PERIODS_PER_YEAR * bars_per_session)
+
+        step = 1 / self.periods_per_year
+        sigma = _per_ticker(sigma, n)
+        self.bar_vol = sigma * np.sqrt(step)
+        # compensate the drift for the expected jump so mu is still the
+        # expected return.
+        jump_comp = jump_intensity * (np.exp(jump_mean + .5 * jump_std ** 2)
+                                      - 1)
+        self.bar_drift = (_per_ticker(mu, n) - jump_comp
+                          - .5 * sigma ** 2) * step
+        self.jump_prob = jump_intensity * step
+        self.jump_mean = jump_mean
+        self.jump_std = jump_std
+        self.avg_volume = avg_volume
+        self.correlation = correlation
+        self._chol = _cholesky(correlation, n)
+        self._rng = np.random.RandomState(seed)
+
+        self._ticker_idx = {t: i for i, t in enumerate(self.tickers)}
+        self._col_idx = {c: i for i, c in enumerate(OHLCV_COLS)}
+        self._last_close = _per_ticker(start_price, n).astype(float)
+        # every bar is written twice, ``lookback`` rows apart, so the latest
+        # window is always one contiguous slice.
+        self._history = np.full((2 * lookback, n, len(OHLCV_COLS)), np.nan)
+        self._dates = np.empty(2 * lookback, dtype=object)
+        self._pos = -1
+        self._filled = 0
+        # how many bars have been written, so cached views know when they
+        # are stale.
+        self._writes = 0
+        self._latest = None
+        # only bars after this are generated, set when seeded.
+        self._after = None
+        self._timestamps = None
+        self._batch = None
+        self._batch_dates = None
+        self._batch_pos = 0
+
+    @property
+    def latest_ticker_data(self) -> Mapping[str, List[pd.Series]]:
+        """
+        The latest bars for every ticker, built from the history window.
+
+        The bars of a ticker are only built the first time they are looked
+        up and are reused until the next bar is written.
+        """
+        if self._latest is None or self._latest.writes != self._writes:
+            self._latest = _LatestBars(self, self.lookback)
+
+        return self._latest
+
+    @latest_ticker_data.setter
+    def latest_ticker_data(self, latest_bars: Dict[str, List[pd.Series]]):
+        if latest_bars:
+            self.seed(latest_bars)
+
+    def get_latest_bar(self, ticker: str) -> pd.Series:
+        return self.get_latest_bars(ticker)[-1]
+
+    def get_latest_bars(self, ticker: str, n: int = 1) -> List[pd.Series]:
+        i = self._ticker_idx[ticker]
+        rows = self._window(n)
+        return [pd.Series(self._history[r, i], index=OHLCV_COLS,
+                          name=self._dates[r]) for r in rows]
+
+    def get_latest_bar_dt(self, ticker: str) -> dt.datetime:
+        return utils.parse_date(self._dates[self._window(1)[-1]])
+
+    def get_latest_bar_value(self, ticker: str, val_type, n=1) -> np.ndarray:
+        rows = self._window(n)
+        return self._history[rows, self._ticker_idx[ticker],
+                             self._col_idx[val_type]].copy()
+
+    def get_latest_values(self, val_type, n=1) -> np.ndarray:
+        """
+        The last ``n`` values of ``val_type`` for every ticker.
+
+        :return: An array with a row for every bar and a column for every
+            ticker in the same order as ``tickers``.
+        """
+        return self._history[self._window(n), :,
+                             self._col_idx[val_type]].copy()
+
+    def get_latest_prices(self, val_type) -> np.ndarray:
+        if not self._filled:
+            return np.full(len(self.tickers), np.nan)
+
+        return self._history[self._pos, :, self._col_idx[val_type]].copy()
+
+    def update_bars(self):
+        if self._push_next_bar():
+            self.events.put(MarketEvent())
+
+    def fast_forward(self, n: int) -> None:
+        for _ in range(n):
+            if not self._push_next_bar():
+                break
+
+    def seed(self, latest_bars: Dict[str, List[pd.Series]]) -> None:
+        """
+        Fill the history window with bars from a previous run and continue
+        the simulation from the last of them.
+
+        Every ticker must have a bar at the same times.
+        """
+        n = min(len(latest_bars[t]) for t in self.tickers)
+
+        for k in range(-n, 0):
+            row = np.array([latest_bars[t][k].reindex(OHLCV_COLS).values
+                            for t in self.tickers], dtype=float)
+            self._write(row, latest_bars[self.tickers[0]][k].name)
+
+        if n:
+            self._last_close = self._history[
+                self._window(1)[-1], :, self._col_idx[pd_utils.CLOSE_COL]]
+            self._after = self._dates[self._window(1)[-1]]
+
+    def _populate_ticker_data(self):
+        # bars are generated as they are needed.
+        return {}
+
+    def _window(self, n: int) -> np.ndarray:
+        """The rows of the latest ``n`` bars in ``_history``, oldest first."""
+        if not self._filled:
+            raise IndexError('No bars have been generated yet.')
+
+        n = min(n, self._filled)
+        end = self._pos + self.lookback + 1
+        return np.arange(end - n, end)
+
+    def _write(self, row: np.ndarray, date) -> None:
+        self._pos = (self._pos + 1) % self.lookback
+        self._history[self._pos] = row
+        self._history[self._pos + self.lookback] = row
+        self._dates[self._pos] = date
+        self._dates[self._pos + self.lookback] = date
+        self.current_dt = date
+        self._filled = min(self._filled + 1, self.lookback)
+        self._writes += 1
+
+    def _push_next_bar(self) -> bool:
+        """
+        Move the next bar of the current batch into the history window.
+
+        :return: False if the simulation has reached ``end_date``.
+        """
+        if self._batch is None or self._batch_pos == len(self._batch_dates):
+            if not self._next_batch():
+                self.continue_backtest = False
+                return False
+
+        self._write(self._batch[self._batch_pos],
+                    self._batch_dates[self._batch_pos])
+        self._batch_pos += 1
+        self.bar_count += 1
+        return True
+
+    def _next_batch(self) -> bool:
+        if self._timestamps is None:
+            self._timestamps = self._make_timestamps()
+
+        try:
+            dates = next(self._timestamps)
+        except StopIteration:
+            return False
+
+        self._batch_dates = dates
+        self._batch = self._simulate(len(dates))
+        self._batch_pos = 0
+        return True
+
+    def _simulate(self, n_bars: int) -> np.ndarray:
+        """
+        Simulate the next ``n_bars`` for every ticker.
+
+        :return: An array of shape ``(n_bars, tickers, len(OHLCV_COLS))``.
+        """
+        rng = self._rng
+        n = len(self.tickers)
+        shocks = rng.standard_normal((n_bars, n))
+
+        if self._chol is None:
+            rho = float(self.correlation)
+            if rho:
+                market = rng.standard_normal((n_bars, 1))
+                shocks = np.sqrt(rho) * market + np.sqrt(1 - rho) * shocks
+        else:
+            shocks = shocks @ self._chol.T
+
+        log_returns = self.bar_drift + self.bar_vol * shocks
+
+        if self.jump_prob:
+            jumps = rng.poisson(self.jump_prob, (n_bars, n))
+            has_jump = jumps > 0
+            log_returns[has_jump] += (
+                jumps[has_jump] * self.jump_mean
+                + np.sqrt(jumps[has_jump]) * self.jump_std
+                * rng.standard_normal(has_jump.sum()))
+
+        close = self._last_close * np.exp(np.cumsum(log_returns, axis=0))
+        prev_close = np.vstack([self._last_close, close[:-1]])
+        open_ = prev_close * np.exp(
+                .1 * self.bar_vol * rng.standard_normal((n_bars, n)))
+        wick = .5 * self.bar_vol * np.abs(rng.standard_normal((2, n_bars, n)))
+        high = np.maximum(open_, close) * (1 + wick[0])
+        low = np.minimum(open_, close) * (1 - wick[1])
+        volume = np.floor(rng.lognormal(np.log(self.avg_volume), .3,
+                                        (n_bars, n)))
+        self._last_close = close[-1]
+
+        # same order as OHLCV_COLS
+        return np.stack([open_, high, low, close, close, volume], axis=-1)
+
+    def _make_timestamps(self) -> Iterator[pd.DatetimeIndex]:
+        """Yield the timestamps of each batch until ``end_date``."""
+        if self.intraday:
+            # roughly batch_size bars worth of whole sessions.
+            sessions = max(1, self.batch_size // len(self.session_offsets))
+            cursor = self.start_date.tz_convert(None).normalize()
+        else:
+            cursor = self.start_date
+
+        while True:
+            if self.intraday:
+                days = pd.bdate_range(cursor, periods=sessions)
+                dates = pd.DatetimeIndex(
+                        (days.values[:, None]
+                         + self.session_offsets.values[None, :]).ravel())
+                dates = (dates.tz_localize(self.session_tz)
+                         .tz_convert('UTC').rename(pd_utils.DATE_COL))
+                cursor = days[-1] + BDay()
+            else:
+                # stop at end_date, batch_size bars of a few tickers can run
+                # past the last date pandas can represent.
+                dates = pd.date_range(cursor, self.end_date, freq=self.offset,
+                                      name=pd_utils.DATE_COL)[:self.batch_size]
+
+                if not len(dates):
+                    return
+
+                cursor = dates[-1] + self.offset
+
+            if dates[0] > self.end_date:
+                return
+
+            keep = (dates >= self.start_date) & (dates <= self.end_date)
+            if self._after is not None:
+                keep &= dates > self._after
+
+            if keep.any():
+                yield dates[keep]
+
+
+class _LatestBars(Mapping):
+    """
+    The latest ``n`` bars of every ticker of a :class:`SimulatedBars`, as of
+    when it was created.
+    """
+
+    def __init__(self, bars: SimulatedBars, n: int):
+        self.bars = bars
+        self.n = n
+        self.writes = bars._writes
+        self._built = {}
+
+    def __getitem__(self, ticker: str) -> List[pd.Series]:
+        try:
+            return self._built[ticker]
+        except KeyError:
+            latest = self.bars.get_latest_bars(ticker, self.n)
+            self._built[ticker] = latest
+            return latest
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.bars.tickers)
+
+    def __len__(self) -> int:
+        return len(self.bars.tickers)
+
+
+def _session_offsets(session_open: str,
+                     session_close: str,
+                     offset: Tick) -> pd.TimedeltaIndex:
+    """When each bar in a session starts relative to midnight."""
+    start = pd.Timedelta(session_open + ':00')
+    end = pd.Timedelta(session_close + ':00')
+    n = int((end - start) / pd.Timedelta(offset.nanos))
+
+    if n < 1:
+        raise ValueError(f'freq: {offset} is longer than the session.')
+
+    return pd.TimedeltaIndex([start + i * pd.Timedelta(offset.nanos)
+                              for i in range(n)])
+
+
+def _per_ticker(val: Union[float, np.ndarray], n: int) -> np.ndarray:
+    """Broadcast a scalar or per ticker parameter to one value per ticker."""
+    val = np.asarray(val, dtype=float)
+
+    if val.ndim and val.shape != (n,):
+        raise ValueError(f'Expected a scalar or {n} values, '
+                         f'got shape: {val.shape}')
+
+    return np.broadcast_to(val, (n,)).copy()
+
+
+def _cholesky(correlation: Union[float, np.ndarray], n: int):
+    """
+    The lower triangular factor of a correlation matrix or ``None`` if the
+    correlation is a single number that every pair shares.
+    """
+    corr = np.asarray(correlation, dtype=float)
+
+    if not corr.ndim:
+        if not 0 <= corr < 1:
+            raise ValueError(f'correlation must be in [0, 1). '
+                             f'{correlation} was provided.')
+        return None
+
+    if corr.shape != (n, n):
+        raise ValueError(f'correlation must be {n}x{n}, '
+                         f'got shape: {corr.shape}')
+
+    try:
+        return np.linalg.cholesky(corr)
+    except np.linalg.LinAlgError:
+        raise ValueError('correlation must be positive definite.')
@@ -0,0 +1,113 @@
+"""
+Merge the bars of many tickers into a single stream ordered by time.
+
+Tickers do not have to share the same timestamps. They can list and delist
+at different times, be halted, or trade on different holidays. Each
+ticker's bars are already sorted, so they are merged with a heap in
+O(total bars * log tickers).
+"""
+import heapq
+import itertools
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# (timestamp, [(ticker, bar), ...])
+Step = Tuple[pd.Timestamp, List[Tuple[str, pd.Series]]]
+
+
+class Timeline(object):
+    """
+    Iterate over the union of every ticker's timestamps, or over a given
+    calendar, yielding the tickers that have a new bar at each step.
+    """
+
+    def __init__(self,
+                 data: Dict[str, pd.DataFrame],
+                 calendar: pd.DatetimeIndex = None):
+        """
+        :param data: An OHLCV DataFrame for each ticker, sorted by time.
+        :param calendar: (optional) The timestamps to step through. If not
+            given every timestamp that any ticker has a bar at is a step.
+            If given, bars that fall between two calendar timestamps are
+            rolled into the next one and only the latest bar is kept.
+        """
+        self.data = data
+        self.calendar = calendar
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        """Every timestamp that will be stepped through."""
+        if self.calendar is not None:
+            return self.calendar
+
+        indexes = [df.index for df in self.data.values() if len(df)]
+
+        if not indexes:
+            return pd.DatetimeIndex([])
+
+        index = indexes[0]
+
+        for other in indexes[1:]:
+            index = index.union(other)
+
+        return index
+
+    def __iter__(self) -> Iterator[Step]:
+        if self.calendar is None:
+            return self._union()
+        else:
+            return self._on_calendar()
+
+    def _merged(self) -> Iterator[Tuple[int, int, pd.Timestamp, str,
+                                        pd.Series]]:
+        """Every bar of every ticker in time order."""
+        streams = [_stream(i, ticker, df)
+                   for i, (ticker, df) in enumerate(self.data.items())]
+        return heapq.merge(*streams)
+
+    def _union(self) -> Iterator[Step]:
+        for _, group in itertools.groupby(self._merged(),
+                                          key=lambda x: x[0]):
+            group = list(group)
+            yield group[0][2], [(ticker, bar)
+                                for _, _, _, ticker, bar in group]
+
+    def _on_calendar(self) -> Iterator[Step]:
+        merged = self._merged()
+        pending = next(merged, None)
+        started = False
+
+        for ts, ts_value in zip(self.calendar, _to_ns(self.calendar)):
+            bars = {}
+
+            while pending is not None and pending[0] <= ts_value:
+                bars[pending[3]] = pending[4]
+                pending = next(merged, None)
+
+            # once any ticker has started every calendar step is yielded,
+            # even if no ticker has a new bar.
+            started = started or bool(bars)
+
+            if started:
+                yield ts, list(bars.items())
+
+            if pending is None:
+                return
+
+
+def _stream(i: int, ticker: str, df: pd.DataFrame):
+    # the position breaks ties so bars are never compared.
+    for ts_value, (ts, bar) in zip(_to_ns(df.index), df.iterrows()):
+        yield ts_value, i, ts, ticker, bar
+
+
+def _to_ns(index: pd.DatetimeIndex) -> np.ndarray:
+    """Nanoseconds since the epoch in UTC, naive times are taken as UTC."""
+    index = pd.DatetimeIndex(index)
+
+    if index.tz is not None:
+        index = index.tz_convert(None)
+
+    return np.asarray(index, dtype='datetime64[ns]').view(np.int64)
@@ -0,0 +1,424 @@
+"""
+Performance analytics for one or many equity curves at once.
+
+A :class:`Tearsheet` holds a ``(periods, runs)`` matrix with a column for
+every equity curve, e.g. every result of a parameter sweep, and computes
+drawdown tables, underwater curves, rolling Sharpe ratios and betas and
+monthly returns for every column in a single pass of NumPy operations.
+Thousands of curves cost a handful of array operations instead of a Python
+loop per curve.
+
+Every result is cached on the tearsheet, and :func:`tearsheet` caches the
+tearsheets themselves by a hash of the curves, so asking for the same
+analysis of the same curves again is free.
+
+Example::
+
+    sheet = tearsheet(pd.DataFrame(backtest.equity_curves()))
+    sheet.summary()
+    sheet.drawdown_table(top=5)
+    sheet.monthly_heatmap()
+"""
+import collections
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Hashable, Union
+
+import numpy as np
+import pandas as pd
+
+from pytech.fin.analysis.resample import (CAGR, MAX_DRAWDOWN,
+                                          PERIODS_PER_YEAR, SHARPE,
+                                          _equity_series, path_metrics)
+
+logger = logging.getLogger(__name__)
+
+# how many tearsheets :func:`tearsheet` keeps around.
+CACHE_SIZE = 16
+
+_tearsheets: 'collections.OrderedDict[str, Tearsheet]' = (
+    collections.OrderedDict())
+
+EquityLike = Union[pd.DataFrame, pd.Series, np.ndarray, Dict[str, Any]]
+
+
+class Tearsheet(object):
+    """Vectorized performance analytics of a matrix of equity curves."""
+
+    def __init__(self,
+                 equity: EquityLike,
+                 benchmark: Union[pd.Series, np.ndarray] = None,
+                 rf: float = 0.0,
+                 periods_per_year: int = PERIODS_PER_YEAR):
+        """
+        :param equity: The curves to analyze. Either a DataFrame with a
+            column per run, a dict of run name to curve, a single curve or a
+            ``(periods, runs)`` array. An equity curve DataFrame from
+            :meth:`AbstractPortfolio.create_equity_curve_df` counts as one
+            run. Every curve must share the same periods.
+        :param benchmark: (optional) The benchmark's prices over the same
+            periods, needed for :meth:`rolling_beta`.
+        :param rf: The annual risk free rate.
+        :param periods_per_year: How many periods there are in a year.
+        """
+        self.logger = logging.getLogger(__name__)
+        frame = _as_frame(equity)
+        self.values: np.ndarray = frame.values.astype(float)
+        self.index: pd.Index = frame.index
+        self.columns: pd.Index = frame.columns
+        self.rf = rf
+        self.periods_per_year = periods_per_year
+
+        if len(self.values) < 2:
+            raise ValueError('An equity curve needs at least 2 values.')
+
+        if benchmark is not None:
+            benchmark = np.asarray(benchmark, dtype=float).ravel()
+
+            if len(benchmark) != len(self.values):
+                raise ValueError(
+                        f'benchmark has {len(benchmark)} values but the '
+                        f'equity curves have {len(self.values)}.')
+
+        self.benchmark = benchmark
+        self._cache: Dict[Hashable, Any] = {}
+
+    @property
+    def n_runs(self) -> int:
+        return self.values.shape[1]
+
+    @property
+    def returns(self) -> np.ndarray:
+        """The ``(periods - 1, runs)`` period returns."""
+        return self._cached('returns', self._returns)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Total return, CAGR, volatility, Sharpe, Sortino, max drawdown and
+        Calmar ratio with a row per run.
+        """
+        return self._cached('summary', self._summary)
+
+    def underwater(self) -> pd.DataFrame:
+        """How far below its running peak each curve is at every period."""
+        return self._frame(self._cached('underwater', self._underwater))
+
+    def drawdown_table(self, top: int = 5) -> pd.DataFrame:
+        """
+        The worst ``top`` drawdowns of each run.
+
+        :param top: How many drawdowns to keep per run.
+        :return: A DataFrame indexed by run and rank with the ``peak``,
+            ``trough`` and ``recovery`` of each drawdown, its depth as
+            ``drawdown`` and how many periods it lasted as ``duration``.
+            Drawdowns that haven't recovered have a null ``recovery`` and
+            are measured to the last period.
+        """
+        return self._cached(('drawdown_table', top),
+                            lambda: self._drawdown_table(top))
+
+    def rolling_sharpe(self, window: int = 126) -> pd.DataFrame:
+        """
+        The annualized Sharpe ratio of every run over a rolling window.
+
+        :param window: How many returns are in each window.
+        """
+        return self._frame(self._cached(('rolling_sharpe', window),
+                                        lambda: self._rolling_sharpe(window)),
+                           self.index[1:])
+
+    def rolling_beta(self, window: int = 126) -> pd.DataFrame:
+        """
+        The beta of every run against the benchmark over a rolling window.
+
+        :param window: How many returns are in each window.
+        """
+        if self.benchmark is None:
+            raise ValueError('A benchmark is needed to calculate beta.')
+
+        return self._frame(self._cached(('rolling_beta', window),
+                                        lambda: self._rolling_beta(window)),
+                           self.index[1:])
+
+    def monthly_returns(self) -> pd.DataFrame:
+        """The return of every run in every month, indexed by month end."""
+        return self._cached('monthly_returns', self._monthly_returns)
+
+    def monthly_heatmap(self) -> pd.DataFrame:
+        """
+        Monthly returns laid out for a heatmap.
+
+        :return: A DataFrame indexed by run and year with a column for each
+            month from 1 to 12.
+        """
+        return self._cached('monthly_heatmap', self._monthly_heatmap)
+
+    def _cached(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        try:
+            return self._cache[key]
+        except KeyError:
+            val = self._cache[key] = func()
+            return val
+
+    def _frame(self, values: np.ndarray, index: pd.Index = None
+               ) -> pd.DataFrame:
+        if index is None:
+            index = self.index
+
+        return pd.DataFrame(values, index=index, columns=self.columns)
+
+    def _returns(self) -> np.ndarray:
+        values = self.values
+        return values[1:] / values[:-1] - 1
+
+    def _underwater(self) -> np.ndarray:
+        values = self.values
+        return values / np.maximum.accumulate(values, axis=0) - 1
+
+    def _summary(self) -> pd.DataFrame:
+        returns = self.returns
+        ppy = self.periods_per_year
+        metrics = path_metrics(returns.T, self.rf, ppy)
+        excess = returns - self.rf / ppy
+        downside = np.sqrt((np.minimum(excess, 0) ** 2).mean(axis=0))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sortino = excess.mean(axis=0) / downside * np.sqrt(ppy)
+            calmar = metrics[CAGR] / -metrics[MAX_DRAWDOWN]
+
+        return pd.DataFrame({
+            'total_return': self.values[-1] / self.values[0] - 1,
+            CAGR: metrics[CAGR],
+            'volatility': returns.std(axis=0, ddof=1) * np.sqrt(ppy),
+            SHARPE: metrics[SHARPE],
+            'sortino': sortino,
+            MAX_DRAWDOWN: metrics[MAX_DRAWDOWN],
+            'calmar': calmar,
+        }, index=self.columns, columns=['total_return', CAGR, 'volatility',
+                                        SHARPE, 'sortino', MAX_DRAWDOWN,
+                                        'calmar'])
+
+    def _drawdown_table(self, top: int) -> pd.DataFrame:
+        underwater = self._cached('underwater', self._underwater)
+        n, runs = underwater.shape
+
+        # every run laid end to end with a key that is unique to each
+        # stretch between new peaks, so each drawdown is a contiguous
+        # segment of the flat array.
+        flat = underwater.T.ravel()
+        stretch = np.cumsum(underwater >= 0, axis=0).T
+        key = (np.arange(runs)[:, None] * (n + 1) + stretch).ravel()
+        starts = np.flatnonzero(np.concatenate([[True],
+                                                key[1:] != key[:-1]]))
+        ends = np.append(starts[1:], len(flat))
+        depth = np.minimum.reduceat(flat, starts)
+        # every position that equals the minimum of its segment.
+        hits = np.flatnonzero(flat == np.repeat(depth, ends - starts))
+
+        keep = depth < 0
+        starts, ends, depth = starts[keep], ends[keep], depth[keep]
+        troughs = hits[np.searchsorted(hits, starts)]
+        run = starts // n
+
+        # deepest first within each run.
+        order = np.lexsort((depth, run))
+        starts, ends, depth, troughs, run = (starts[order], ends[order],
+                                             depth[order], troughs[order],
+                                             run[order])
+        first = np.searchsorted(run, run)
+        rank = np.arange(len(run)) - first
+        keep = rank < top
+        starts, ends, depth, troughs, run, rank = (
+            starts[keep], ends[keep], depth[keep], troughs[keep], run[keep],
+            rank[keep])
+
+        peak = starts % n
+        trough = troughs % n
+        # a drawdown recovers on the period that starts the next stretch
+        # of the same run.
+        recovered = ends < (run + 1) * n
+        recovery = np.where(recovered, ends % n, n - 1)
+
+        return pd.DataFrame({
+            'peak': self._labels(peak),
+            'trough': self._labels(trough),
+            'recovery': self._labels(recovery, recovered),
+            'drawdown': depth,
+            'duration': recovery - peak,
+        }, index=pd.MultiIndex.from_arrays([self.columns[run], rank],
+                                           names=['run', 'rank']),
+            columns=['peak', 'trough', 'recovery', 'drawdown', 'duration'])
+
+    def _labels(self, rows: np.ndarray, mask: np.ndarray = None) -> pd.Index:
+        """The index labels of ``rows``, null where ``mask`` is False."""
+        labels = self.index[rows]
+
+        if mask is not None:
+            labels = labels.where(mask)
+
+        return labels
+
+    def _rolling_sharpe(self, window: int) -> np.ndarray:
+        excess = self.returns - self.rf / self.periods_per_year
+        mean, var = _rolling_moments(excess, window)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return mean / np.sqrt(var) * np.sqrt(self.periods_per_year)
+
+    def _rolling_beta(self, window: int) -> np.ndarray:
+        returns = self.returns
+        bench = self.benchmark[1:] / self.benchmark[:-1] - 1
+        _check_window(window, len(returns))
+
+        # demeaning first keeps the differences of cumulative sums from
+        # losing precision.
+        x = returns - returns.mean(axis=0)
+        y = (bench - bench.mean())[:, None]
+        sum_x = _window_sums(x, window)
+        sum_y = _window_sums(y, window)
+        cov = _window_sums(x * y, window) - sum_x * sum_y / window
+        var = _window_sums(y * y, window) - sum_y * sum_y / window
+
+        out = np.full(returns.shape, np.nan)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[window - 1:] = cov / var
+
+        return out
+
+    def _month_ends(self) -> np.ndarray:
+        """The row of the last period of every month."""
+        if not isinstance(self.index, pd.DatetimeIndex):
+            raise ValueError('Monthly returns need curves indexed by date.')
+
+        month = self.index.year * 12 + self.index.month
+        month = np.asarray(month)
+        return np.flatnonzero(np.append(month[1:] != month[:-1], True))
+
+    def _monthly_returns(self) -> pd.DataFrame:
+        ends = self._month_ends()
+        values = self.values[ends]
+        # the first month is measured from the first period.
+        prev = np.concatenate([self.values[:1], values[:-1]])
+        return self._frame(values / prev - 1, self.index[ends])
+
+    def _monthly_heatmap(self) -> pd.DataFrame:
+        monthly = self.monthly_returns()
+        index = monthly.index
+        years = np.unique(index.year)
+        year_pos = np.searchsorted(years, index.year)
+        month_pos = np.asarray(index.month) - 1
+
+        grid = np.full((self.n_runs, len(years), 12), np.nan)
+        grid[:, year_pos, month_pos] = monthly.values.T
+
+        return pd.DataFrame(grid.reshape(-1, 12),
+                            index=pd.MultiIndex.from_product(
+                                    [self.columns, years],
+                                    names=['run', 'year']),
+                            columns=range(1, 13))
+
+
+def tearsheet(equity: EquityLike,
+              benchmark: Union[pd.Series, np.ndarray] = None,
+              rf: float = 0.0,
+              periods_per_year: int = PERIODS_PER_YEAR) -> Tearsheet:
+    """
+    Get a :class:`Tearsheet` for ``equity``, reusing the last one built for
+    the same curves and parameters.
+
+    The parameters are the same as :class:`Tearsheet`.
+    """
+    frame = _as_frame(equity)
+    key = _curve_hash(frame, benchmark, rf, periods_per_year)
+
+    try:
+        sheet = _tearsheets[key]
+    except KeyError:
+        sheet = Tearsheet(frame, benchmark, rf, periods_per_year)
+        _tearsheets[key] = sheet
+
+        if len(_tearsheets) > CACHE_SIZE:
+            _tearsheets.popitem(last=False)
+    else:
+        _tearsheets.move_to_end(key)
+        logger.debug('Reusing cached tearsheet.')
+
+    return sheet
+
+
+def clear_cache() -> None:
+    """Forget every tearsheet built by :func:`tearsheet`."""
+    _tearsheets.clear()
+
+
+def _as_frame(equity: EquityLike) -> pd.DataFrame:
+    """A DataFrame with a column for every run in ``equity``."""
+    if isinstance(equity, dict):
+        return pd.DataFrame({name: _equity_series(curve)
+                             for name, curve in equity.items()},
+                            columns=list(equity))
+
+    if isinstance(equity, pd.DataFrame):
+        if 'total' in equity.columns:
+            return equity[['total']]
+        return equity
+
+    if isinstance(equity, pd.Series):
+        return equity.to_frame(equity.name or 0)
+
+    values = np.asarray(equity, dtype=float)
+
+    if values.ndim == 1:
+        values = values[:, None]
+
+    return pd.DataFrame(values)
+
+
+def _curve_hash(frame: pd.DataFrame, *args) -> str:
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(frame.values, dtype=float).data)
+    h.update(repr((list(frame.columns), frame.shape)).encode())
+
+    if isinstance(frame.index, pd.DatetimeIndex):
+        h.update(np.ascontiguousarray(frame.index.asi8).data)
+    else:
+        h.update(repr(list(frame.index)).encode())
+
+    for arg in args:
+        if arg is None or np.isscalar(arg):
+            h.update(repr(arg).encode())
+        else:
+            h.update(np.ascontiguousarray(arg, dtype=float).data)
+
+    return h.hexdigest()
+
+
+def _check_window(window: int, n: int) -> None:
+    if not 2 <= window <= n:
+        raise ValueError(f'window must be between 2 and {n}. '
+                         f'{window} was provided.')
+
+
+def _window_sums(x: np.ndarray, window: int) -> np.ndarray:
+    """The sum of every ``window`` consecutive rows of ``x``."""
+    cum = np.cumsum(x, axis=0)
+    out = cum[window - 1:].copy()
+    out[1:] -= cum[:-window]
+    return out
+
+
+def _rolling_moments(x: np.ndarray, window: int):
+    """The rolling mean and sample variance of every column of ``x``."""
+    _check_window(window, len(x))
+    shift = x.mean(axis=0)
+    centered = x - shift
+    sums = _window_sums(centered, window)
+    sums_sq = _window_sums(centered * centered, window)
+
+    mean = np.full(x.shape, np.nan)
+    var = np.full(x.shape, np.nan)
+    mean[window - 1:] = sums / window + shift
+    var[window - 1:] = np.maximum(
+            (sums_sq - sums * sums / window) / (window - 1), 0)
+    return mean, var
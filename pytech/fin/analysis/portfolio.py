@@ -1,4 +1,5 @@
 import logging
+import time
 from typing import List, Tuple
 
 import matplotlib.pyplot as plt
@@ -8,6 +9,7 @@ from scipy.optimize import OptimizeResult, minimize
 
 import pytech.data.reader as reader
 import pytech.utils.pandas_utils as pd_utils
+from pytech.decorators.decorators import lazy_property
 from pytech.utils.common_utils import tail
 
 
@@ -17,21 +19,44 @@ class EfficientFrontier(object):
     def __init__(self, tickers: List[str] = None,
                  rf: float = None,
                  asset_lib_name: str = 'pytech.bars',
-                 market_lib_name: str = 'pytech.market'):
+                 market_lib_name: str = 'pytech.market',
+                 prices: pd.DataFrame = None):
+        """
+        :param tickers: The tickers to include. Defaults to every ticker in
+            the asset library.
+        :param rf: The risk free rate.
+        :param asset_lib_name: The library to read the asset prices from.
+        :param market_lib_name: The library to read the market prices from.
+        :param prices: (optional) A DataFrame of close prices with a column
+            for each ticker. If given, nothing is read from the DB.
+        """
         self.logger = logging.getLogger(__name__)
         self.asset_lib_name = asset_lib_name
         self.market_lib_name = market_lib_name
-        self.market_reader = reader.BarReader(self.market_lib_name)
-        self.asset_reader = reader.BarReader(self.asset_lib_name)
 
-        if tickers is None:
-            self.tickers = []
+        if prices is not None:
+            if tickers is not None:
+                prices = prices[tickers]
+            prices = prices.dropna()
+            self.tickers = list(prices.columns)
+            self.prices = [list(prices[t]) for t in self.tickers]
         else:
-            self.tickers = tickers
+            if tickers is None:
+                self.tickers = []
+            else:
+                self.tickers = tickers
+            self.prices = self._load_data()
 
-        self.prices = self._load_data()
         self.rf = rf
 
+    @lazy_property
+    def asset_reader(self) -> reader.BarReader:
+        return reader.BarReader(self.asset_lib_name)
+
+    @lazy_property
+    def market_reader(self) -> reader.BarReader:
+        return reader.BarReader(self.market_lib_name)
+
     @property
     def rf(self):
         return self._rf
@@ -138,37 +163,140 @@ class EfficientFrontier(object):
         return np.array(frontier_mean), np.array(frontier_var)
 
     def _solve_weights(self, returns: np.array,
-                       covar: np.matrix) -> OptimizeResult:
+                       covar: np.matrix,
+                       x0: np.ndarray = None) -> np.ndarray:
         """
         Solve for the optimal weights.
 
         :param returns: numpy array of the average historical returns.
         :param covar: matrix of covariances.
+        :param x0: (optional) The weights to start from. Defaults to equal
+            weights.
         :return: optimal weights.
         """
+        optimized = solve_tangency(returns, covar, self.rf, x0)
 
-        def fitness(weights, returns, covar, rf):
-            mean, var = _mean_var(weights, returns, covar)
-            sharpe = (mean - rf) / np.sqrt(var)
-            return 1 / sharpe
-
-        assets = len(returns)
-        base_weights = np.ones([assets]) / assets
-        # weights can be positive or negative
-        b_ = [(0, 1) for _ in range(assets)]
-        c_ = ({'type': 'eq', 'fun': lambda weights: sum(weights) - 1.0})
-        optimized = minimize(fitness,
-                             base_weights,
-                             (returns, covar, self.rf),
-                             method='SLSQP',
-                             constraints=c_,
-                             bounds=b_)
         if not optimized.success:
             raise BaseException(optimized.message)
         else:
             return optimized.x
 
 
+def solve_tangency(returns: np.ndarray,
+                   covar: np.ndarray,
+                   rf: float,
+                   x0: np.ndarray = None,
+                   max_time: float = None,
+                   max_weight: float = 1.0) -> OptimizeResult:
+    """
+    Find the long only weights with the highest Sharpe ratio.
+
+    :param returns: The expected return of each asset.
+    :param covar: The covariance matrix of the returns.
+    :param rf: The risk free rate.
+    :param x0: (optional) The weights to start from, e.g. the last
+        solution. Defaults to equal weights.
+    :param max_time: (optional) How many seconds the solver may run. If it
+        runs out of time the best weights found so far are returned with
+        ``success`` False and ``timed_out`` True.
+    :param max_weight: The most any single asset may be weighted.
+    :return: The result of :func:`scipy.optimize.minimize`.
+    """
+    returns = np.asarray(returns, dtype=float)
+    covar = np.asarray(covar, dtype=float)
+    assets = len(returns)
+
+    if x0 is None or not np.sum(x0):
+        x0 = np.ones([assets]) / assets
+
+    if max_time is None:
+        deadline = None
+    else:
+        deadline = time.perf_counter() + max_time
+
+    def fitness(weights):
+        mean, var = _mean_var(weights, returns, covar)
+        sharpe = (mean - rf) / np.sqrt(var)
+        return 1 / sharpe
+
+    def gradient(weights):
+        covar_w = np.dot(covar, weights)
+        std = np.sqrt(np.dot(weights, covar_w))
+        excess = np.dot(weights, returns) - rf
+        return covar_w / (std * excess) - std * returns / excess ** 2
+
+    best = {'x': np.asarray(x0, dtype=float), 'nit': 0}
+
+    def out_of_time(weights):
+        best['x'] = np.array(weights)
+        best['nit'] += 1
+
+        if deadline is not None and time.perf_counter() > deadline:
+            raise _OutOfTime()
+
+    b_ = [(0, max_weight) for _ in range(assets)]
+    c_ = ({'type': 'eq',
+           'fun': lambda weights: sum(weights) - 1.0,
+           'jac': lambda weights: np.ones_like(weights)})
+
+    try:
+        return minimize(fitness,
+                        x0,
+                        method='SLSQP',
+                        jac=gradient,
+                        constraints=c_,
+                        bounds=b_,
+                        callback=out_of_time)
+    except _OutOfTime:
+        return OptimizeResult(x=best['x'], success=False, timed_out=True,
+                              nit=best['nit'],
+                              message=f'Ran out of time after {max_time}s.')
+
+
+def project_capped_simplex(weights: np.ndarray,
+                           max_weight: float = 1.0,
+                           tol: float = 1e-12) -> np.ndarray:
+    """
+    The closest long only weights that sum to 1 with none above
+    ``max_weight``, e.g. to repair the weights of a solve that stopped
+    early.
+
+    The projection is ``clip(weights - tau, 0, max_weight)`` for the
+    ``tau`` that makes it sum to 1, which is found by bisection.
+
+    :param weights: The weights to project.
+    :param max_weight: The most any single asset may be weighted.
+    :param tol: How close to 1 the sum of the weights has to be.
+    :return: The projected weights, or ``None`` if no weights can satisfy
+        ``max_weight``.
+    """
+    weights = np.nan_to_num(np.asarray(weights, dtype=float))
+
+    if len(weights) * max_weight < 1 - tol:
+        return None
+
+    # the sum is max_weight * n at lo and 0 at hi, and falls as tau rises.
+    lo = weights.min() - max_weight
+    hi = weights.max()
+
+    for _ in range(100):
+        tau = (lo + hi) / 2
+        total = np.clip(weights - tau, 0, max_weight).sum()
+
+        if abs(total - 1) <= tol:
+            break
+        elif total > 1:
+            lo = tau
+        else:
+            hi = tau
+
+    return np.clip(weights - tau, 0, max_weight)
+
+
+class _OutOfTime(Exception):
+    """Raised from inside the solver to stop it."""
+
+
 class _FrontierResult(object):
     """Holds the results of the Frontier calculations."""
 
@@ -0,0 +1,321 @@
+"""
+Resample the results of a backtest to see how much of them was luck.
+
+A single equity curve only shows one of the many ways the same strategy
+could have played out. The functions here build thousands of alternative
+paths from it and return the distribution of CAGR, max drawdown and Sharpe
+ratio across them.
+
+* :func:`bootstrap` rebuilds paths from randomly chosen blocks of the
+  curve's returns. Sampling blocks instead of single days keeps most of the
+  autocorrelation and volatility clustering of the original returns.
+* :func:`permute_trades` cuts the curve at every trade and shuffles the
+  order of the pieces. The final value of every path is the same, so CAGR
+  and Sharpe don't change, but drawdowns show how much of the original max
+  drawdown depended on the order the trades happened in.
+
+Paths are built a chunk at a time as one index matrix into the original
+returns, so no path is ever built with a Python loop and memory stays
+bounded no matter how many samples are drawn. Chunks are spread across
+processes.
+
+Example::
+
+    portfolio.create_equity_curve_df()
+    result = bootstrap(portfolio.equity_curve, n_samples=10000)
+    result.summary()
+"""
+import concurrent.futures
+import logging
+import os
+from typing import Any, Dict, Iterable, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PERIODS_PER_YEAR = 252
+
+CAGR = 'cagr'
+MAX_DRAWDOWN = 'max_drawdown'
+SHARPE = 'sharpe'
+
+METRICS = (CAGR, MAX_DRAWDOWN, SHARPE)
+
+# roughly how many returns are resampled at once per chunk.
+_CHUNK_ELEMENTS = 2 ** 21
+
+
+class ResampleResult(object):
+    """The metrics of every resampled path and of the original curve."""
+
+    def __init__(self,
+                 method: str,
+                 samples: pd.DataFrame,
+                 actual: Dict[str, float]):
+        """
+        :param method: How the paths were made.
+        :param samples: A row for every path with a column for each metric.
+        :param actual: The metrics of the original curve.
+        """
+        self.method = method
+        self.samples = samples
+        self.actual = actual
+
+    def __len__(self):
+        return len(self.samples)
+
+    def summary(self,
+                percentiles: Sequence[float] = (.05, .25, .5, .75, .95)
+                ) -> pd.DataFrame:
+        """
+        Describe the distribution of each metric.
+
+        :param percentiles: The percentiles to include.
+        :return: A DataFrame with a column for each metric and a row for the
+            actual value, the mean, the std and each percentile.
+        """
+        out = self.samples.quantile(list(percentiles))
+        out.index = [f'{p:.0%}' for p in percentiles]
+        stats = pd.DataFrame([self.actual,
+                              self.samples.mean(),
+                              self.samples.std()],
+                             index=['actual', 'mean', 'std'])
+        return pd.concat([stats, out])[list(self.samples.columns)]
+
+    def percentile_of_actual(self) -> Dict[str, float]:
+        """
+        The share of paths that did worse than the original curve for each
+        metric.
+        """
+        return {m: float((self.samples[m] < v).mean())
+                for m, v in self.actual.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'method': self.method,
+            'samples': len(self),
+            'actual': self.actual,
+            'summary': self.summary().to_dict(),
+        }
+
+    def __str__(self):
+        return (f'{self.method}: {len(self)} paths\n'
+                f'{self.summary().to_string(float_format="{:.4f}".format)}')
+
+
+def bootstrap(equity: Union[pd.DataFrame, pd.Series, np.ndarray],
+              n_samples: int = 10000,
+              block_size: int = None,
+              rf: float = 0.0,
+              periods_per_year: int = PERIODS_PER_YEAR,
+              seed: int = None,
+              n_jobs: int = None) -> ResampleResult:
+    """
+    Circular block bootstrap of an equity curve's returns.
+
+    :param equity: The output of
+        :meth:`AbstractPortfolio.create_equity_curve_df`, or the values of
+        the portfolio as a Series or array.
+    :param n_samples: How many paths to draw.
+    :param block_size: How many consecutive returns to draw at a time.
+        Defaults to the cube root of the number of returns.
+    :param rf: The annual risk free rate used for the Sharpe ratio.
+    :param periods_per_year: How many returns there are in a year.
+    :param seed: (optional) Makes the paths reproducible. The same seed
+        gives the same paths no matter how many processes are used.
+    :param n_jobs: How many processes to use. Defaults to the number of
+        CPUs, 1 runs everything in this process.
+    :return: The metrics of every path.
+    """
+    returns = equity_returns(equity)
+    n = len(returns)
+
+    if block_size is None:
+        block_size = max(1, int(round(n ** (1 / 3))))
+
+    if not 1 <= block_size <= n:
+        raise ValueError(f'block_size must be between 1 and {n}. '
+                         f'{block_size} was provided.')
+
+    return _run('bootstrap', returns, _bootstrap_chunk, (block_size,),
+                n_samples, rf, periods_per_year, seed, n_jobs)
+
+
+def permute_trades(equity: Union[pd.DataFrame, pd.Series],
+                   trades: Iterable,
+                   n_samples: int = 10000,
+                   rf: float = 0.0,
+                   periods_per_year: int = PERIODS_PER_YEAR,
+                   seed: int = None,
+                   n_jobs: int = None) -> ResampleResult:
+    """
+    Shuffle the order of the pieces of the equity curve between trades.
+
+    :param equity: The output of
+        :meth:`AbstractPortfolio.create_equity_curve_df` or a Series of the
+        value of the portfolio. It must be indexed by date.
+    :param trades: :attr:`Blotter.trades`, a list of trades or just the
+        dates of the trades.
+    :param n_samples: How many paths to draw.
+    :param rf: The annual risk free rate used for the Sharpe ratio.
+    :param periods_per_year: How many returns there are in a year.
+    :param seed: (optional) Makes the paths reproducible.
+    :param n_jobs: How many processes to use. Defaults to the number of
+        CPUs, 1 runs everything in this process.
+    :return: The metrics of every path.
+    """
+    returns = equity_returns(equity)
+    index = _equity_series(equity).index[1:]
+
+    if isinstance(getattr(trades, 'dates', None), pd.DatetimeIndex):
+        # a TradeLog.
+        dates = trades.dates
+    else:
+        dates = pd.DatetimeIndex([getattr(t, 'trade_date', t)
+                                  for t in trades])
+
+    if index.tz is not None and dates.tz is None:
+        dates = dates.tz_localize(index.tz)
+    elif index.tz is None and dates.tz is not None:
+        dates = dates.tz_convert(None)
+
+    # the first return after each trade starts a new piece.
+    cuts = np.unique(np.searchsorted(index, dates, side='right'))
+    cuts = cuts[(cuts > 0) & (cuts < len(returns))]
+    starts = np.concatenate([[0], cuts])
+    lengths = np.diff(np.concatenate([starts, [len(returns)]]))
+
+    if len(starts) < 2:
+        logger.warning('Fewer than 2 pieces between trades, every '
+                       'permutation is the original curve.')
+
+    return _run('permute_trades', returns, _permute_chunk, (starts, lengths),
+                n_samples, rf, periods_per_year, seed, n_jobs)
+
+
+def equity_returns(equity: Union[pd.DataFrame, pd.Series, np.ndarray]
+                   ) -> np.ndarray:
+    """The period returns of an equity curve as a float array."""
+    values = np.asarray(_equity_series(equity), dtype=float)
+    values = values[~np.isnan(values)]
+
+    if len(values) < 2:
+        raise ValueError('An equity curve needs at least 2 values.')
+
+    return values[1:] / values[:-1] - 1
+
+
+def path_metrics(returns: np.ndarray,
+                 rf: float = 0.0,
+                 periods_per_year: int = PERIODS_PER_YEAR
+                 ) -> Dict[str, np.ndarray]:
+    """
+    CAGR, max drawdown and Sharpe ratio of every row of ``returns``.
+
+    :param returns: An ``(paths, periods)`` array of returns.
+    :param rf: The annual risk free rate.
+    :param periods_per_year: How many returns there are in a year.
+    :return: An array for each metric with a value per path.
+    """
+    returns = np.atleast_2d(returns)
+    periods = returns.shape[1]
+    log_equity = np.cumsum(np.log1p(returns), axis=1)
+
+    # the curve starts at 0 in log space so drawdowns are measured from the
+    # starting value as well.
+    peak = np.maximum(np.maximum.accumulate(log_equity, axis=1), 0)
+    max_drawdown = np.expm1((log_equity - peak).min(axis=1))
+    cagr = np.expm1(log_equity[:, -1] * periods_per_year / periods)
+
+    excess = returns - rf / periods_per_year
+    std = excess.std(axis=1, ddof=1) if periods > 1 else np.nan
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = excess.mean(axis=1) / std * np.sqrt(periods_per_year)
+
+    return {CAGR: cagr, MAX_DRAWDOWN: max_drawdown, SHARPE: sharpe}
+
+
+def _equity_series(equity) -> pd.Series:
+    if isinstance(equity, pd.DataFrame):
+        return equity['total']
+
+    if isinstance(equity, pd.Series):
+        return equity
+
+    return pd.Series(np.asarray(equity, dtype=float))
+
+
+def _run(method: str,
+         returns: np.ndarray,
+         chunk_func,
+         args: tuple,
+         n_samples: int,
+         rf: float,
+         periods_per_year: int,
+         seed: int,
+         n_jobs: int) -> ResampleResult:
+    """Draw ``n_samples`` paths in chunks, in parallel if possible."""
+    if n_samples < 1:
+        raise ValueError(f'n_samples must be at least 1. '
+                         f'{n_samples} was provided.')
+
+    if seed is None:
+        seed = np.random.randint(2 ** 31 - 1)
+
+    chunk = max(1, _CHUNK_ELEMENTS // len(returns))
+    sizes = [min(chunk, n_samples - i) for i in range(0, n_samples, chunk)]
+    jobs = [(returns, size, (seed, i), rf, periods_per_year) + args
+            for i, size in enumerate(sizes)]
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(jobs))
+
+    if n_jobs == 1:
+        results = [chunk_func(*job) for job in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(n_jobs) as pool:
+            results = list(pool.map(chunk_func, *zip(*jobs)))
+
+    samples = pd.DataFrame({m: np.concatenate([r[m] for r in results])
+                            for m in METRICS}, columns=list(METRICS))
+    actual = {m: float(v[0]) for m, v
+              in path_metrics(returns, rf, periods_per_year).items()}
+    logger.debug(f'Resampled {n_samples} paths of {len(returns)} returns '
+                 f'with {method} in {len(jobs)} chunks.')
+    return ResampleResult(method, samples, actual)
+
+
+def _bootstrap_chunk(returns: np.ndarray,
+                     size: int,
+                     seed: tuple,
+                     rf: float,
+                     periods_per_year: int,
+                     block_size: int) -> Dict[str, np.ndarray]:
+    n = len(returns)
+    n_blocks = -(-n // block_size)
+    state = np.random.RandomState(list(seed))
+    starts = state.randint(0, n, size=(size, n_blocks, 1))
+    # wrap around the end of the curve so every return is equally likely.
+    idx = (starts + np.arange(block_size)) % n
+    idx = idx.reshape(size, n_blocks * block_size)[:, :n]
+    return path_metrics(returns[idx], rf, periods_per_year)
+
+
+def _permute_chunk(returns: np.ndarray,
+                   size: int,
+                   seed: tuple,
+                   rf: float,
+                   periods_per_year: int,
+                   starts: np.ndarray,
+                   lengths: np.ndarray) -> Dict[str, np.ndarray]:
+    n = len(returns)
+    state = np.random.RandomState(list(seed))
+    order = np.argsort(state.random_sample((size, len(starts))), axis=1)
+    perm_lengths = lengths[order]
+    # where each piece lands in its new path.
+    offsets = np.cumsum(perm_lengths, axis=1) - perm_lengths
+    shift = (starts[order] - offsets).ravel()
+    idx = (np.repeat(shift, perm_lengths.ravel()).reshape(size, n)
+           + np.arange(n))
+    return path_metrics(returns[idx], rf, periods_per_year)
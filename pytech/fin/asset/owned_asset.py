@@ -81,7 +81,7 @@ class OwnedAsset(object):
         owned_asset_dict = {
             'ticker': trade.ticker,
             'position': asset_position,
-            'shares_owned': trade.qty,
+            'shares_owned': trade.signed_qty,
             'average_share_price': trade.avg_price_per_share,
             'purchase_date': trade.trade_date
         }
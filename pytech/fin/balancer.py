@@ -1,11 +1,20 @@
 import logging
 import math
+import time
 from abc import ABCMeta, abstractmethod
-from typing import Dict
+from typing import Dict, Iterable
+
+import numpy as np
 
 import pytech.utils.pandas_utils as pd_utils
 from pytech.backtest.event import SignalEvent
+from pytech.backtest.scheduler import (DateRule, EverySession, MonthStart,
+                                       Scheduler, TimeRule)
+from pytech.fin.analysis.portfolio import (project_capped_simplex,
+                                           solve_tangency)
+from pytech.fin.metrics import RollingCovariance
 from pytech.fin.portfolio import AbstractPortfolio
+from pytech.utils.enums import OrderType
 
 
 class AbstractBalancer(metaclass=ABCMeta):
@@ -15,12 +24,17 @@ class AbstractBalancer(metaclass=ABCMeta):
                  portfolio: AbstractPortfolio,
                  allow_market_orders=True,
                  price_col=pd_utils.ADJ_CLOSE_COL,
+                 date_rule: DateRule = None,
+                 time_rule: TimeRule = None,
                  *args, **kwargs):
         """
         Constructor for :class:`AbstractBalancer`.
         
         :param allow_market_orders: If `True` then `EXIT` signals will be 
         allowed to execute as a market order.
+        :param date_rule: The sessions to rebalance on when the balancer is
+            part of a backtest. Defaults to the start of every month.
+        :param time_rule: (optional) When during the session to rebalance.
         :param args: 
         :param kwargs: 
         """
@@ -30,6 +44,8 @@ class AbstractBalancer(metaclass=ABCMeta):
         self.portfolio = portfolio
         self.blotter = self.portfolio.blotter
         self.bars = self.portfolio.bars
+        self.date_rule = date_rule or MonthStart()
+        self.time_rule = time_rule
 
     @abstractmethod
     def __call__(self,
@@ -52,9 +68,25 @@ class AbstractBalancer(metaclass=ABCMeta):
         """
         raise NotImplementedError('Must implement balance(portfolio)')
 
+    def schedule_callbacks(self, scheduler: Scheduler) -> None:
+        """Rebalance on the sessions picked by ``date_rule``."""
+        scheduler.schedule(self._scheduled_balance, self.date_rule,
+                           self.time_rule, name=self.__class__.__name__)
+
+    def _scheduled_balance(self, current_dt) -> None:
+        self.logger.debug(f'Rebalancing at {current_dt}')
+        self.balance()
+
 
 class AlwaysBalancedBalancer(AbstractBalancer):
-    """Portfolio weights are always equal."""
+    """
+    Portfolio weights are always equal, or always equal to a fixed set of
+    target weights.
+
+    A rebalance is a handful of array operations over every ticker in the
+    portfolio. The only per ticker work is placing the resulting orders,
+    which go to the :class:`Blotter` in one batch.
+    """
 
     def __init__(self,
                  portfolio: AbstractPortfolio,
@@ -62,40 +94,154 @@ class AlwaysBalancedBalancer(AbstractBalancer):
                  price_col: str = pd_utils.ADJ_CLOSE_COL,
                  include_cash=False,
                  cash_reserves: float = .1,
+                 target_weights: Dict[str, float] = None,
+                 universe: Iterable[str] = None,
+                 lot_size: int = 1,
+                 min_trade_value: float = 0.0,
+                 min_weight_change: float = 0.0,
                  *args, **kwargs):
+        """
+        :param include_cash: If ``True`` cash is part of the value that is
+            balanced, so idle cash gets invested. Otherwise only the value
+            of the current positions is balanced.
+        :param cash_reserves: The share of the portfolio's total value that
+            is always left in cash. Buys are scaled down to respect it.
+        :param target_weights: (optional) The weight of each ticker. Tickers
+            that aren't given are sold. Defaults to equal weights.
+        :param universe: (optional) The tickers to equal weight. Defaults to
+            every ticker in the portfolio.
+        :param lot_size: Every order is a multiple of this many shares.
+        :param min_trade_value: Skip trades worth less than this.
+        :param min_weight_change: Skip trades for tickers whose weight is
+            within this of their target weight.
+        """
         super().__init__(portfolio, allow_market_orders, price_col,
                          *args, **kwargs)
         self.include_cash = include_cash
         self.cash_reserves = cash_reserves
 
-    def balance(self):
+        if target_weights is not None:
+            total = sum(target_weights.values())
+
+            if total > 1 + 1e-9:
+                raise ValueError(f'target_weights must sum to at most 1. '
+                                 f'They sum to {total}.')
+
+        if lot_size < 1:
+            raise ValueError(f'lot_size must be at least 1. '
+                             f'{lot_size} was provided.')
+
+        self.target_weights = target_weights
+        self.universe = None if universe is None else list(universe)
+        self.lot_size = lot_size
+        self.min_trade_value = min_trade_value
+        self.min_weight_change = min_weight_change
+
+    def __call__(self, signal: SignalEvent, *args, **kwargs):
+        if self.target_weights is None and self.universe is None:
+            # equal weight what is owned plus what the signal is for.
+            tickers = set(self.portfolio.owned_assets)
+            tickers.add(signal.ticker)
+            self.balance(tickers)
+        else:
+            self.balance()
+
+    def balance(self, tickers: Iterable[str] = None) -> np.ndarray:
+        """
+        Trade every ticker back to its target weight.
+
+        :param tickers: (optional) The tickers to equal weight this time,
+            anything else is sold. Ignored if there are ``target_weights``.
+        :return: The number of shares ordered for each ticker in the order
+            of the portfolio's ``ticker_list``.
+        """
+        portfolio = self.portfolio
+        lot = self.lot_size
+        prices = self.bars.get_latest_prices(self.price_col)
+        shares = portfolio.shares
+        weights = self._get_target_weights(tickers)
+        total_value = portfolio.total_value
+
         if self.include_cash:
-            total_mv = self.portfolio.total_value
+            base = total_value * (1 - self.cash_reserves)
         else:
-            total_mv = self.portfolio.total_asset_mv
+            base = portfolio.total_asset_mv
+
+        # nothing can be traded without a price.
+        tradable = np.isfinite(prices) & (prices > 0)
+        prices = np.where(tradable, prices, 1.0)
+
+        target = np.trunc(weights * base / prices / lot) * lot
+        delta = np.where(tradable, target - shares, 0.0)
+
+        if self.min_trade_value or self.min_weight_change:
+            if base:
+                current = portfolio.market_values / base
+            else:
+                current = np.zeros(len(shares))
+
+            small = ((np.abs(delta) * prices < self.min_trade_value)
+                     | (np.abs(weights - current) < self.min_weight_change))
+            # always close positions that should be gone.
+            small &= ~((target == 0) & (shares != 0))
+            delta[small] = 0
+
+        buys = delta > 0
+        buy_value = np.dot(delta[buys], prices[buys])
+        available = (portfolio.cash
+                     - np.dot(delta[~buys], prices[~buys])
+                     - self.cash_reserves * total_value)
+
+        if buy_value > available:
+            scale = max(available, 0.0) / buy_value
+            self.logger.debug(f'Scaling buys by {scale:.4f} to keep the cash '
+                              'reserves.')
+            delta[buys] = np.floor(delta[buys] * scale / lot) * lot
+
+        to_trade = np.flatnonzero(delta)
+
+        if self.allow_market_orders:
+            order_type = OrderType.MARKET
+        else:
+            order_type = None
+
+        self.blotter.place_orders(
+                [portfolio.ticker_list[i] for i in to_trade],
+                delta[to_trade],
+                order_type=order_type)
+        return delta
 
-        weights = self._get_current_weights(self.portfolio)
+    def _get_target_weights(self, tickers: Iterable[str] = None
+                            ) -> np.ndarray:
+        """The target weight of every ticker."""
+        index = self.bars.ticker_index
+        weights = np.zeros(len(self.portfolio.ticker_list))
 
-        # add 1 because we will be buying another asset.
-        target_pct = 1 / (len(self.portfolio.owned_assets) + 1)
+        if self.target_weights is not None:
+            for ticker, weight in self.target_weights.items():
+                weights[index[ticker]] = weight
 
-        target_shares = {}
+            return weights
 
-        for ticker in self.portfolio.owned_assets.keys():
-            target_qty = self._get_target_qty(ticker, target_pct, total_mv)
+        if tickers is None:
+            tickers = self.universe
 
-            current_qty = self.portfolio.owned_assets[ticker].shares_owned
+        if tickers is None:
+            weights[:] = 1 / len(weights)
+        else:
+            selected = [index[t] for t in tickers]
 
-            diff = target_qty - current_qty
+            if selected:
+                weights[selected] = 1 / len(selected)
 
-            # target_qty, target_mv, target_pct = self._get_targets(portfolio,
-            #                                                       signal.ticker)
+        return weights
 
     def _get_target_qty(self,
                         ticker: str,
                         target_pct: float,
                         total_mv: float):
-        price = self.bars.get_latest_bar_value(ticker, self.price_col)
+        prices = self.bars.get_latest_prices(self.price_col)
+        price = prices[self.bars.ticker_index[ticker]]
 
         return int(math.floor((target_pct * total_mv) / price))
 
@@ -131,7 +277,120 @@ class AlwaysBalancedBalancer(AbstractBalancer):
         else:
             total_mv = portfolio.total_asset_mv
 
-        for ticker, asset in portfolio.owned_assets.items():
-            weights[ticker] = asset.total_position_value / total_mv
+        market_values = portfolio.market_values
+        owned = np.flatnonzero(portfolio.shares)
+        weights.update(zip([portfolio.ticker_list[i] for i in owned],
+                           (market_values[owned] / total_mv).tolist()))
 
         return weights
+
+
+class MeanVarianceBalancer(AlwaysBalancedBalancer):
+    """
+    Rebalance to the tangency portfolio of the efficient frontier.
+
+    The expected returns and covariances are rolling estimates over the last
+    ``window`` sessions that are updated once per session from the data
+    handler, so nothing is reloaded from the DB. Each solve starts from the
+    previous solution, which is usually close, and can be given a time
+    budget.
+
+    The estimates are only updated when the balancer is part of a backtest
+    through :meth:`schedule_callbacks`, or when :meth:`observe` is called.
+    Until the window is full the balancer equal weights.
+    """
+
+    def __init__(self,
+                 portfolio: AbstractPortfolio,
+                 window: int = 252,
+                 rf: float = .015,
+                 max_solve_time: float = None,
+                 max_weight: float = 1.0,
+                 periods_per_year: int = 252,
+                 *args, **kwargs):
+        """
+        :param window: How many sessions of returns the estimates use.
+        :param rf: The annual risk free rate.
+        :param max_solve_time: (optional) How many seconds each solve may
+            take. When it runs out the best weights found so far are used.
+        :param max_weight: The most any single ticker may be weighted.
+        :param periods_per_year: How many sessions there are in a year.
+
+        Any other arguments are passed to :class:`AlwaysBalancedBalancer`.
+        ``target_weights`` is ignored.
+        """
+        kwargs.pop('target_weights', None)
+        super().__init__(portfolio, *args, **kwargs)
+        self.rf = rf
+        self.max_solve_time = max_solve_time
+        self.max_weight = max_weight
+        self.periods_per_year = periods_per_year
+        tickers = self.universe or self.portfolio.ticker_list
+        self._assets = np.array([self.bars.ticker_index[t] for t in tickers])
+        self.estimates = RollingCovariance(len(self._assets), window)
+        # the last solution, the next solve starts here.
+        self.weights = np.ones(len(self._assets)) / len(self._assets)
+        self.solve_times = []
+        self._last_prices = None
+
+    def schedule_callbacks(self, scheduler: Scheduler) -> None:
+        """Update the estimates every session, rebalance on ``date_rule``."""
+        # scheduled first so a rebalance sees the session's returns.
+        scheduler.schedule(self.observe, EverySession(),
+                           name=f'{self.__class__.__name__}.observe')
+        super().schedule_callbacks(scheduler)
+
+    def observe(self, current_dt=None) -> None:
+        """Add the returns since the last call to the estimates."""
+        prices = self.bars.get_latest_prices(self.price_col)[self._assets]
+
+        if self._last_prices is None:
+            self._last_prices = prices
+            return
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = prices / self._last_prices - 1
+
+        # tickers without a new price didn't move.
+        returns[~np.isfinite(returns)] = 0.0
+        self.estimates.update(returns)
+        np.copyto(self._last_prices, prices, where=np.isfinite(prices))
+
+    def _get_target_weights(self, tickers: Iterable[str] = None
+                            ) -> np.ndarray:
+        if self.estimates.full:
+            self._solve()
+
+        weights = np.zeros(len(self.portfolio.ticker_list))
+        weights[self._assets] = self.weights
+        return weights
+
+    def _solve(self) -> None:
+        ppy = self.periods_per_year
+        expected_returns = (1 + self.estimates.mean) ** ppy - 1
+        covar = self.estimates.covariance * ppy
+
+        start = time.perf_counter()
+        optimized = solve_tangency(expected_returns, covar, self.rf,
+                                   x0=self.weights,
+                                   max_time=self.max_solve_time,
+                                   max_weight=self.max_weight)
+        self.solve_times.append(time.perf_counter() - start)
+
+        if optimized.success or optimized.get('timed_out'):
+            # an iterate of a solve that timed out can break the bounds,
+            # rescaling it after clipping could push it over max_weight.
+            weights = project_capped_simplex(optimized.x, self.max_weight)
+
+            if weights is not None:
+                self.weights = weights
+            else:
+                self.logger.warning('No weights satisfy a max_weight of '
+                                    f'{self.max_weight}, keeping the last '
+                                    'ones.')
+
+            if not optimized.success:
+                self.logger.debug(optimized.message)
+        else:
+            self.logger.warning('Could not solve for new weights, keeping '
+                                f'the last ones: {optimized.message}')
@@ -0,0 +1,142 @@
+"""
+A growable table of floats with a row per bar.
+
+Portfolios record their holdings every bar. Appending a dict to a list or
+concatenating a DataFrame every bar gets slower the longer a backtest runs,
+so a :class:`Ledger` writes each row into a preallocated NumPy array
+instead and doubles the array when it fills up. A DataFrame is only built
+when one is asked for.
+"""
+import logging
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 256
+
+
+class Ledger(object):
+    """A row of float columns for every bar, indexed by time."""
+
+    def __init__(self, columns: Iterable[str],
+                 capacity: int = DEFAULT_CAPACITY):
+        """
+        :param columns: The name of each column.
+        :param capacity: How many rows to allocate up front.
+        """
+        self.columns: List[str] = list(columns)
+        self.column_index: Dict[str, int] = {c: i for i, c
+                                             in enumerate(self.columns)}
+        capacity = max(1, capacity)
+        self._values = np.zeros((capacity, len(self.columns)))
+        # nanoseconds since the epoch in UTC.
+        self._dates = np.zeros(capacity, dtype=np.int64)
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, row: int) -> Dict[str, float]:
+        """A single row as a dict of column -> value."""
+        if row < 0:
+            row += self._len
+
+        if not 0 <= row < self._len:
+            raise IndexError(f'Row {row} is out of range for a ledger with '
+                             f'{self._len} rows.')
+
+        out = dict(zip(self.columns, self._values[row].tolist()))
+        out['datetime'] = pd.Timestamp(self._dates[row], tz='UTC')
+        return out
+
+    @property
+    def capacity(self) -> int:
+        return len(self._dates)
+
+    @property
+    def values(self) -> np.ndarray:
+        """A view of every row that has been written."""
+        return self._values[:self._len]
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return _to_index(self._dates[:self._len])
+
+    def column(self, name: str) -> np.ndarray:
+        """A view of a single column."""
+        return self._values[:self._len, self.column_index[name]]
+
+    def last(self, name: str) -> float:
+        """The latest value in a column."""
+        return self._values[self._len - 1, self.column_index[name]]
+
+    def append(self, current_dt, row: Sequence[float]) -> None:
+        """
+        Add a row.
+
+        :param current_dt: The time of the row.
+        :param row: A value for every column in order.
+        """
+        if self._len == self.capacity:
+            self._grow(self._len + 1)
+
+        self._values[self._len] = row
+        self._dates[self._len] = pd.Timestamp(current_dt).value
+        self._len += 1
+
+    def extend(self, rows: Tuple[np.ndarray, np.ndarray]) -> None:
+        """
+        Add many rows at once.
+
+        :param rows: The output of :meth:`rows_since` on a ledger with the
+            same columns.
+        """
+        dates, values = rows
+        end = self._len + len(dates)
+
+        if end > self.capacity:
+            self._grow(end)
+
+        self._values[self._len:end] = values
+        self._dates[self._len:end] = dates
+        self._len = end
+
+    def rows_since(self, start: int) -> Tuple[np.ndarray, np.ndarray]:
+        """A copy of the dates and values of every row from ``start`` on."""
+        return (self._dates[start:self._len].copy(),
+                self._values[start:self._len].copy())
+
+    def to_frame(self, start: int = 0, stop: int = None) -> pd.DataFrame:
+        """
+        The ledger as a DataFrame indexed by ``datetime``.
+
+        :param start: The first row to include.
+        :param stop: (optional) The row to stop before.
+        """
+        stop = self._len if stop is None else min(stop, self._len)
+        return pd.DataFrame(self._values[start:stop],
+                            index=_to_index(self._dates[start:stop]),
+                            columns=self.columns)
+
+    def _grow(self, needed: int) -> None:
+        capacity = max(needed, self.capacity * 2)
+        values = np.zeros((capacity, len(self.columns)))
+        values[:self._len] = self._values[:self._len]
+        dates = np.zeros(capacity, dtype=np.int64)
+        dates[:self._len] = self._dates[:self._len]
+        self._values = values
+        self._dates = dates
+
+    def __getstate__(self):
+        # don't pickle the unused capacity.
+        state = vars(self).copy()
+        state['_values'] = self.values.copy()
+        state['_dates'] = self._dates[:self._len].copy()
+        return state
+
+
+def _to_index(dates: np.ndarray) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(pd.to_datetime(dates, utc=True), name='datetime')
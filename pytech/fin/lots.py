@@ -0,0 +1,452 @@
+"""
+Lot level accounting of a portfolio's positions.
+
+Every opening trade creates a lot with its own quantity, cost per share and
+open date. Closing trades are matched against the open lots of the ticker,
+oldest first (FIFO), newest first (LIFO) or against lots picked by hand
+(SPECIFIC), and every match is recorded as a closed lot with its realized
+P&L for tax reporting.
+
+The open lots of each ticker are kept in a few parallel NumPy arrays
+that are consumed from either end, so matching a fill is amortized O(1):
+each lot is fully closed at most once and only the last lot a fill touches
+is left partially closed. Closed lots are appended to one growable record
+array. The position and cost basis of every ticker are kept up to date as
+fills come in, so the unrealized P&L of the whole book is one vectorized
+expression.
+"""
+import copy
+import logging
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pytech.utils.enums import LotMethod
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 16
+
+CLOSED_DTYPE = np.dtype([
+    ('ticker', np.int32),
+    ('lot_id', np.int64),
+    ('qty', np.float64),
+    ('opened', np.int64),
+    ('closed', np.int64),
+    ('cost', np.float64),
+    ('price', np.float64),
+    ('pnl', np.float64),
+])
+
+
+class TickerLots(object):
+    """
+    The open lots of a single ticker, oldest first.
+
+    Long lots have a positive ``qty`` and short lots a negative one. Every
+    open lot of a ticker is on the same side.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        capacity = max(1, capacity)
+        self._qty = np.zeros(capacity)
+        self._cost = np.zeros(capacity)
+        # nanoseconds since the epoch in UTC.
+        self._opened = np.zeros(capacity, dtype=np.int64)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        # the open lots are in [_head, _tail). Lots closed out of order by
+        # SPECIFIC matching are left in place with a qty of 0.
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self.qty))
+
+    @property
+    def capacity(self) -> int:
+        return len(self._qty)
+
+    @property
+    def qty(self) -> np.ndarray:
+        return self._qty[self._head:self._tail]
+
+    @property
+    def cost(self) -> np.ndarray:
+        return self._cost[self._head:self._tail]
+
+    @property
+    def opened(self) -> np.ndarray:
+        return self._opened[self._head:self._tail]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[self._head:self._tail]
+
+    def unrealized_pnl(self, price: float) -> np.ndarray:
+        """The unrealized P&L of every open lot at ``price``."""
+        return self.qty * (price - self.cost)
+
+    def open(self, lot_id: int, qty: float, cost: float, opened: int) -> None:
+        """Add a lot to the end."""
+        if self._tail == self.capacity:
+            self._make_room()
+
+        i = self._tail
+        self._qty[i] = qty
+        self._cost[i] = cost
+        self._opened[i] = opened
+        self._ids[i] = lot_id
+        self._tail += 1
+
+    def find(self, lot_id: int) -> int:
+        """The slot of an open lot, or -1 if it isn't open."""
+        ids = self.ids
+        i = int(np.searchsorted(ids, lot_id))
+
+        if i < len(ids) and ids[i] == lot_id and self.qty[i]:
+            return self._head + i
+
+        return -1
+
+    def _make_room(self) -> None:
+        n = self._tail - self._head
+
+        if self._head and n <= self.capacity // 2:
+            # reuse the space at the front that closed lots left behind.
+            capacity = self.capacity
+        else:
+            capacity = self.capacity * 2
+
+        for name in ('_qty', '_cost', '_opened', '_ids'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:n] = old[self._head:self._tail]
+            setattr(self, name, new)
+
+        self._head = 0
+        self._tail = n
+
+    def _trim(self) -> None:
+        """Drop closed lots from both ends."""
+        qty = self._qty
+
+        while self._head < self._tail and not qty[self._head]:
+            self._head += 1
+
+        while self._tail > self._head and not qty[self._tail - 1]:
+            self._tail -= 1
+
+        if self._head == self._tail:
+            self._head = self._tail = 0
+
+    def __getstate__(self):
+        # don't pickle the unused capacity.
+        state = vars(self).copy()
+
+        for name in ('_qty', '_cost', '_opened', '_ids'):
+            state[name] = getattr(self, name)[self._head:self._tail].copy()
+
+        state['_tail'] -= self._head
+        state['_head'] = 0
+        return state
+
+
+class LotBook(object):
+    """The open and closed lots of every ticker in a portfolio."""
+
+    def __init__(self,
+                 tickers: Iterable[str],
+                 method=LotMethod.FIFO,
+                 capacity: int = 256):
+        """
+        :param tickers: Every ticker that can be traded.
+        :param method: How closing trades are matched against open lots.
+            See :class:`LotMethod`.
+        :param capacity: How many closed lots to allocate up front.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.tickers: List[str] = list(tickers)
+        self.ticker_index: Dict[str, int] = {t: i for i, t
+                                             in enumerate(self.tickers)}
+        self.method = LotMethod.check_if_valid(method)
+        self.lots = [TickerLots() for _ in self.tickers]
+        # signed shares and the sum of qty * cost of the open lots.
+        self.shares = np.zeros(len(self.tickers))
+        self.cost_basis = np.zeros(len(self.tickers))
+        self.realized = np.zeros(len(self.tickers))
+        # ticker -> lot ids to close next under SPECIFIC.
+        self._selected: Dict[str, List[int]] = {}
+        self._next_id = 0
+        self._closed = np.zeros(max(1, capacity), dtype=CLOSED_DTYPE)
+        self._n_closed = 0
+
+    def __getitem__(self, ticker: str) -> TickerLots:
+        return self.lots[self.ticker_index[ticker]]
+
+    @property
+    def realized_pnl(self) -> float:
+        return float(self.realized.sum())
+
+    @property
+    def closed(self) -> np.ndarray:
+        """Every closed lot as a record array with :data:`CLOSED_DTYPE`."""
+        return self._closed[:self._n_closed]
+
+    def unrealized_pnl(self, prices: np.ndarray) -> np.ndarray:
+        """
+        The unrealized P&L of every ticker.
+
+        :param prices: The price of every ticker in the order of
+            :attr:`tickers`.
+        """
+        return self.shares * prices - self.cost_basis
+
+    def reorder(self, tickers: Sequence[str]) -> None:
+        """
+        Put every per ticker array in the order of ``tickers``, e.g. to
+        match a portfolio rebuilt with its tickers in another order.
+
+        :param tickers: The same tickers as :attr:`tickers` in a new order.
+        """
+        positions = np.array([self.ticker_index[t] for t in tickers],
+                             dtype=np.intp)
+
+        if len(positions) != len(self.tickers):
+            raise ValueError(f'tickers must be a reordering of: '
+                             f'{self.tickers}. {list(tickers)} was provided.')
+
+        self.tickers = list(tickers)
+        self.ticker_index = {t: i for i, t in enumerate(self.tickers)}
+        self.lots = [self.lots[i] for i in positions]
+        self.shares = self.shares[positions]
+        self.cost_basis = self.cost_basis[positions]
+        self.realized = self.realized[positions]
+        # the closed lots refer to their ticker by position.
+        new_position = np.empty_like(positions)
+        new_position[positions] = np.arange(len(positions))
+        closed = self._closed[:self._n_closed]
+        closed['ticker'] = new_position[closed['ticker']]
+
+    def select(self, ticker: str, lot_ids: Sequence[int]) -> None:
+        """
+        Pick the lots the next closing trade of ``ticker`` is matched against
+        when the method is ``SPECIFIC``.
+
+        Anything left after the picked lots are closed is matched oldest
+        first.
+        """
+        self._selected[ticker] = list(lot_ids)
+
+    def fill(self,
+             ticker: str,
+             qty: float,
+             price: float,
+             current_dt,
+             commission: float = 0.0) -> float:
+        """
+        Record a fill.
+
+        :param ticker: The ticker that was traded.
+        :param qty: The signed number of shares, negative for a sale.
+        :param price: The price per share before commission.
+        :param current_dt: When the fill happened.
+        :param commission: The commission paid. It is spread over every
+            share in the fill, raising the cost of shares bought and
+            lowering the proceeds of shares sold.
+        :return: The P&L realized by the fill.
+        """
+        if not qty:
+            return 0.0
+
+        t = self.ticker_index[ticker]
+        lots = self.lots[t]
+        dt_ns = pd.Timestamp(current_dt).value
+        side = 1.0 if qty > 0 else -1.0
+        # what each share actually cost or brought in.
+        price = price + side * commission / abs(qty)
+        remaining = qty
+        realized = 0.0
+
+        if self.shares[t] * qty < 0:
+            if self.method is LotMethod.SPECIFIC:
+                selected = self._selected.pop(ticker, ())
+            else:
+                selected = ()
+
+            for lot_id in selected:
+                if not remaining:
+                    break
+
+                i = lots.find(lot_id)
+
+                if i < 0:
+                    self.logger.warning(f'Lot {lot_id} of {ticker} is not '
+                                        'open.')
+                    continue
+
+                remaining, pnl = self._close(t, lots, i, remaining, price,
+                                             dt_ns)
+                realized += pnl
+
+            newest_first = self.method is LotMethod.LIFO
+
+            while remaining and lots._head < lots._tail:
+                if newest_first:
+                    i = lots._tail - 1
+                else:
+                    i = lots._head
+
+                if lots._qty[i]:
+                    remaining, pnl = self._close(t, lots, i, remaining,
+                                                 price, dt_ns)
+                    realized += pnl
+
+                lots._trim()
+
+            lots._trim()
+
+        if remaining:
+            lots.open(self._next_id, remaining, price, dt_ns)
+            self._next_id += 1
+            self.shares[t] += remaining
+            self.cost_basis[t] += remaining * price
+
+        self.realized[t] += realized
+        return realized
+
+    def _close(self, t: int, lots: TickerLots, i: int, remaining: float,
+               price: float, dt_ns: int):
+        """
+        Close as much of lot ``i`` as ``remaining`` allows.
+
+        :return: The quantity of the fill left over and the realized P&L.
+        """
+        lot_qty = lots._qty[i]
+        cost = lots._cost[i]
+
+        # the fill is on the other side of the lot.
+        if abs(remaining) < abs(lot_qty):
+            closed = -remaining
+        else:
+            closed = lot_qty
+
+        pnl = closed * (price - cost)
+        lots._qty[i] = lot_qty - closed
+        self.shares[t] -= closed
+        self.cost_basis[t] -= closed * cost
+        self._record(t, lots._ids[i], closed, lots._opened[i], dt_ns, cost,
+                     price, pnl)
+        return remaining + closed, pnl
+
+    def without_closed(self) -> 'LotBook':
+        """
+        A shallow copy of the book without its closed lots, to save the
+        closed lots separately with :meth:`rows_since`.
+        """
+        book = copy.copy(self)
+        book._closed = self._closed[:0]
+        book._n_closed = 0
+        return book
+
+    def rows_since(self, start: int) -> Tuple[List[str], np.ndarray]:
+        """A copy of every lot closed from ``start`` on, see :meth:`extend`."""
+        return list(self.tickers), self.closed[start:].copy()
+
+    def extend(self, rows: Tuple[Sequence[str], np.ndarray]) -> None:
+        """
+        Add many closed lots at once.
+
+        :param rows: The output of :meth:`rows_since` on another book with
+            the same tickers.
+        """
+        tickers, closed = rows
+        end = self._n_closed + len(closed)
+
+        if end > len(self._closed):
+            self._grow(end)
+
+        added = self._closed[self._n_closed:end]
+        added[:] = closed
+        # the other book may have its tickers in another order.
+        positions = np.array([self.ticker_index[t] for t in tickers],
+                             dtype=np.int32)
+        added['ticker'] = positions[closed['ticker']]
+        self._n_closed = end
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = max(1, len(self._closed))
+
+        while capacity < min_capacity:
+            capacity *= 2
+
+        grown = np.zeros(capacity, dtype=CLOSED_DTYPE)
+        grown[:self._n_closed] = self._closed[:self._n_closed]
+        self._closed = grown
+
+    def _record(self, t, lot_id, qty, opened, closed, cost, price, pnl):
+        if self._n_closed == len(self._closed):
+            self._grow(self._n_closed + 1)
+
+        self._closed[self._n_closed] = (t, lot_id, qty, opened, closed, cost,
+                                        price, pnl)
+        self._n_closed += 1
+
+    def open_lots(self) -> pd.DataFrame:
+        """Every open lot of every ticker."""
+        frames = []
+
+        for ticker, lots in zip(self.tickers, self.lots):
+            mask = lots.qty != 0
+
+            if not mask.any():
+                continue
+
+            frames.append(pd.DataFrame({
+                'ticker': ticker,
+                'lot_id': lots.ids[mask],
+                'qty': lots.qty[mask],
+                'cost': lots.cost[mask],
+                'opened': _to_datetime(lots.opened[mask]),
+            }, columns=['ticker', 'lot_id', 'qty', 'cost', 'opened']))
+
+        if not frames:
+            return pd.DataFrame(columns=['ticker', 'lot_id', 'qty', 'cost',
+                                         'opened'])
+
+        return pd.concat(frames, ignore_index=True)
+
+    def closed_lots(self) -> pd.DataFrame:
+        """
+        Every closed lot for tax reporting.
+
+        ``days_held`` is the number of calendar days the lot was open.
+        """
+        closed = self.closed
+        opened = _to_datetime(closed['opened'])
+        closed_dt = _to_datetime(closed['closed'])
+
+        return pd.DataFrame({
+            'ticker': np.asarray(self.tickers, dtype=object)[
+                closed['ticker']],
+            'lot_id': closed['lot_id'],
+            'qty': closed['qty'],
+            'opened': opened,
+            'closed': closed_dt,
+            'cost': closed['cost'],
+            'price': closed['price'],
+            'pnl': closed['pnl'],
+            'days_held': (closed['closed'] - closed['opened'])
+            // (86400 * 10 ** 9),
+        }, columns=['ticker', 'lot_id', 'qty', 'opened', 'closed', 'cost',
+                    'price', 'pnl', 'days_held'])
+
+    def __getstate__(self):
+        # don't pickle the unused capacity.
+        state = vars(self).copy()
+        state['_closed'] = self.closed.copy()
+        return state
+
+
+def _to_datetime(values: np.ndarray) -> pd.DatetimeIndex:
+    return pd.to_datetime(values, utc=True)
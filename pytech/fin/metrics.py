@@ -0,0 +1,383 @@
+"""
+Performance metrics that are updated as a backtest runs.
+
+Every accumulator does a constant amount of work per bar and keeps a
+constant amount of state, so a portfolio can report its Sharpe ratio,
+drawdown and so on at any point without building its equity curve.
+"""
+import logging
+import math
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PERIODS_PER_YEAR = 252
+
+
+class Welford(object):
+    """Running mean and variance with Welford's algorithm."""
+
+    __slots__ = ('count', 'mean', '_m2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self) -> float:
+        """The sample variance."""
+        if self.count < 2:
+            return math.nan
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class RunningDrawdown(object):
+    """The running peak, current drawdown and max drawdown of a curve."""
+
+    __slots__ = ('peak', 'drawdown', 'max_drawdown', 'duration',
+                 'max_duration')
+
+    def __init__(self):
+        self.peak = -math.inf
+        self.drawdown = 0.0
+        self.max_drawdown = 0.0
+        # bars since the last peak.
+        self.duration = 0
+        self.max_duration = 0
+
+    def update(self, value: float) -> None:
+        if value >= self.peak:
+            self.peak = value
+            self.drawdown = 0.0
+            self.duration = 0
+            return
+
+        self.drawdown = value / self.peak - 1
+        self.duration += 1
+
+        if self.drawdown < self.max_drawdown:
+            self.max_drawdown = self.drawdown
+
+        if self.duration > self.max_duration:
+            self.max_duration = self.duration
+
+
+class RollingWindow(object):
+    """
+    The mean and std of the last ``size`` values.
+
+    The values are kept in a ring buffer along with their running sum and
+    sum of squares.
+    """
+
+    __slots__ = ('size', 'count', '_values', '_pos', '_sum', '_sum_sq')
+
+    def __init__(self, size: int):
+        if size < 2:
+            raise ValueError(f'size must be at least 2. {size} was provided.')
+
+        self.size = size
+        self.count = 0
+        self._values = np.zeros(size)
+        self._pos = 0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+    @property
+    def full(self) -> bool:
+        return self.count == self.size
+
+    def update(self, x: float) -> None:
+        old = self._values[self._pos]
+        self._values[self._pos] = x
+        self._pos = (self._pos + 1) % self.size
+
+        if self.count < self.size:
+            self.count += 1
+        else:
+            self._sum -= old
+            self._sum_sq -= old * old
+
+        self._sum += x
+        self._sum_sq += x * x
+
+    @property
+    def mean(self) -> float:
+        if not self.count:
+            return math.nan
+        return self._sum / self.count
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return math.nan
+        var = ((self._sum_sq - self._sum * self._sum / self.count)
+               / (self.count - 1))
+        # rounding can push a flat window slightly negative.
+        return math.sqrt(max(var, 0.0))
+
+
+class RollingCovariance(object):
+    """
+    The mean and covariance of the last ``size`` vectors.
+
+    Like :class:`RollingWindow` but for a vector per update, e.g. the
+    returns of every asset on a bar. The running sums are recomputed from
+    the buffer every ``size`` updates so rounding errors don't build up.
+    """
+
+    def __init__(self, n: int, size: int):
+        """
+        :param n: The length of each vector.
+        :param size: How many vectors are in the window.
+        """
+        if size < 2:
+            raise ValueError(f'size must be at least 2. {size} was provided.')
+
+        self.size = size
+        self.count = 0
+        self._values = np.zeros((size, n))
+        self._pos = 0
+        self._sum = np.zeros(n)
+        self._sum_sq = np.zeros((n, n))
+        self._since_exact = 0
+
+    @property
+    def full(self) -> bool:
+        return self.count == self.size
+
+    def update(self, x: np.ndarray) -> None:
+        old = self._values[self._pos]
+
+        if self.count < self.size:
+            self.count += 1
+        else:
+            self._sum -= old
+            self._sum_sq -= np.outer(old, old)
+
+        self._sum += x
+        self._sum_sq += np.outer(x, x)
+        old[:] = x
+        self._pos = (self._pos + 1) % self.size
+        self._since_exact += 1
+
+        if self._since_exact >= self.size:
+            self._recompute()
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self._sum / max(self.count, 1)
+
+    @property
+    def covariance(self) -> np.ndarray:
+        """The sample covariance matrix."""
+        n = self._sum.shape[0]
+
+        if self.count < 2:
+            return np.full((n, n), np.nan)
+
+        return ((self._sum_sq - np.outer(self._sum, self._sum) / self.count)
+                / (self.count - 1))
+
+    def _recompute(self) -> None:
+        values = self._values[:self.count]
+        self._sum = values.sum(axis=0)
+        self._sum_sq = np.dot(values.T, values)
+        self._since_exact = 0
+
+
+class MetricsTracker(object):
+    """
+    Sharpe, Sortino, volatility, drawdown, turnover and exposure of a
+    portfolio, updated every bar.
+
+    The tracker can also decide that a run is hopeless, see
+    :attr:`abort_reason`.
+    """
+
+    def __init__(self,
+                 periods_per_year: int = PERIODS_PER_YEAR,
+                 rf: float = 0.0,
+                 window: int = None,
+                 max_drawdown: float = None,
+                 min_sharpe: float = None,
+                 min_periods: int = None):
+        """
+        :param periods_per_year: How many bars there are in a year.
+        :param rf: The annual risk free rate.
+        :param window: (optional) Also track rolling metrics over this many
+            bars.
+        :param max_drawdown: (optional) Abort once the drawdown is worse
+            than this, e.g. ``-.5``.
+        :param min_sharpe: (optional) Abort if the Sharpe ratio is below
+            this after ``min_periods`` bars.
+        :param min_periods: How many bars to wait before checking
+            ``min_sharpe``. Defaults to a year of bars.
+        """
+        self.periods_per_year = periods_per_year
+        self.rf = rf
+        self.max_drawdown_limit = max_drawdown
+        self.min_sharpe = min_sharpe
+        self.min_periods = min_periods or periods_per_year
+        self.returns = Welford()
+        self.drawdown = RunningDrawdown()
+        self.exposure = Welford()
+        self.rolling = RollingWindow(window) if window else None
+        self.value = math.nan
+        self.gross_exposure = 0.0
+        self.traded_value = 0.0
+        self.abort_reason: Optional[str] = None
+        self._mean_value = 0.0
+        self._rf_per_period = rf / periods_per_year
+        # sum of the squared returns below rf, for Sortino.
+        self._downside_sq = 0.0
+
+    @property
+    def periods(self) -> int:
+        """How many returns have been seen."""
+        return self.returns.count
+
+    @property
+    def volatility(self) -> float:
+        """Annualized volatility of the returns."""
+        return self.returns.std * math.sqrt(self.periods_per_year)
+
+    @property
+    def sharpe(self) -> float:
+        std = self.returns.std
+
+        if not std:
+            return math.nan
+
+        return ((self.returns.mean - self._rf_per_period) / std
+                * math.sqrt(self.periods_per_year))
+
+    @property
+    def sortino(self) -> float:
+        if not self.periods or not self._downside_sq:
+            return math.nan
+
+        downside = math.sqrt(self._downside_sq / self.periods)
+        return ((self.returns.mean - self._rf_per_period) / downside
+                * math.sqrt(self.periods_per_year))
+
+    @property
+    def max_drawdown(self) -> float:
+        return self.drawdown.max_drawdown
+
+    @property
+    def turnover(self) -> float:
+        """Annualized traded value over the average value of the portfolio."""
+        if not self.periods or not self._mean_value:
+            return math.nan
+
+        return (self.traded_value / self._mean_value
+                * self.periods_per_year / self.periods)
+
+    @property
+    def rolling_sharpe(self) -> float:
+        if self.rolling is None or not self.rolling.full:
+            return math.nan
+
+        std = self.rolling.std
+
+        if not std:
+            return math.nan
+
+        return ((self.rolling.mean - self._rf_per_period) / std
+                * math.sqrt(self.periods_per_year))
+
+    @property
+    def rolling_volatility(self) -> float:
+        if self.rolling is None or not self.rolling.full:
+            return math.nan
+
+        return self.rolling.std * math.sqrt(self.periods_per_year)
+
+    def add_trade(self, value: float) -> None:
+        """Record the absolute value of a trade for turnover."""
+        self.traded_value += abs(value)
+
+    def update(self, value: float, gross_exposure: float = 0.0) -> None:
+        """
+        Add a bar.
+
+        :param value: The total value of the portfolio including cash.
+        :param gross_exposure: The sum of the absolute market value of every
+            position.
+        """
+        prev = self.value
+        self.value = value
+        self.gross_exposure = gross_exposure
+        self.drawdown.update(value)
+
+        if value:
+            self.exposure.update(gross_exposure / value)
+
+        if not prev or math.isnan(prev):
+            self._mean_value = value
+            return
+
+        r = value / prev - 1
+        self.returns.update(r)
+        self._mean_value += (value - self._mean_value) / (self.periods + 1)
+        excess = r - self._rf_per_period
+
+        if excess < 0:
+            self._downside_sq += excess * excess
+
+        if self.rolling is not None:
+            self.rolling.update(r)
+
+        if self.abort_reason is None:
+            self.abort_reason = self._check_abort()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every metric as of the latest bar."""
+        out = {
+            'periods': self.periods,
+            'value': self.value,
+            'sharpe': self.sharpe,
+            'sortino': self.sortino,
+            'volatility': self.volatility,
+            'max_drawdown': self.max_drawdown,
+            'drawdown': self.drawdown.drawdown,
+            'max_drawdown_duration': self.drawdown.max_duration,
+            'turnover': self.turnover,
+            'exposure': self.gross_exposure / self.value
+            if self.value else math.nan,
+            'avg_exposure': self.exposure.mean
+            if self.exposure.count else math.nan,
+        }
+
+        if self.rolling is not None:
+            out['rolling_sharpe'] = self.rolling_sharpe
+            out['rolling_volatility'] = self.rolling_volatility
+
+        return out
+
+    def _check_abort(self) -> Optional[str]:
+        if (self.max_drawdown_limit is not None
+                and self.drawdown.drawdown < self.max_drawdown_limit):
+            return (f'drawdown of {self.drawdown.drawdown:.2%} is worse than '
+                    f'{self.max_drawdown_limit:.2%}')
+
+        if (self.min_sharpe is not None and self.periods >= self.min_periods
+                and self.sharpe < self.min_sharpe):
+            return (f'Sharpe ratio of {self.sharpe:.2f} is below '
+                    f'{self.min_sharpe:.2f} after {self.periods} bars')
+
+        return None
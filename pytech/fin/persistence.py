@@ -0,0 +1,213 @@
+"""
+Write a portfolio's positions and holdings to the DB.
+
+How often a portfolio is written is set by a
+:class:`pytech.utils.enums.PersistencePolicy`. Except for
+``SNAPSHOT_PER_BAR``, every write only contains the bars since the last
+write and is appended to what is already stored, so the cost of a write
+doesn't grow with the length of the backtest. The frames are built on the
+thread running the backtest and handed to a background thread that does the
+actual I/O.
+
+A portfolio with a ``name`` is stored under symbols suffixed with it, so
+every strategy of a multi strategy backtest keeps its own history.
+"""
+import logging
+import queue
+import threading
+from typing import Callable
+
+import pandas as pd
+
+from pytech.utils.enums import PersistencePolicy
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioWriter(object):
+    """Persist a portfolio's ledgers according to a persistence policy."""
+
+    def __init__(self,
+                 portfolio,
+                 policy=PersistencePolicy.END_OF_RUN,
+                 every_n_bars: int = 1000,
+                 background: bool = True):
+        """
+        :param portfolio: The portfolio to persist.
+        :param policy: When to write. See :class:`PersistencePolicy`.
+        :param every_n_bars: How many bars to wait between writes for
+            ``EVERY_N_BARS``.
+        :param background: If False writes happen on the calling thread.
+        """
+        if every_n_bars < 1:
+            raise ValueError(f'every_n_bars must be at least 1. '
+                             f'{every_n_bars} was provided.')
+
+        self.logger = logging.getLogger(__name__)
+        self.portfolio = portfolio
+        self.policy = PersistencePolicy.check_if_valid(policy)
+        self.every_n_bars = every_n_bars
+        self.background = background
+        self.position_symbol = _symbol(portfolio.POSITION_COLLECTION,
+                                       portfolio.name)
+        self.holdings_symbol = _symbol(portfolio.HOLDINGS_COLLECTION,
+                                       portfolio.name)
+        self.tick_symbol = _symbol(portfolio.TICK_COLLECTION, portfolio.name)
+        self.writes = 0
+        # the first row of the ledgers that hasn't been written.
+        self._mark = 0
+        self._last_day = None
+        self._writer = None
+
+    def on_bar(self, current_dt) -> None:
+        """Called after the portfolio records a bar."""
+        policy = self.policy
+        n_rows = len(self.portfolio.all_holdings_mv)
+
+        if policy is PersistencePolicy.EVERY_N_BARS:
+            if n_rows - self._mark >= self.every_n_bars:
+                self.flush()
+        elif policy is PersistencePolicy.END_OF_DAY:
+            day = pd.Timestamp(current_dt).normalize()
+
+            if self._last_day is not None and day != self._last_day:
+                # everything up to, but not including, this bar.
+                self.flush(n_rows - 1)
+
+            self._last_day = day
+        elif policy is PersistencePolicy.SNAPSHOT_PER_BAR:
+            self._write_snapshot(current_dt)
+
+    def flush(self, stop: int = None) -> None:
+        """
+        Write every bar since the last write.
+
+        :param stop: (optional) The row to stop before. Defaults to every
+            row in the ledgers.
+        """
+        portfolio = self.portfolio
+        n_rows = len(portfolio.all_holdings_mv)
+        stop = n_rows if stop is None else min(stop, n_rows)
+
+        if stop <= self._mark:
+            return
+
+        positions = portfolio._positions_frame(self._mark, stop)
+        holdings = portfolio.all_holdings_mv.to_frame(self._mark, stop)
+        tick = portfolio._positions_frame(stop - 1, stop)
+        # the first write of a run replaces anything left by earlier runs,
+        # unless the run carries on from rows that were already written.
+        replace = self._mark == 0
+
+        self._submit(_write_delta, portfolio.lib, self.position_symbol,
+                     positions, replace)
+        self._submit(_write_delta, portfolio.lib, self.holdings_symbol,
+                     holdings, replace)
+        self._submit(_write_latest, portfolio.lib, self.tick_symbol, tick)
+        self.logger.debug(f'Writing rows {self._mark} to {stop} of the '
+                          'portfolio.')
+        self._mark = stop
+        self.writes += 1
+
+    def mark_written(self) -> None:
+        """
+        Treat every row already in the ledgers as written, e.g. the history
+        of an extended backtest, so the next write only appends new rows.
+        """
+        self._mark = len(self.portfolio.all_holdings_mv)
+
+    def close(self) -> None:
+        """Write anything outstanding and wait for every write to finish."""
+        if self.policy not in (PersistencePolicy.NONE,
+                               PersistencePolicy.SNAPSHOT_PER_BAR):
+            self.flush()
+
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.close()
+
+    def _write_snapshot(self, current_dt) -> None:
+        """Write a new version of every position and snapshot it."""
+        portfolio = self.portfolio
+        n_rows = len(portfolio.all_positions_qty)
+        self.logger.info('Writing current portfolio state to DB.')
+        portfolio.lib.write_snapshot(self.position_symbol,
+                                     portfolio.positions_df,
+                                     current_dt)
+        portfolio.lib.write_snapshot(self.tick_symbol,
+                                     portfolio._positions_frame(n_rows - 1),
+                                     current_dt)
+        self._mark = n_rows
+        self.writes += 1
+
+    def _submit(self, func: Callable, *args) -> None:
+        if not self.background:
+            func(*args)
+            return
+
+        if self._writer is None:
+            self._writer = _BackgroundWriter()
+            self._writer.start()
+
+        self._writer.submit(func, *args)
+
+
+class _BackgroundWriter(threading.Thread):
+    """Run writes in order on their own thread."""
+
+    def __init__(self):
+        super().__init__(name='pytech-portfolio-writer', daemon=True)
+        self.queue = queue.Queue()
+        self.error = None
+
+    def submit(self, func: Callable, *args) -> None:
+        if self.error is not None:
+            self._raise()
+
+        self.queue.put((func, args))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+
+            if item is None:
+                return
+
+            func, args = item
+
+            try:
+                if self.error is None:
+                    func(*args)
+            except Exception as e:
+                logger.exception('Writing the portfolio failed.')
+                self.error = e
+
+    def close(self) -> None:
+        """Wait for every submitted write to finish."""
+        self.queue.put(None)
+        self.join()
+
+        if self.error is not None:
+            self._raise()
+
+    def _raise(self):
+        raise RuntimeError('Writing the portfolio failed.') from self.error
+
+
+def _symbol(collection: str, name: str = None) -> str:
+    """The symbol ``collection`` is stored under for a portfolio."""
+    if name is None:
+        return collection
+
+    return f'{collection}_{name}'
+
+
+def _write_delta(lib, symbol: str, df: pd.DataFrame, replace: bool) -> None:
+    if replace:
+        lib.write(symbol, df, prune_previous_version=True)
+    else:
+        lib.append(symbol, df)
+
+
+def _write_latest(lib, symbol: str, df: pd.DataFrame) -> None:
+    lib.write(symbol, df, prune_previous_version=True)
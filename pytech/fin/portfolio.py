@@ -4,18 +4,24 @@ from abc import ABCMeta, abstractmethod
 from datetime import datetime
 from typing import Dict, List
 
+import numpy as np
 import pandas as pd
 
 import pytech.utils.dt_utils as dt_utils
 from pytech.backtest.event import SignalEvent
 from pytech.data.handler import DataHandler
 from pytech.fin.asset.owned_asset import OwnedAsset
+from pytech.decorators.decorators import lazy_property
+from pytech.fin.ledger import Ledger
+from pytech.fin.lots import LotBook
+from pytech.fin.metrics import MetricsTracker
+from pytech.fin.persistence import PortfolioWriter
 from pytech.mongo import ARCTIC_STORE, PortfolioStore
 from pytech.trading.blotter import Blotter
 from pytech.trading.trade import Trade
 from pytech.utils import pandas_utils as pd_utils
 from pytech.utils.enums import (
-    EventType, Position, SignalType,
+    EventType, LotMethod, PersistencePolicy, Position, SignalType,
     TradeAction
 )
 from pytech.utils.exceptions import (
@@ -44,12 +50,19 @@ class AbstractPortfolio(metaclass=ABCMeta):
     start_date: datetime
     ticker_list: List[str]
     owned_assets: Dict[str, OwnedAsset]
-    lib: PortfolioStore
+    all_holdings_mv: Ledger
+    all_positions_qty: Ledger
+    writer: PortfolioWriter
+    metrics: MetricsTracker
+    lots: LotBook
+    shares: np.ndarray
 
     # stores all of the ticks portfolio position.
     POSITION_COLLECTION = 'portfolio'
     # stores the latest tick portfolio position.
     TICK_COLLECTION = 'portfolio_tick'
+    # stores cash, commission and the total value of every tick.
+    HOLDINGS_COLLECTION = 'portfolio_holdings'
 
     def __init__(self,
                  data_handler: DataHandler,
@@ -57,8 +70,24 @@ class AbstractPortfolio(metaclass=ABCMeta):
                  start_date: datetime,
                  blotter: Blotter,
                  initial_capital: float = 100000.00,
-                 raise_on_warnings=False):
+                 raise_on_warnings=False,
+                 persistence=PersistencePolicy.END_OF_RUN,
+                 persist_every: int = 1000,
+                 lot_method=LotMethod.FIFO,
+                 name: str = None):
+        """
+        :param persistence: When to write the portfolio to the DB. See
+            :class:`PersistencePolicy`.
+        :param persist_every: How many bars to wait between writes when
+            ``persistence`` is ``EVERY_N_BARS``.
+        :param lot_method: How sales are matched against the lots that were
+            bought. See :class:`LotMethod`.
+        :param name: (optional) Added to the names the portfolio is stored
+            under so that portfolios sharing a DB library don't overwrite
+            each other, e.g. the name of the strategy trading it.
+        """
         self.logger = logging.getLogger(__name__)
+        self.name = name
         self.bars = data_handler
         self.events = events
         self.blotter = blotter
@@ -66,15 +95,28 @@ class AbstractPortfolio(metaclass=ABCMeta):
         self.initial_capital = initial_capital
         self.cash = initial_capital
         self.ticker_list = self.bars.tickers
+        # shares owned of each ticker in the order of the data handler's
+        # tickers.
+        self.shares = np.zeros(len(self.ticker_list))
+        # the latest known price of each ticker.
+        self.marks = np.zeros(len(self.ticker_list))
+        self.marks_dt = None
+        # True if the owned assets haven't seen the latest marks.
+        self._stale_assets = False
         self.owned_assets = {}
+        self.lots = LotBook(self.ticker_list, lot_method)
         # holdings = mv
         self.all_holdings_mv = self._construct_all_holdings()
         # positions = qty
         self.all_positions_qty = self._construct_all_positions()
         self.total_commission = 0.0
-        self.lib = ARCTIC_STORE['pytech.portfolio']
-        self.positions_df = pd.DataFrame()
+        self.writer = PortfolioWriter(self, persistence, persist_every)
         self.raise_on_warnings = raise_on_warnings
+        self.track_metrics()
+
+    @lazy_property
+    def lib(self) -> PortfolioStore:
+        return ARCTIC_STORE['pytech.portfolio']
 
     @property
     def total_value(self):
@@ -83,7 +125,69 @@ class AbstractPortfolio(metaclass=ABCMeta):
         easier.
         **This includes cash.**
         """
-        return self.all_holdings_mv[-1]['total']
+        return self.all_holdings_mv.last('total')
+
+    @property
+    def positions_df(self) -> pd.DataFrame:
+        """
+        The shares owned and market value of every ticker on every bar,
+        indexed by ``datetime`` and ``ticker``.
+        """
+        return self._positions_frame()
+
+    @property
+    def owned_assets(self) -> Dict[str, OwnedAsset]:
+        """
+        The :class:`OwnedAsset` of every ticker with a position.
+
+        Positions are valued from :attr:`shares` every bar, the owned
+        assets are only brought up to date with the latest prices when they
+        are looked at.
+        """
+        if self._stale_assets:
+            self._stale_assets = False
+
+            for ticker, asset in self._owned_assets.items():
+                i = self.bars.ticker_index.get(ticker)
+
+                if i is not None:
+                    asset.update_total_position_value(self.marks[i],
+                                                      self.marks_dt)
+
+        return self._owned_assets
+
+    @owned_assets.setter
+    def owned_assets(self, owned_assets: Dict[str, OwnedAsset]):
+        self._owned_assets = owned_assets
+        self.shares[:] = 0
+
+        for ticker in owned_assets:
+            self._sync_shares(ticker)
+
+    def track_metrics(self, **kwargs) -> MetricsTracker:
+        """
+        Start tracking performance metrics from the current value of the
+        portfolio.
+
+        :param kwargs: Passed to :class:`MetricsTracker`, e.g. the rules for
+            aborting a hopeless run. ``periods_per_year`` defaults to the
+            data handler's, so intraday bars are annualized correctly.
+        :return: The new tracker, also available as :attr:`metrics`.
+        """
+        kwargs.setdefault('periods_per_year', self.bars.periods_per_year)
+        self.metrics = MetricsTracker(**kwargs)
+        self.metrics.update(self.total_value)
+        return self.metrics
+
+    @property
+    def unrealized_pnl(self) -> np.ndarray:
+        """The unrealized P&L of each ticker's open lots at the marks."""
+        return self.lots.unrealized_pnl(self.marks)
+
+    @property
+    def market_values(self) -> np.ndarray:
+        """The market value of each ticker as of the latest bar."""
+        return self.shares * self.marks
 
     @property
     def total_asset_mv(self):
@@ -92,10 +196,7 @@ class AbstractPortfolio(metaclass=ABCMeta):
         owned assets easier.
         :return: The total market value of the owned assets in the portfolio.
         """
-        mv = 0.0
-        for asset in self.owned_assets.values():
-            mv += asset.total_position_value
-        return mv
+        return float(np.dot(self.shares, self.marks))
 
     @abstractmethod
     def update_signal(self, event):
@@ -113,24 +214,30 @@ class AbstractPortfolio(metaclass=ABCMeta):
         """
         raise NotImplementedError('Must implement update_fill()')
 
-    def _construct_all_positions(self):
+    def _construct_all_positions(self) -> Ledger:
         """
-        Constructs the position list using the start date to determine when
-        the index will begin.
+        Constructs the ledger of shares owned using the start date to
+        determine when the index will begin.
 
         This should only be called once.
         """
-        d = self._get_temp_dict()
-        d['datetime'] = self.start_date
-        return [d]
+        ledger = Ledger(self.ticker_list)
+        ledger.append(self.start_date, np.zeros(len(self.ticker_list)))
+        return ledger
 
-    def _construct_all_holdings(self):
-        d = {k: v for k, v in [(ticker, 0.0) for ticker in self.ticker_list]}
-        d['datetime'] = self.start_date
-        d['cash'] = self.initial_capital
-        d['commission'] = 0.0
-        d['total'] = self.initial_capital
-        return [d]
+    def _construct_all_holdings(self) -> Ledger:
+        """
+        Constructs the ledger of the market value of each ticker, cash,
+        commission and the total value of the portfolio.
+
+        This should only be called once.
+        """
+        ledger = Ledger(list(self.ticker_list)
+                        + ['cash', 'commission', 'total'])
+        row = np.zeros(len(ledger.columns))
+        row[-3:] = self.initial_capital, 0.0, self.initial_capital
+        ledger.append(self.start_date, row)
+        return ledger
 
     def _construct_current_holdings(self):
         """
@@ -143,9 +250,8 @@ class AbstractPortfolio(metaclass=ABCMeta):
         return d
 
     def create_equity_curve_df(self):
-        """Create a df from all_holdings_mv list of dicts."""
-        curve = pd.DataFrame(self.all_holdings_mv)
-        curve.set_index('datetime', inplace=True)
+        """Create a df from the all_holdings_mv ledger."""
+        curve = self.all_holdings_mv.to_frame()
         curve['returns'] = curve['total'].pct_change()
         curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
         self.equity_curve = curve
@@ -205,60 +311,70 @@ class AbstractPortfolio(metaclass=ABCMeta):
 
         self.blotter.check_order_triggers()
 
-        # get an element from the set
-        latest_dt = self.bars.get_latest_bar_dt(next(iter(self.ticker_list)))
-
-        # update positions
-        # dp = self._get_temp_dict()
-        # dp['datetime'] = latest_dt
-        dh = self._get_temp_dict()
-
-        for ticker in self.ticker_list:
-            try:
-                dh[ticker] = self.owned_assets[ticker].shares_owned
-            except KeyError:
-                dh[ticker] = 0
-
-        # append current positions
-        # self.all_positions_qty.append(dp)
-
-        # update holdings
-        # dh = self._get_temp_dict()
-        index = []
-        dh['cash'] = self.cash
-        dh['commission'] = self.total_commission
-        dh['total'] = self.cash
-
-        for ticker in self.ticker_list:
-            try:
-                owned_asset = self.owned_assets[ticker]
-            except KeyError:
-                market_value = 0
-                self.logger.debug(f'{ticker} is not currently owned, '
-                                  f'market value will be set to 0.')
-            else:
-                shares_owned = owned_asset.shares_owned
-                adj_close = self.bars.get_latest_bar_value(ticker,
-                                                           pd_utils.ADJ_CLOSE_COL)
-                market_value = shares_owned * adj_close
-                owned_asset.update_total_position_value(adj_close, latest_dt)
-
-            # approximate to real value.
-            dh[ticker] = market_value
-            dh['total'] += market_value
-            index.append((latest_dt, ticker))
-
-        multi_index = pd.MultiIndex.from_tuples(index, names=['datetime',
-                                                              'ticker'])
-        df = pd.DataFrame(dh, index=multi_index)
-
-        self.positions_df = pd.concat([self.positions_df, df])
-        self.logger.info('Writing current portfolio state to DB.')
-        self.lib.write_snapshot(self.POSITION_COLLECTION,
-                                self.positions_df,
-                                latest_dt)
-        self.lib.write_snapshot(self.TICK_COLLECTION, df, latest_dt)
-        self.all_holdings_mv.append(dh)
+        latest_dt = dt_utils.parse_date(self.bars.current_dt)
+        self._update_marks(latest_dt)
+        n_tickers = len(self.ticker_list)
+        holdings = np.empty(n_tickers + 3)
+        # approximate to real value.
+        np.multiply(self.shares, self.marks, out=holdings[:n_tickers])
+        holdings[-3] = self.cash
+        holdings[-2] = self.total_commission
+        holdings[-1] = self.cash + np.dot(self.shares, self.marks)
+        self.all_positions_qty.append(latest_dt, self.shares)
+        self.all_holdings_mv.append(latest_dt, holdings)
+        self.metrics.update(holdings[-1],
+                            np.abs(holdings[:n_tickers]).sum())
+        self.writer.on_bar(latest_dt)
+
+    def _update_marks(self, latest_dt) -> None:
+        """
+        Take the latest prices from the data handler. Tickers without a
+        price on this bar keep their last one.
+        """
+        prices = self.bars.get_latest_prices(pd_utils.ADJ_CLOSE_COL)
+        np.copyto(self.marks, prices, where=~np.isnan(prices))
+        self.marks_dt = latest_dt
+        self._stale_assets = bool(self._owned_assets)
+
+    def _sync_shares(self, ticker: str) -> None:
+        """Copy the shares owned of ``ticker`` into :attr:`shares`."""
+        i = self.bars.ticker_index.get(ticker)
+
+        if i is None:
+            self.logger.warning(f'{ticker} is not in the data handler, it '
+                                'will not be valued.')
+            return
+
+        asset = self._owned_assets.get(ticker)
+        self.shares[i] = 0 if asset is None else asset.shares_owned
+
+    def close(self):
+        """
+        Write anything the persistence policy is holding on to and wait for
+        it to finish. Called when the backtest ends.
+        """
+        self.writer.close()
+
+    def _positions_frame(self, start: int = 0,
+                         stop: int = None) -> pd.DataFrame:
+        """
+        Build the long format positions DataFrame from the ledgers.
+
+        :param start: The first bar to include.
+        :param stop: (optional) The bar to stop before.
+        """
+        n_tickers = len(self.ticker_list)
+        shares = self.all_positions_qty.values[start:stop]
+        market_values = self.all_holdings_mv.values[start:stop, :n_tickers]
+        dates = self.all_positions_qty.index[start:stop]
+        index = pd.MultiIndex.from_arrays(
+                [dates.repeat(n_tickers),
+                 np.tile(self.ticker_list, len(dates))],
+                names=['datetime', 'ticker'])
+        return pd.DataFrame({
+            'shares': shares.ravel(),
+            'market_value': market_values.ravel(),
+        }, index=index, columns=['shares', 'market_value'])
 
 
 class BasicPortfolio(AbstractPortfolio):
@@ -270,31 +386,43 @@ class BasicPortfolio(AbstractPortfolio):
                  start_date: datetime,
                  blotter: Blotter,
                  initial_capital: float = 100000.00,
-                 raise_on_warnings=False):
+                 raise_on_warnings=False,
+                 persistence=PersistencePolicy.END_OF_RUN,
+                 persist_every: int = 1000,
+                 lot_method=LotMethod.FIFO,
+                 name: str = None):
         super().__init__(data_handler,
                          events,
                          start_date,
                          blotter,
                          initial_capital,
-                         raise_on_warnings)
+                         raise_on_warnings,
+                         persistence,
+                         persist_every,
+                         lot_method,
+                         name)
 
     def _update_from_trade(self, trade: Trade):
         self.cash += trade.trade_cost()
         self.total_commission += trade.commission
+        self.metrics.add_trade(trade.qty * trade.price_per_share)
 
         if trade.ticker in self.owned_assets:
             self._update_existing_owned_asset_from_trade(trade)
         else:
             self._create_new_owned_asset_from_trade(trade)
 
+        self._sync_shares(trade.ticker)
+
     def _update_existing_owned_asset_from_trade(self, trade):
         """
         Update an existing owned asset or delete it if the trade results
         in all shares being sold.
         """
+        self._update_lots_from_trade(trade)
         owned_asset = self.owned_assets[trade.ticker]
         updated_asset = owned_asset.make_trade(
-                trade.qty, trade.avg_price_per_share)
+                trade.signed_qty, trade.avg_price_per_share)
 
         if updated_asset is None:
             del self.owned_assets[trade.ticker]
@@ -303,6 +431,8 @@ class BasicPortfolio(AbstractPortfolio):
 
     def _create_new_owned_asset_from_trade(self, trade):
         """Create a new owned asset based on the execution of a trade."""
+        self._update_lots_from_trade(trade)
+
         if trade.action is TradeAction.SELL:
             asset_position = Position.SHORT
         else:
@@ -311,16 +441,24 @@ class BasicPortfolio(AbstractPortfolio):
         self.owned_assets[trade.ticker] = OwnedAsset.from_trade(trade,
                                                                 asset_position)
 
+    def _update_lots_from_trade(self, trade):
+        """Open or close lots, realizing P&L on any lots that close."""
+        self.lots.fill(trade.ticker, trade.signed_qty, trade.price_per_share,
+                       trade.trade_date, trade.commission)
+
     def update_fill(self, event):
-        if event.type is EventType.FILL:
+        if event.event_type is EventType.FILL:
             order = self.blotter[event.order_id]
             if self.check_liquidity(event.price, event.available_volume):
                 trade = self.blotter.make_trade(order,
                                                 event.price,
                                                 event.dt,
                                                 event.available_volume)
-                self._update_from_trade(trade)
+                if trade is not None:
+                    self._update_from_trade(trade)
             else:
+                # the order can be sent again on the next bar.
+                self.blotter.in_flight.discard(order.id)
                 self.logger.warning(
                         'Insufficient funds available to execute trade for '
                         f'ticker: {order.ticker}')
@@ -546,7 +684,7 @@ class Portfolio(object):
         in all shares being sold.
         """
         owned_asset = self.owned_assets[trade.ticker]
-        updated_asset = owned_asset.make_trade(trade.qty,
+        updated_asset = owned_asset.make_trade(trade.signed_qty,
                                                trade.avg_price_per_share)
 
         if updated_asset is None:
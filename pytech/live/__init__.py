@@ -0,0 +1,4 @@
+"""
+Run the backtest stack (:class:`Strategy`, portfolio and :class:`Blotter`)
+against bars that arrive in real time.
+"""
@@ -0,0 +1,113 @@
+"""
+Asynchronous sources of bars for paper trading.
+
+A feed is an async iterable of steps, each step being a timestamp and the
+``(ticker, bar)`` tuples that arrived for it.
+"""
+import asyncio
+import datetime as dt
+import logging
+from abc import ABCMeta, abstractmethod
+from typing import AsyncIterator, Dict, Iterable
+
+import pandas as pd
+
+from pytech.data.reader import BarReader
+from pytech.data.timeline import Step, Timeline
+
+
+class BarFeed(metaclass=ABCMeta):
+    """Base class for every feed."""
+
+    def __init__(self, tickers: Iterable[str],
+                 start_date: dt.datetime = None,
+                 end_date: dt.datetime = None):
+        self.logger = logging.getLogger(__name__)
+        self.tickers = list(tickers)
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def __aiter__(self) -> AsyncIterator[Step]:
+        return self.bars()
+
+    @abstractmethod
+    def bars(self) -> AsyncIterator[Step]:
+        """Yield every step as it arrives."""
+        raise NotImplementedError('Must implement bars()')
+
+
+class ReplayFeed(BarFeed):
+    """
+    Replay stored bars as if they were arriving live.
+
+    This is a local stand in for a real market data feed.
+    """
+
+    def __init__(self,
+                 data: Dict[str, pd.DataFrame],
+                 speed: float = None,
+                 interval: float = None,
+                 calendar: pd.DatetimeIndex = None):
+        """
+        :param data: An OHLCV DataFrame for each ticker.
+        :param speed: (optional) How many times faster than the time
+            between bars to replay them, e.g. 60 replays minute bars once a
+            second.
+        :param interval: (optional) Seconds to wait between every step,
+            used instead of ``speed``.
+        :param calendar: (optional) See :class:`Timeline`.
+
+        If neither ``speed`` or ``interval`` is given the bars are replayed
+        as fast as they can be consumed.
+        """
+        self.timeline = Timeline(data, calendar)
+        index = self.timeline.index
+        super().__init__(data.keys(),
+                         index[0] if len(index) else None,
+                         index[-1] if len(index) else None)
+        self.speed = speed
+        self.interval = interval
+
+    @classmethod
+    def from_store(cls,
+                   tickers: Iterable[str],
+                   start_date: dt.datetime,
+                   end_date: dt.datetime,
+                   lib_name: str = 'pytech.bars',
+                   source: str = 'google',
+                   **kwargs) -> 'ReplayFeed':
+        """
+        Replay bars from the :class:`pytech.mongo.BarStore`.
+
+        :param kwargs: Passed to the constructor.
+        """
+        reader = BarReader(lib_name)
+        data = reader.get_data(list(tickers), source=source,
+                               start=start_date, end=end_date)
+        return cls(data, **kwargs)
+
+    async def bars(self) -> AsyncIterator[Step]:
+        loop = asyncio.get_event_loop()
+        # wait relative to when the replay started so delays don't add up.
+        started = loop.time()
+        elapsed = 0.0
+        prev = None
+
+        for current_dt, bars in self.timeline:
+            if prev is not None:
+                if self.interval is not None:
+                    elapsed += self.interval
+                elif self.speed:
+                    elapsed += ((current_dt - prev).total_seconds()
+                                / self.speed)
+
+            delay = started + elapsed - loop.time()
+
+            if prev is not None and delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # always let other tasks run between steps.
+                await asyncio.sleep(0)
+
+            prev = current_dt
+            yield current_dt, bars
@@ -0,0 +1,332 @@
+"""
+Paper trade a strategy against an asynchronous :class:`BarFeed`.
+
+The feed, the simulated broker and the strategy never wait on each other:
+
+* The feed runs as its own task on the event loop and drops every step it
+  receives into an inbox along with the time it arrived.
+* The strategy, portfolio and blotter are synchronous, so each inbox item is
+  processed on a single worker thread. A slow strategy makes the inbox grow
+  but never holds up the feed.
+* Orders are filled by an :class:`AsyncExecutionHandler` on the event loop
+  after a simulated latency, and the fills go back through the inbox.
+
+The time from a bar arriving to every order placed while processing it is
+recorded in :attr:`PaperTrader.latency`.
+"""
+import asyncio
+import concurrent.futures
+import json
+import logging
+import queue
+from time import perf_counter
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from pytech.backtest.backtest import TradingContext, process_event
+from pytech.backtest.event import FillEvent
+from pytech.backtest.scheduler import Scheduler
+from pytech.data.handler import LiveBars
+from pytech.fin.portfolio import BasicPortfolio
+from pytech.live.feed import BarFeed
+from pytech.trading.blotter import Blotter
+from pytech.trading.execution import ExecutionHandler
+from pytech.utils.enums import EventType, FillPolicy, PersistencePolicy
+
+logger = logging.getLogger(__name__)
+
+# the kinds of items in the inbox.
+BARS = 'bars'
+FILL = 'fill'
+
+
+class AsyncExecutionHandler(ExecutionHandler):
+    """
+    A simulated broker that fills orders on the event loop.
+
+    :meth:`execute_order` only hands the order to the event loop, so the
+    thread running the strategy never waits for a fill.
+    """
+
+    def __init__(self, events: queue.Queue, latency: float = 0.0):
+        """
+        :param events: The strategy's event queue.
+        :param latency: Seconds between an order being sent and it being
+            filled.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.events = events
+        self.latency = latency
+        # the number of orders that have been sent but not filled yet. Only
+        # touched on the event loop.
+        self.pending = 0
+        self._loop = None
+        self._inbox = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop,
+               inbox: asyncio.Queue) -> None:
+        """Send fills to ``inbox`` on ``loop``."""
+        self._loop = loop
+        self._inbox = inbox
+
+    def execute_order(self, event):
+        if event.event_type is not EventType.TRADE:
+            return
+
+        # this is called from the worker thread.
+        self._loop.call_soon_threadsafe(self._submit, event)
+
+    def _submit(self, event) -> None:
+        self.pending += 1
+        self._loop.create_task(self._fill(event))
+
+    async def _fill(self, event) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        fill = FillEvent(event.order_id, event.price, event.qty, event.dt)
+        self.pending -= 1
+        await self._inbox.put((FILL, fill, perf_counter()))
+
+
+class LatencyRecorder(object):
+    """Collect latency samples in seconds and summarize them."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.samples: List[float] = []
+
+    def __len__(self):
+        return len(self.samples)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        """Count, mean and percentiles in milliseconds."""
+        if not self.samples:
+            return {'count': 0}
+
+        ms = np.asarray(self.samples) * 1000
+        return {
+            'count': len(ms),
+            'mean_ms': float(ms.mean()),
+            'p50_ms': float(np.percentile(ms, 50)),
+            'p90_ms': float(np.percentile(ms, 90)),
+            'p99_ms': float(np.percentile(ms, 99)),
+            'max_ms': float(ms.max()),
+        }
+
+
+class PaperTrader(object):
+    """Run a strategy against a live feed with simulated execution."""
+
+    def __init__(self,
+                 ticker_list: Iterable[str],
+                 feed: BarFeed,
+                 strategy,
+                 initial_capital: float = 100000,
+                 start_date=None,
+                 end_date=None,
+                 portfolio=None,
+                 execution_latency: float = 0.0,
+                 fill_policy=FillPolicy.FFILL,
+                 persistence=PersistencePolicy.END_OF_DAY,
+                 name: str = None,
+                 periods_per_year: int = None):
+        """
+        :param ticker_list: The tickers to trade.
+        :param feed: Where the bars come from.
+        :param strategy: The strategy class, or a :func:`functools.partial`
+            of one.
+        :param initial_capital: The starting cash.
+        :param start_date: Defaults to the feed's start date.
+        :param end_date: Defaults to the feed's end date.
+        :param portfolio: The portfolio class. Defaults to
+            :class:`BasicPortfolio`.
+        :param execution_latency: Seconds it takes the simulated broker to
+            fill an order.
+        :param fill_policy: See :class:`pytech.data.handler.Bars`.
+        :param persistence: When the portfolio is written to the DB. See
+            :class:`PersistencePolicy`.
+        :param name: (optional) The name used in logs and added to the
+            names the portfolio is stored under. Defaults to the name of the
+            strategy.
+        :param periods_per_year: (optional) How many bars the feed sends in
+            a year, used to annualize the metrics. Defaults to one a trading
+            day.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.ticker_list = list(ticker_list)
+        self.feed = feed
+        self.start_date = start_date or feed.start_date
+        self.end_date = end_date or feed.end_date
+
+        events = queue.Queue()
+        self.data_handler = LiveBars(events, self.ticker_list,
+                                     self.start_date, self.end_date,
+                                     fill_policy=fill_policy,
+                                     periods_per_year=periods_per_year)
+        blotter = Blotter(events)
+        blotter.bars = self.data_handler
+        portfolio_cls = portfolio or BasicPortfolio
+        scheduler = Scheduler(intraday=self.data_handler.intraday)
+        strategy = strategy(self.data_handler, events)
+        strategy.schedule_callbacks(scheduler)
+        name = name or strategy.__class__.__name__
+        self.context = TradingContext(
+                name,
+                strategy,
+                portfolio_cls(self.data_handler, events, self.start_date,
+                              blotter, initial_capital,
+                              persistence=persistence, name=name),
+                blotter,
+                AsyncExecutionHandler(events, execution_latency),
+                events,
+                scheduler)
+
+        # bar arrival -> order placed.
+        self.latency = LatencyRecorder('bar_to_order')
+        # bar arrival -> done processing the bar.
+        self.processing = LatencyRecorder('bar_to_processed')
+        # how many items were waiting in the inbox, sampled per item.
+        self.max_backlog = 0
+        self._arrival = None
+        self._wrap_place_order(blotter)
+
+    @property
+    def strategy(self):
+        return self.context.strategy
+
+    @property
+    def portfolio(self):
+        return self.context.portfolio
+
+    @property
+    def blotter(self) -> Blotter:
+        return self.context.blotter
+
+    def run(self) -> None:
+        """Run until the feed ends and every order has been filled."""
+        loop = asyncio.new_event_loop()
+
+        try:
+            loop.run_until_complete(self.run_async())
+        finally:
+            loop.close()
+
+    async def run_async(self) -> None:
+        loop = asyncio.get_event_loop()
+        inbox = asyncio.Queue()
+        execution_handler = self.context.execution_handler
+        execution_handler.attach(loop, inbox)
+        self.context.scheduler.start(self.start_date, self.end_date)
+
+        # one thread so items are processed in the order they arrived.
+        with concurrent.futures.ThreadPoolExecutor(1) as worker:
+            feed_task = loop.create_task(self._read_feed(inbox))
+
+            while True:
+                if (feed_task.done() and inbox.empty()
+                        and not execution_handler.pending):
+                    break
+
+                get = loop.create_task(inbox.get())
+
+                if feed_task.done():
+                    # only fills are left to come.
+                    await get
+                else:
+                    done, _ = await asyncio.wait(
+                            [get, feed_task],
+                            return_when=asyncio.FIRST_COMPLETED)
+
+                    if get not in done:
+                        # the feed ended while waiting, check if we're done.
+                        get.cancel()
+                        continue
+
+                self.max_backlog = max(self.max_backlog, inbox.qsize())
+                await loop.run_in_executor(worker, self._process,
+                                           get.result())
+
+            # surface any error from the feed.
+            feed_task.result()
+
+        self.portfolio.close()
+
+        self.logger.info(f'Paper trading finished. {self.report()}')
+
+    def report(self) -> Dict[str, Any]:
+        """The latency, counters and metrics as a JSON friendly dict."""
+        return {
+            'bars': self.data_handler.bar_count,
+            'signals': self.context.signals,
+            'orders': self.context.orders,
+            'fills': self.context.fills,
+            'max_backlog': self.max_backlog,
+            'metrics': self.portfolio.metrics.snapshot(),
+            self.latency.name: self.latency.summary(),
+            self.processing.name: self.processing.summary(),
+        }
+
+    def export_latency(self, path: str) -> None:
+        """
+        Write the latency samples to ``path``.
+
+        A ``.json`` path gets :meth:`report`, anything else gets a CSV of
+        every sample in milliseconds.
+        """
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump(self.report(), f, indent=2)
+            return
+
+        frames = [pd.DataFrame({'metric': r.name,
+                                'ms': np.asarray(r.samples) * 1000})
+                  for r in (self.latency, self.processing)]
+        pd.concat(frames, ignore_index=True).to_csv(path, index=False)
+
+    async def _read_feed(self, inbox: asyncio.Queue) -> None:
+        async for current_dt, bars in self.feed:
+            await inbox.put((BARS, (current_dt, bars), perf_counter()))
+
+    def _process(self, item) -> None:
+        """Runs on the worker thread."""
+        kind, payload, arrival = item
+        self._arrival = arrival
+        context = self.context
+
+        if kind == BARS:
+            current_dt, bars = payload
+            self.data_handler.push(current_dt, bars)
+
+            if context.scheduler:
+                context.scheduler.fire(current_dt)
+        else:
+            context.events.put(payload)
+
+        while True:
+            try:
+                event = context.events.get(False)
+            except queue.Empty:
+                break
+            else:
+                if event is not None:
+                    process_event(event, context)
+
+        if kind == BARS:
+            self.processing.record(perf_counter() - arrival)
+
+    def _wrap_place_order(self, blotter: Blotter) -> None:
+        """Record the latency of every order the blotter places."""
+        place_order = blotter.place_order
+
+        def timed_place_order(*args, **kwargs):
+            out = place_order(*args, **kwargs)
+            self.latency.record(perf_counter() - self._arrival)
+            return out
+
+        blotter.place_order = timed_place_order
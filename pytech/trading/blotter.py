@@ -3,9 +3,12 @@ import logging
 import operator
 import queue
 from datetime import datetime
-from typing import Dict, Union
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
 
 import pytech.utils as utils
+import pytech.utils.dt_utils as dt_utils
 from pytech.backtest.event import TradeEvent
 from pytech.data.handler import DataHandler
 from pytech.fin.asset.asset import Asset
@@ -17,7 +20,11 @@ from pytech.trading.order import (
     LimitOrder, MarketOrder, Order,
     StopLimitOrder, StopOrder, get_order_types
 )
+from pytech.trading.order_index import ExpiryQueue, OrderIndex
+from pytech.trading.sessions import SessionTable
+from pytech.trading.slippage import AbstractSlippageModel, NoSlippage
 from pytech.trading.trade import Trade
+from pytech.trading.trade_log import TradeLog
 from pytech.utils.enums import (
     OrderStatus, OrderSubType, OrderType,
     TradeAction
@@ -34,16 +41,25 @@ class Blotter(object):
     events: queue.Queue
     current_dt = datetime
     commission_model: AbstractCommissionModel.__subclasses__()
+    slippage_model: AbstractSlippageModel
 
     def __init__(self,
                  events,
                  commission_model=None,
-                 max_shares=None):
+                 max_shares=None,
+                 slippage_model=None,
+                 calendar=None):
         self.logger = logging.getLogger(__name__)
-        # dict of all orders. key=ticker of the asset, value=the order.
+        # the sessions that DAY and GTC orders expire at the close of.
+        self.sessions = SessionTable.for_calendar(calendar)
+        # dict of all orders. key=ticker of the asset, value=dict of the
+        # orders for the asset keyed by order id.
         self.orders = {}
         # keep a record of all past trades.
-        self.trades = []
+        self.trades = TradeLog()
+        # ids of the orders that were sent to be filled and whose fill has
+        # not come back yet, see check_order_triggers.
+        self.in_flight = set()
         self.current_dt = None
         # events queue
         self.events = events
@@ -64,6 +80,40 @@ class Blotter(object):
                         .format(type(commission_model))
             )
 
+        if slippage_model is None:
+            self.slippage_model = NoSlippage()
+        elif isinstance(slippage_model, AbstractSlippageModel):
+            self.slippage_model = slippage_model
+        else:
+            raise TypeError(
+                    'slippage_model must be a subclass of '
+                    f'AbstractSlippageModel. {type(slippage_model)} was '
+                    'provided')
+
+    @property
+    def orders(self) -> Dict[str, Dict[str, AnyOrder]]:
+        return self._orders
+
+    @orders.setter
+    def orders(self, orders: Dict[str, Dict[str, AnyOrder]]) -> None:
+        """Replace every order and rebuild the :class:`OrderIndex`."""
+        self._orders = orders
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._index = OrderIndex(order for _, order in self)
+        self._expiries = ExpiryQueue()
+
+        for _, order in self:
+            if order.open:
+                self._schedule_expiry(order)
+
+    def _schedule_expiry(self, order: AnyOrder) -> None:
+        expires = order.expires_at(self.sessions)
+
+        if expires is not None:
+            self._expiries.push(expires.value, order)
+
     @property
     def bars(self) -> DataHandler:
         """Allow access to the :class:`DataHandler`"""
@@ -80,7 +130,15 @@ class Blotter(object):
                             f'{type(data_handler)} was provided')
 
     def __getitem__(self, key) -> Order:
-        """Get an order from the orders dict."""
+        """
+        Get an order by its id, or the orders dict of a ticker if ``key``
+        is not an order id.
+        """
+        order = self._index.get(key)
+
+        if order is not None:
+            return order
+
         return self.orders[key]
 
     def __setitem__(self, key, value):
@@ -94,13 +152,50 @@ class Blotter(object):
         :param Order value: The order.
         """
         if issubclass(key.__class__, Asset):
-            self.orders[key.ticker] = value
-        else:
-            self.orders[key] = value
+            key = key.ticker
+
+        self._replace_orders(key, value)
 
     def __delitem__(self, key):
         """Delete an order from the orders dict."""
-        del self.orders[key]
+        if key not in self.orders:
+            raise KeyError(key)
+
+        self._replace_orders(key, None)
+
+    def _replace_orders(self, ticker: str,
+                        orders: Optional[Dict[str, AnyOrder]]) -> None:
+        """
+        Replace the orders of one ticker, only updating the index for the
+        orders that changed instead of rebuilding it.
+
+        :param ticker: The ticker whose orders are replaced.
+        :param orders: The new orders keyed by id, ``None`` to delete them.
+        """
+        old = self._orders.get(ticker, {})
+
+        if orders is old:
+            # changed in place, so there's no telling what changed.
+            self._reindex()
+            return
+
+        new = orders if orders is not None else {}
+
+        for order_id, order in old.items():
+            if new.get(order_id) is not order:
+                self._index.remove(order)
+
+        if orders is None:
+            del self._orders[ticker]
+        else:
+            self._orders[ticker] = orders
+
+        for order_id, order in new.items():
+            if old.get(order_id) is not order:
+                self._index.add(order)
+
+                if order.open:
+                    self._schedule_expiry(order)
 
     def __iter__(self):
         """
@@ -155,7 +250,7 @@ class Blotter(object):
         before it expires.
         :param str order_id: (optional)
         The ID of the :class:`pytech.trading.order.Order`.
-        :return: None
+        :return: The new order.
         """
         if qty == 0:
             # No point in making an order for 0 shares.
@@ -191,6 +286,9 @@ class Blotter(object):
         if date_placed is None:
             date_placed = self.current_dt
 
+        if date_placed is None and self.bars is not None:
+            date_placed = self.bars.current_dt
+
         order = self._create_order(ticker,
                                    action,
                                    qty,
@@ -212,6 +310,32 @@ class Blotter(object):
                 order.id: order
             }
 
+        self._index.add(order)
+        self._schedule_expiry(order)
+        return order
+
+    def place_orders(self,
+                     tickers: Sequence[str],
+                     qtys: Sequence[int],
+                     **kwargs) -> List[AnyOrder]:
+        """
+        Open an order for each ticker in one call.
+
+        :param tickers: The ticker of each order.
+        :param qtys: The number of shares of each order, negative to sell.
+            Orders for 0 shares are skipped.
+        :param kwargs: Passed to :meth:`place_order` for every order.
+        :return: The new orders.
+        """
+        orders = []
+
+        for ticker, qty in zip(tickers, np.asarray(qtys).tolist()):
+            if qty:
+                orders.append(self.place_order(ticker, int(qty), **kwargs))
+
+        self.logger.debug(f'Placed {len(orders)} orders.')
+        return orders
+
     def _create_order(self,
                       ticker: str,
                       action: TradeAction,
@@ -224,9 +348,10 @@ class Blotter(object):
         This is meant to be somewhat of an order factory.
         """
         order_type = OrderType.check_if_valid(order_type)
+        kwargs['created'] = kwargs.pop('date_placed', None)
 
         if order_type is OrderType.MARKET:
-            return MarketOrder(ticker, action, qty)
+            return MarketOrder(ticker, action, qty, **kwargs)
 
         if order_type is OrderType.STOP:
             return StopOrder(ticker, action, qty, **kwargs)
@@ -237,15 +362,20 @@ class Blotter(object):
         if order_type is OrderType.STOP_LIMIT:
             return StopLimitOrder(ticker, action, qty, **kwargs)
 
-    def _find_order(self, order_id, ticker):
-        if ticker is None:
-            for asset_orders in self.orders:
-                if order_id in asset_orders:
-                    return asset_orders[order_id]
-        else:
-            for k, v in self.orders[ticker].items():
-                if k == order_id:
-                    return v
+    def _find_order(self, order_id, ticker=None):
+        """
+        Find an order by id.
+
+        :param order_id: The id of the order.
+        :param ticker: (optional) If given the order must be for this ticker.
+        :return: The order or ``None`` if there is no such order.
+        """
+        order = self._index.get(order_id)
+
+        if order is None or ticker is not None and order.ticker != ticker:
+            return None
+
+        return order
 
     def cancel_order(self, order_id, ticker=None, reason=''):
         """
@@ -253,15 +383,19 @@ class Blotter(object):
 
         :param str order_id: The id of the order to cancel.
         :param ticker: (optional) The ticker that the order is associated with.
-            Although it is not required to provide a ticker,
-            it is **strongly** encouraged.
-            By providing a ticker the execution time of this method will
-            increase greatly.
+            If given the order is only cancelled if it is for this ticker.
         :param str reason: (optional)
             The reason that the order is being cancelled.
         :return:
         """
-        self._do_order_cancel(self._find_order(order_id, ticker), reason)
+        order = self._find_order(order_id, ticker)
+
+        if order is None:
+            self.logger.warning(f'Order id: {order_id} for ticker: {ticker} '
+                                'does not exist and cannot be cancelled.')
+            return
+
+        self._do_order_cancel(order, reason)
 
     def cancel_all_orders_for_asset(self, ticker,
                                     reason='',
@@ -431,6 +565,7 @@ class Blotter(object):
                              'successfully before it was executed.')
         order.cancel(reason)
         order.last_updated = self.current_dt
+        self._index.discard(order)
 
     def hold_order(self, order):
         """
@@ -477,29 +612,127 @@ class Blotter(object):
         :param str reason: (optional) The reason the order was rejected.
         :return:
         """
+        order = self._find_order(order_id, ticker)
 
-        self._find_order(order_id, ticker).reject(reason)
+        if order is None:
+            self.logger.warning(f'Order id: {order_id} for ticker: {ticker} '
+                                'does not exist and cannot be rejected.')
+            return
+
+        order.reject(reason)
+        self._index.discard(order)
 
         self.logger.warning(
                 f'Order id: {order_id} for ticker: {ticker} '
                 f'was rejected because: {reason}')
 
+    def expire_orders(self, current_dt=None) -> List[AnyOrder]:
+        """
+        Cancel every DAY and GTC order that has expired by ``current_dt``.
+
+        The time each open order expires at is kept in an
+        :class:`ExpiryQueue`, so this only does any work on the first bar
+        after a session closes, and then only for the orders that expired.
+        An order whose fill is :attr:`in_flight` is not expired until the
+        fill is back.
+
+        :param current_dt: (optional) The current time. Defaults to the
+            time of the latest bar.
+        :return: The orders that were cancelled.
+        """
+        if current_dt is None:
+            current_dt = self.bars.current_dt
+
+        next_expiry = self._expiries.next_expiry
+
+        if next_expiry is None:
+            return []
+
+        now = dt_utils.parse_date(current_dt).value
+
+        if next_expiry > now:
+            return []
+
+        expired = []
+
+        for order in self._expiries.pop_expired(now):
+            if self._index.get(order.id) is not order or not order.open:
+                # filled, cancelled or replaced since it was scheduled.
+                continue
+
+            if order.id in self.in_flight:
+                # it has already been sent to be filled, expire it once the
+                # fill is back if anything is still open.
+                self._schedule_expiry(order)
+                continue
+
+            if order.check_order_expiration(current_dt, self.sessions):
+                order.last_updated = current_dt
+                self._index.discard(order)
+                expired.append(order)
+            else:
+                # the order was changed to expire later.
+                self._schedule_expiry(order)
+
+        if expired:
+            self.logger.info(f'{len(expired)} orders expired.')
+
+        return expired
+
     def check_order_triggers(self):
         """
         Check if any order has been triggered and if they have execute the
         trade and then clean up closed orders.
-        """
-        for order_id, order in self:
-            # should this be looking the close column?
-            bar = self.bars.get_latest_bar(order.ticker)
-            dt = bar.name
-            current_price = bar[utils.CLOSE_COL]
-            # available_volume = bar[pd_utils.VOL_COL]
-            # check_triggers returns a boolean indicating if it is triggered.
-            if order.check_triggers(dt=dt, current_price=current_price):
-                self.events.put(
-                        TradeEvent(order_id, current_price, order.qty, dt)
-                )
+
+        Every open order is checked against the latest closes at once, see
+        :class:`OrderIndex`. Orders that triggered are sent to be filled on
+        every bar until they are no longer open. An order is not sent again
+        while its fill is still :attr:`in_flight`, an asynchronous broker
+        may take several bars to fill it. Orders that expired are cancelled
+        first, see :meth:`expire_orders`.
+
+        The :attr:`slippage_model` decides the price and number of shares of
+        every fill from the latest bars, all in one call.
+        """
+        dt = self.bars.current_dt
+        self.expire_orders(dt)
+        # should this be looking the close column?
+        prices = self._latest(utils.CLOSE_COL)
+        triggered = self._index.check(prices, dt)
+
+        if self.in_flight:
+            triggered = [(order, price) for order, price in triggered
+                         if order.id not in self.in_flight]
+
+        if not triggered:
+            return
+
+        orders = [order for order, _ in triggered]
+        ticker_ids = self._index.ticker_ids
+        tickers = np.array([ticker_ids[order.ticker] for order in orders])
+        fill_prices, fill_qtys = self.slippage_model.fill(
+                [order.open_amount for order in orders],
+                [price for _, price in triggered],
+                self._latest(utils.VOL_COL)[tickers],
+                self._latest(utils.HIGH_COL)[tickers],
+                self._latest(utils.LOW_COL)[tickers],
+                ticker=tickers)
+
+        for order, price, qty in zip(orders, fill_prices.tolist(),
+                                     fill_qtys.tolist()):
+            if qty:
+                self.in_flight.add(order.id)
+                self.events.put(TradeEvent(order.id, price, int(qty), dt))
+
+    def _latest(self, val_type) -> np.ndarray:
+        """The latest ``val_type`` of every ticker of the order index."""
+        try:
+            values = self.bars.get_latest_prices(val_type)
+        except KeyError:
+            # the bars don't have the column.
+            values = np.full(len(self.bars.tickers), np.nan)
+
+        return self._index.prices_for(values, self.bars.ticker_index)
 
     def make_trade(self,
                    order: AnyOrder,
@@ -514,10 +747,9 @@ class Blotter(object):
         :param float price_per_share: the cost per share in the trade
         :param datetime trade_date: The date and time that the trade is
             taking place.
-        :return: ``order`` if the order is no longer open so it can be removed
-            from the ``portfolio`` order dict
-            and ``None`` if the order is still open
-        :rtype: Order or None
+        :return: The trade, or ``None`` if there was nothing left to fill
+            because the order is already filled.
+        :rtype: Trade or None
 
         This method will add the ticker to the :py:class:``Portfolio`` ticker
         dict and update the db to reflect the trade.
@@ -529,9 +761,18 @@ class Blotter(object):
         * BUY
         * SELL
         """
-        commission_cost = self.commission_model.calculate(order,
-                                                          price_per_share)
-        available_volume = order.get_available_volume(volume)
+        self.in_flight.discard(order.id)
+        available_volume = order.get_available_volume(abs(volume))
+
+        if not available_volume:
+            self.logger.warning(f'Rejected a fill of 0 shares for order: '
+                                f'{order.id}. open_amount: '
+                                f'{order.open_amount}, volume: {volume}')
+            return None
+
+        commission_cost = float(self.commission_model.calculate_many(
+                [available_volume], [price_per_share], [trade_date],
+                [order.commission])[0])
         avg_price_per_share = (
             ((price_per_share * available_volume) + commission_cost)
             / available_volume)
@@ -542,8 +783,8 @@ class Blotter(object):
                                  price_per_share, available_volume,
                                  avg_price_per_share)
 
-        order.filled += trade.qty
-        self.trades.append(trade)
+        order.filled += trade.signed_qty
+        self.trades.append_trade(trade)
         return trade
 
     def purge_orders(self):
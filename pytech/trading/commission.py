@@ -1,38 +1,120 @@
-"""Classes that define commission models"""
+"""
+Classes that define commission models
 
-from abc import ABCMeta, abstractmethod
+Every model works on arrays with a value per fill, so the commission of any
+number of fills is calculated in one call to
+:meth:`AbstractCommissionModel.calculate_many`.
+:meth:`AbstractCommissionModel.calculate` charges a single fill of an
+:class:`pytech.trading.order.Order`.
+"""
+import logging
+from abc import ABCMeta
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_MINIMUM_COST_PER_ORDER = 5.0
+DEFAULT_COST_PER_SHARE = .005
+DEFAULT_COMMISSION_RATE = .001
+
+# (shares traded this month from, cost per share) like a broker's tiers.
+DEFAULT_TIERS = (
+    (0, .0035),
+    (300000, .002),
+    (3000000, .0015),
+    (20000000, .001),
+    (100000000, .0005),
+)
 
 
 class AbstractCommissionModel(metaclass=ABCMeta):
     """
     Abstract Commission Model interface.
 
-    Commission models define how much commission should be charged extra to a 
+    Commission models define how much commission should be charged extra to a
     portfolio per order or trade.
+
+    Child classes are responsible for implementing a
+    :py:func:`calculate_many` method. Models that only implement
+    :py:func:`calculate` still work, one fill at a time.
     """
 
-    @abstractmethod
-    def calculate(self, order, execution_price):
+    def calculate(self, order, execution_price, qty=None, trade_date=None):
         """
-        Calculate the amount of commission to charge to an :class:``Order`` as 
+        Calculate the amount of commission to charge to an :class:``Order`` as
         the result of a :class:``Trade``.
 
         :param order: the :py:class:`~order.Order` to charge the commission to.
         :type order: Order
         :param float execution_price: The cost per share.
+        :param int qty: (optional) The number of shares filled. Defaults to
+            everything that is still open on the order.
+        :param datetime trade_date: (optional) When the fill happened.
         :return: amount to charge
-        :rtype: float or None
+        :rtype: float
+        """
+        if qty is None:
+            qty = order.open_amount
+
+        dates = None if trade_date is None else [trade_date]
+        return float(self.calculate_many([qty], [execution_price], dates,
+                                         [order.commission])[0])
+
+    def calculate_many(self,
+                       qty: Sequence[float],
+                       price: Sequence[float],
+                       dates: Sequence = None,
+                       paid: Sequence[float] = None) -> np.ndarray:
+        """
+        Calculate the commission of many fills at once.
+
+        The default calls :py:func:`calculate` for every fill with a
+        :class:`Fill` in place of the order.
+
+        :param qty: The number of shares of each fill, the sign is ignored.
+        :param price: The price per share of each fill.
+        :param dates: (optional) When each fill happened, in order.
+        :param paid: (optional) How much commission has already been
+            charged to the order of each fill.
+        :return: The commission of each fill.
         """
+        if type(self).calculate is AbstractCommissionModel.calculate:
+            raise NotImplementedError('calculate_many or calculate must be '
+                                      'overridden')
+
+        paid = _paid(paid, len(qty))
+        return np.array([self.calculate(Fill(q, c), p)
+                         for q, p, c in zip(qty, price, paid)], dtype=float)
+
 
-        raise (NotImplementedError('calculate must be overridden'))
+class Fill(object):
+    """
+    What :py:func:`AbstractCommissionModel.calculate_many` knows about the
+    order of a fill when it calls :py:func:`AbstractCommissionModel.calculate`.
+    """
+
+    __slots__ = ('qty', 'commission')
+
+    def __init__(self, qty: float, commission: float = 0.0):
+        """
+        :param qty: The number of shares filled.
+        :param commission: How much commission the order has already paid.
+        """
+        self.qty = qty
+        self.commission = commission
+
+    @property
+    def open_amount(self) -> float:
+        return self.qty
 
 
 class PerOrderCommissionModel(AbstractCommissionModel):
     """
-    Calculates commission for a :py:class:`~order.Trade` on a per order basis, 
-    so if there is multiple `trade`s created from one `order` commission 
+    Calculates commission for a :py:class:`~order.Trade` on a per order basis,
+    so if there is multiple `trade`s created from one `order` commission
     will only be charged once.
     """
 
@@ -43,12 +125,168 @@ class PerOrderCommissionModel(AbstractCommissionModel):
 
         self.cost = float(cost)
 
-    def calculate(self, order, execution_price):
+    def calculate_many(self, qty, price, dates=None, paid=None):
         """
         If the order hasn't paid any commission then pay the fixed commission.
         """
+        paid = _paid(paid, len(qty))
+        return np.where(paid == 0.0, self.cost, 0.0)
+
+
+class PerShareCommissionModel(AbstractCommissionModel):
+    """Charge a fixed cost for every share traded."""
+
+    def __init__(self, cost=DEFAULT_COST_PER_SHARE):
+        """
+        :param float cost: The cost per share.
+        """
+        self.cost = float(cost)
+
+    def calculate_many(self, qty, price, dates=None, paid=None):
+        return np.abs(np.asarray(qty, dtype=float)) * self.cost
+
+
+class PercentCommissionModel(AbstractCommissionModel):
+    """Charge a fraction of the value of every trade."""
+
+    def __init__(self, rate=DEFAULT_COMMISSION_RATE):
+        """
+        :param float rate: The fraction of ``qty * price`` to charge, e.g.
+            ``.001`` for 10 basis points.
+        """
+        self.rate = float(rate)
+
+    def calculate_many(self, qty, price, dates=None, paid=None):
+        return _notional(qty, price) * self.rate
+
+
+class TieredCommissionModel(AbstractCommissionModel):
+    """
+    Charge a cost per share that falls as more shares are traded in a
+    calendar month.
+
+    The rate of a fill is the rate of the tier that the shares traded
+    earlier in the month fall in. The model keeps the month and the shares
+    traded so far as state, so each call only looks at the fills it is given
+    and fills must be given in the order they happened. The count starts
+    over when a fill is in a new month.
+    """
+
+    def __init__(self, tiers: Sequence[Tuple[int, float]] = DEFAULT_TIERS):
+        """
+        :param tiers: ``(shares, cost)`` pairs. A fill is charged ``cost``
+            per share once at least ``shares`` were traded earlier in the
+            month. The first tier must start at 0.
+        """
+        tiers = sorted(tiers)
+
+        if not tiers or tiers[0][0] != 0:
+            raise ValueError('The first tier must start at 0 shares. '
+                             f'{tiers} was provided.')
+
+        self.thresholds = np.array([t[0] for t in tiers], dtype=float)
+        self.costs = np.array([t[1] for t in tiers], dtype=float)
+        self._month = None
+        self._volume = 0.0
+
+    @property
+    def monthly_volume(self) -> float:
+        """The shares traded so far in the month of the latest fill."""
+        return self._volume
+
+    def reset(self) -> None:
+        """Forget the shares traded this month."""
+        self._month = None
+        self._volume = 0.0
+
+    def calculate_many(self, qty, price, dates=None, paid=None):
+        size = np.abs(np.asarray(qty, dtype=float))
+        n = len(size)
+
+        if not n:
+            return np.zeros(0)
+
+        months = self._months(dates, n)
+        starts = np.ones(n, dtype=bool)
+        starts[1:] = months[1:] != months[:-1]
+        # the shares traded earlier in the same month, within this batch.
+        before = np.cumsum(size) - size
+        before -= np.maximum.accumulate(np.where(starts, before, 0))
+
+        if months[0] == self._month:
+            before[months == self._month] += self._volume
+
+        self._month = months[-1]
+        self._volume = float(before[-1] + size[-1])
+
+        tier = np.searchsorted(self.thresholds, before, side='right') - 1
+        return size * self.costs[tier]
+
+    def _months(self, dates, n: int) -> np.ndarray:
+        """A number for the calendar month of every fill."""
+        if dates is None:
+            # without dates every fill is in the current month.
+            month = 0 if self._month is None else self._month
+            return np.full(n, month, dtype=np.int64)
+
+        dates = pd.DatetimeIndex(dates)
+        return np.asarray(dates.year * 12 + dates.month - 1, dtype=np.int64)
+
+
+class CappedCommissionModel(AbstractCommissionModel):
+    """
+    Keep the commission of another model between a minimum per order and a
+    maximum per fill.
+    """
+
+    def __init__(self,
+                 model: AbstractCommissionModel,
+                 minimum: float = None,
+                 maximum: float = None,
+                 maximum_rate: float = None):
+        """
+        :param model: The model that calculates the commission to cap.
+        :param minimum: (optional) The least an order pays in total. Later
+            fills of an order that paid the minimum pay what ``model``
+            charges.
+        :param maximum: (optional) The most a fill pays.
+        :param maximum_rate: (optional) The most a fill pays as a fraction
+            of its value.
+        """
+        if not isinstance(model, AbstractCommissionModel):
+            raise TypeError(
+                    'model must be a subclass of AbstractCommissionModel. '
+                    f'{type(model)} was provided')
+
+        self.model = model
+        self.minimum = minimum
+        self.maximum = maximum
+        self.maximum_rate = maximum_rate
+
+    def calculate_many(self, qty, price, dates=None, paid=None):
+        paid = _paid(paid, len(qty))
+        commission = self.model.calculate_many(qty, price, dates, paid)
+
+        if self.minimum is not None:
+            commission = np.maximum(commission, self.minimum - paid)
+
+        if self.maximum is not None:
+            commission = np.minimum(commission, self.maximum)
+
+        if self.maximum_rate is not None:
+            commission = np.minimum(commission,
+                                    _notional(qty, price) * self.maximum_rate)
+
+        return commission
+
+
+def _notional(qty, price) -> np.ndarray:
+    qty = np.asarray(qty, dtype=float)
+    return np.abs(qty) * np.asarray(price, dtype=float)
+
+
+def _paid(paid, n: int) -> np.ndarray:
+    if paid is None:
+        return np.zeros(n)
 
-        if order.commission == 0.0:
-            return self.cost
-        else:
-            return 0
+    return np.asarray(paid, dtype=float)
@@ -1,5 +1,6 @@
 import logging
 import math
+import uuid
 from abc import ABCMeta, abstractmethod
 from datetime import datetime
 from sys import float_info
@@ -7,13 +8,11 @@ from typing import TypeVar
 
 import numpy as np
 import pandas as pd
-import pandas_market_calendars as mcal
-from pandas.tseries.offsets import DateOffset
 
-import pytech.utils.common_utils as utils
 import pytech.utils.dt_utils as dt_utils
 from pytech.backtest.event import SignalEvent
 from pytech.fin.asset.asset import Asset
+from pytech.trading.sessions import SessionTable
 from pytech.utils.enums import (OrderStatus, OrderSubType, OrderType,
                                 TradeAction)
 from pytech.utils.exceptions import BadOrderParams
@@ -21,6 +20,49 @@ from pytech.utils.exceptions import BadOrderParams
 logger = logging.getLogger(__name__)
 
 
+class OrderIds(object):
+    """
+    Hand out order ids.
+
+    The ids are increasing integers, unique within the process. They are
+    much cheaper to make, store and hash than uuid hex strings. Use
+    :attr:`Order.uuid` when a globally unique id is needed, it is derived
+    from the id and :attr:`namespace`.
+    """
+
+    __slots__ = ('last', 'namespace')
+
+    def __init__(self):
+        self.last = 0
+        # a checkpoint saves it so a resumed backtest's orders keep their
+        # uuids.
+        self.namespace = uuid.uuid4()
+
+    def __call__(self) -> int:
+        self.last += 1
+        return self.last
+
+    def skip_past(self, order_id) -> None:
+        """Never hand out ``order_id`` or any id before it, e.g. after orders
+        are restored from a checkpoint."""
+        if isinstance(order_id, int) and order_id > self.last:
+            self.last = order_id
+
+    def restore(self, last: int, namespace: uuid.UUID) -> None:
+        """
+        Carry on from the ids of another process, e.g. the one that wrote a
+        checkpoint.
+
+        :param last: The last id the other process handed out.
+        :param namespace: The other process's :attr:`namespace`.
+        """
+        self.skip_past(last)
+        self.namespace = namespace
+
+
+next_order_id = OrderIds()
+
+
 def get_order_types() -> TypeVar:
     """Return valid order types for type annotations."""
     return TypeVar('A',
@@ -36,6 +78,16 @@ class Order(metaclass=ABCMeta):
 
     LOGGER_NAME = 'order'
 
+    # every attribute of every order type is declared here since a class
+    # can't inherit slots from more than one base, see StopLimitOrder.
+    __slots__ = ('id', '_ticker', 'action', 'order_subtype', 'max_days_open',
+                 '_qty', 'commission', 'filled', '_status', 'reason',
+                 'created', 'last_updated', 'close_date', '_stop_price',
+                 'stop_reached', '_limit_price', 'limit_reached')
+
+    # one logger for every order.
+    logger = logger
+
     def __init__(self,
                  ticker: str,
                  action: TradeAction,
@@ -67,7 +119,8 @@ class Order(metaclass=ABCMeta):
             closed at the end of the day regardless.
             (default: None if the order_type is Day)
             (default: 90 if the order_type is not Day)
-        :param str order_id: A uuid hex
+        :param order_id: (optional) The id of the order. An id from
+            :data:`next_order_id` is used if it isn't given.
         :raises NotAnAssetError: If the ticker passed in is not an ticker
         :raises InvalidActionError: If the action passed in is not a valid action
         :raises NotAPortfolioError: If the portfolio passed in is not a portfolio
@@ -80,10 +133,8 @@ class Order(metaclass=ABCMeta):
             `stop_price` and `limit_price` will get rounded.
         """
         super().__init__()
-        self.id = order_id or utils.make_id()
+        self.id = order_id or next_order_id()
         self.ticker = ticker
-        self.logger = logging.getLogger(
-                '{}_ticker_{}'.format(self.__class__.__name__, self.ticker))
 
         # TODO: validate that all of these inputs make sense together.
         # e.g. if its a stop order stop shouldn't be none
@@ -117,6 +168,25 @@ class Order(metaclass=ABCMeta):
         self.last_updated = self.created
         self.close_date = None
 
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(id={self.id!r}, '
+                f'ticker={self.ticker!r}, action={self.action.name}, '
+                f'qty={self.qty}, filled={self.filled}, '
+                f'status={self.status.name})')
+
+    @property
+    def uuid(self) -> str:
+        """
+        A globally unique hex id for the order, e.g. to send to a broker or
+        store outside of the process.
+
+        It is derived from :attr:`id` and the namespace of
+        :data:`next_order_id`, which checkpoints save, so it is the same
+        every time it is asked for, even after the backtest is resumed in
+        another process.
+        """
+        return uuid.uuid5(next_order_id.namespace, str(self.id)).hex
+
     @property
     def status(self):
         if not self.open_amount:
@@ -214,7 +284,35 @@ class Order(metaclass=ABCMeta):
         :rtype: bool
         """
 
-    def check_order_expiration(self, current_date=datetime.now()):
+    def expires_at(self, sessions: SessionTable = None) -> pd.Timestamp:
+        """
+        When the order expires.
+
+        A day order expires at the close of the session it was created in,
+        or of the next session if it was created while the market was
+        closed. Any other order expires at the close of the first session
+        that ends at least :attr:`max_days_open` calendar days after it was
+        created. All or none orders never expire.
+
+        :param sessions: (optional) The sessions of the order's market.
+            Defaults to the shared table of the NYSE.
+        :return: When the order expires or ``None`` if it never does.
+        """
+        if self.order_subtype is OrderSubType.ALL_OR_NONE:
+            return None
+
+        if sessions is None:
+            sessions = SessionTable.for_calendar()
+
+        if self.order_subtype is OrderSubType.DAY:
+            return sessions.next_close(self.created)
+
+        return sessions.next_close(
+                self.created + pd.Timedelta(days=self.max_days_open))
+
+    def check_order_expiration(self,
+                               current_date: datetime = None,
+                               sessions: SessionTable = None) -> bool:
         """
         Check if the order should be closed due to passage of time and update
         the order's status.
@@ -223,36 +321,29 @@ class Order(metaclass=ABCMeta):
         so that the current date can be mocked in order to accurately
         trigger/cancel orders in the past.
         (default: datetime.now())
+        :param sessions: (optional) The sessions of the order's market, see
+            :meth:`expires_at`.
+        :return: True if the order expired and was cancelled.
         """
-        trading_cal = mcal.get_calendar(self.portfolio.trading_cal)
-        schedule = trading_cal.schedule(start_date=self.portfolio.start_date,
-                                        end_date=self.portfolio.end_date)
+        if current_date is None:
+            current_date = datetime.now()
+
+        expires = self.expires_at(sessions)
+
+        if (not self.open or expires is None
+                or dt_utils.parse_date(current_date) < expires):
+            return False
 
         if self.order_subtype is OrderSubType.DAY:
-            if not trading_cal.open_at_time(schedule,
-                                            pd.Timestamp(current_date)):
-                reason = 'Market closed without executing order.'
-                self.logger.info(
-                        'Canceling trade for ticker: {} due to {}'.format(
-                                self.ticker.ticker, reason))
-                self.cancel(reason=reason)
-        elif self.order_subtype is OrderSubType.GOOD_TIL_CANCELED:
-            expr_date = self.created + DateOffset(days=self.max_days_open)
-            # check if the expiration date is today.
-            if current_date.date() == expr_date.date():
-                # if the expiration date is today then
-                # check if the market has closed.
-                if not trading_cal.open_at_time(schedule,
-                                                pd.Timestamp(current_date)):
-                    reason = ('Max days of {} had passed without the '
-                              'underlying order executing.'
-                              .format(self.max_days_open))
-                    self.logger.info(
-                            'Canceling trade for ticker: {} due to {}'.format(
-                                    self.ticker.ticker, reason))
-                    self.cancel(reason=reason)
+            reason = 'Market closed without executing order.'
         else:
-            return
+            reason = (f'Max days of {self.max_days_open} had passed without '
+                      'the underlying order executing.')
+
+        self.logger.info(
+                f'Canceling trade for ticker: {self.ticker} due to {reason}')
+        self.cancel(reason=reason)
+        return True
 
     def get_available_volume(self, available_volume):
         """
@@ -285,6 +376,8 @@ class Order(metaclass=ABCMeta):
 class MarketOrder(Order):
     """Orders that will be executed at whatever the latest market price is"""
 
+    __slots__ = ()
+
     def __init__(self, ticker, action, qty, created=None, order_id=None,
                  *args, **kwargs):
         super().__init__(ticker, action, qty, created=created,
@@ -305,6 +398,8 @@ class MarketOrder(Order):
 class LimitOrder(Order):
     """Limit order. Update this."""
 
+    __slots__ = ()
+
     def __init__(self,
                  ticker: str,
                  action: TradeAction,
@@ -375,6 +470,8 @@ class LimitOrder(Order):
 class StopOrder(Order):
     """Stop orders."""
 
+    __slots__ = ()
+
     def __init__(self,
                  ticker: str,
                  action: TradeAction,
@@ -433,6 +530,8 @@ class StopOrder(Order):
 class StopLimitOrder(StopOrder, LimitOrder):
     """Stop limit"""
 
+    __slots__ = ()
+
     def __init__(self,
                  ticker: str,
                  action: TradeAction,
@@ -507,6 +606,6 @@ def asymmetric_round_price_to_penny(price, prefer_round_down,
 
     # relies on rounding half away from zero, unlike numpy's bankers' rounding
     rounded = round(price - (diff if prefer_round_down else -diff), 2)
-    if np.isclose([rounded], [0.0]):
+    if math.isclose(rounded, 0.0, abs_tol=1e-08):
         return 0.0
     return rounded
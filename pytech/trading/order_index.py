@@ -0,0 +1,437 @@
+"""
+An index over the orders of a :class:`pytech.trading.blotter.Blotter`.
+
+Orders are looked up by id with one dict lookup. The open orders are also
+kept as a struct of arrays, one row per order: the ticker, side, type, stop
+and limit price and which of its triggers have been reached.
+
+The price each resting order waits on is kept in a sorted ladder per
+ticker, so the orders a new price crossed are found by bisection. Only
+their rows go through the NumPy comparisons. Checking a bar costs
+O(log n) per ticker plus the number of orders that triggered, no matter
+how many orders are resting.
+
+The :class:`pytech.trading.order.Order` objects stay the public face of an
+order. The table keeps their ``stop_reached``, ``limit_reached`` and
+``last_updated`` in step whenever a trigger is reached.
+
+An :class:`ExpiryQueue` keeps the time every open order expires at in a
+heap, so finding the orders that expired is a look at its smallest entry.
+"""
+import bisect
+import heapq
+import itertools
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from pytech.trading.order import LimitOrder, Order, StopOrder
+from pytech.utils.enums import OrderType, TradeAction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 64
+
+# bits of the state column.
+STOP_REACHED = 1
+LIMIT_REACHED = 2
+TRIGGERED = STOP_REACHED | LIMIT_REACHED
+
+# the bits an order without that trigger starts out with.
+_NO_TRIGGER = {
+    OrderType.MARKET: TRIGGERED,
+    OrderType.STOP: LIMIT_REACHED,
+    OrderType.LIMIT: STOP_REACHED,
+    OrderType.STOP_LIMIT: 0,
+}
+
+
+class Ladder(object):
+    """Trigger prices of the resting orders of one ticker, ascending."""
+
+    __slots__ = ('prices', 'ids')
+
+    def __init__(self):
+        self.prices: List[float] = []
+        self.ids: List[str] = []
+
+    def __len__(self):
+        return len(self.prices)
+
+    def add(self, price: float, order_id: str) -> None:
+        # orders at the same price stay in the order they were placed.
+        i = bisect.bisect_right(self.prices, price)
+        self.prices.insert(i, price)
+        self.ids.insert(i, order_id)
+
+    def remove(self, price: float, order_id: str) -> bool:
+        lo = bisect.bisect_left(self.prices, price)
+        hi = bisect.bisect_right(self.prices, price, lo)
+
+        for i in range(lo, hi):
+            if self.ids[i] == order_id:
+                del self.prices[i]
+                del self.ids[i]
+                return True
+
+        return False
+
+    def pop_at_or_below(self, price: float) -> List[str]:
+        """Remove and return every order with a price <= ``price``."""
+        i = bisect.bisect_right(self.prices, price)
+        ids = self.ids[:i]
+        del self.prices[:i]
+        del self.ids[:i]
+        return ids
+
+    def pop_at_or_above(self, price: float) -> List[str]:
+        """Remove and return every order with a price >= ``price``."""
+        i = bisect.bisect_left(self.prices, price)
+        ids = self.ids[i:]
+        del self.prices[i:]
+        del self.ids[i:]
+        return ids
+
+
+class TickerBook(object):
+    """The ladders of the resting orders of one ticker."""
+
+    __slots__ = ('rising', 'falling')
+
+    def __init__(self):
+        # orders that trigger once the price rises to their level: buy
+        # stops and sell limits.
+        self.rising = Ladder()
+        # orders that trigger once the price falls to their level: buy
+        # limits and sell stops.
+        self.falling = Ladder()
+
+    def __len__(self):
+        return len(self.rising) + len(self.falling)
+
+
+# where an active order is filed.
+_ACTIVE = None
+
+
+class OrderIndex(object):
+    """Find orders by id and find the orders the latest prices triggered."""
+
+    _columns = ('ticker', 'side', 'type', 'stop', 'limit', 'state')
+
+    def __init__(self,
+                 orders: Iterable[Order] = (),
+                 capacity: int = DEFAULT_CAPACITY):
+        self.logger = logging.getLogger(__name__)
+        # every order the blotter holds, open or not.
+        self.by_id: Dict[str, Order] = {}
+        self.tickers: List[str] = []
+        self.ticker_ids: Dict[str, int] = {}
+        # the ladders of every ticker of tickers.
+        self.books: List[TickerBook] = []
+        # market orders and orders that already triggered. They are sent to
+        # be filled on every bar until they are no longer open.
+        self.active: Dict[str, Order] = {}
+        # order id -> (ladder, price) of every order in a ladder, or
+        # (_ACTIVE, None) for active orders.
+        self._where: Dict[str, Tuple[Optional[Ladder], float]] = {}
+        capacity = max(1, capacity)
+        # the open orders are the rows [0, _n).
+        self.ticker = np.zeros(capacity, dtype=np.int32)
+        # 1 to buy, -1 to sell.
+        self.side = np.zeros(capacity, dtype=np.int8)
+        # the value of the OrderType.
+        self.type = np.zeros(capacity, dtype=np.int8)
+        # NaN if the order doesn't have one.
+        self.stop = np.zeros(capacity)
+        self.limit = np.zeros(capacity)
+        self.state = np.zeros(capacity, dtype=np.uint8)
+        self._orders: List[Order] = []
+        self._rows: Dict[str, int] = {}
+        self._n = 0
+        # (ticker_index, tickers seen, positions) of the last price lookup.
+        self._positions = (None, 0, None)
+
+        for order in orders:
+            self.add(order)
+
+    def __len__(self):
+        """The number of open orders in the table."""
+        return self._n
+
+    def __contains__(self, order_id):
+        return order_id in self.by_id
+
+    def get(self, order_id, default=None) -> Order:
+        return self.by_id.get(order_id, default)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.state)
+
+    def add(self, order: Order) -> None:
+        """Add an order. Orders that aren't open are only found by id."""
+        old = self.by_id.get(order.id)
+
+        if old is not None:
+            # an order placed again with the same id replaces the old one.
+            self.discard(old)
+
+        self.by_id[order.id] = order
+
+        if not order.open:
+            return
+
+        if self._n == self.capacity:
+            self._grow()
+
+        t = self.ticker_ids.get(order.ticker)
+
+        if t is None:
+            t = self.ticker_ids[order.ticker] = len(self.tickers)
+            self.tickers.append(order.ticker)
+            self.books.append(TickerBook())
+
+        i = self._n
+        self.ticker[i] = t
+        self.side[i] = 1 if order.action is TradeAction.BUY else -1
+        self.type[i] = order.order_type.value
+        self.stop[i] = getattr(order, 'stop_price', np.nan)
+        self.limit[i] = getattr(order, 'limit_price', np.nan)
+        self.state[i] = (_NO_TRIGGER[order.order_type]
+                         | STOP_REACHED * getattr(order, 'stop_reached', 0)
+                         | LIMIT_REACHED * getattr(order, 'limit_reached', 0))
+        self._orders.append(order)
+        self._rows[order.id] = i
+        self._n += 1
+        self._rest(order, i)
+
+    def discard(self, order: Order) -> None:
+        """Stop checking the triggers of an order, e.g. once cancelled."""
+        i = self._rows.pop(order.id, None)
+
+        if i is None:
+            return
+
+        ladder, price = self._where.pop(order.id)
+
+        if ladder is _ACTIVE:
+            del self.active[order.id]
+        else:
+            ladder.remove(price, order.id)
+
+        # move the last row into the hole.
+        last = self._n - 1
+
+        if i != last:
+            for name in self._columns:
+                col = getattr(self, name)
+                col[i] = col[last]
+
+            moved = self._orders[last]
+            self._orders[i] = moved
+            self._rows[moved.id] = i
+
+        self._orders.pop()
+        self._n = last
+
+    def remove(self, order: Order) -> None:
+        """Forget an order completely, it can't be found by id anymore."""
+        if self.by_id.get(order.id) is not order:
+            return
+
+        self.discard(order)
+        del self.by_id[order.id]
+
+    def prices_for(self,
+                   prices: np.ndarray,
+                   ticker_index: Mapping[str, int]) -> np.ndarray:
+        """
+        Line up a price vector with :attr:`tickers`.
+
+        :param prices: A price per ticker in the order of ``ticker_index``,
+            e.g. :meth:`DataHandler.get_latest_prices`.
+        :param ticker_index: The position of each ticker in ``prices``.
+        :return: A price per ticker of :attr:`tickers`, NaN if it isn't in
+            ``ticker_index``.
+        """
+        cached_index, cached_count, positions = self._positions
+
+        if cached_index is not ticker_index or cached_count != len(
+                self.tickers):
+            positions = np.array([ticker_index.get(t, -1)
+                                  for t in self.tickers], dtype=np.intp)
+            self._positions = (ticker_index, len(self.tickers), positions)
+
+        # one extra NaN for the tickers that are missing.
+        return np.append(prices, np.nan)[positions]
+
+    def check(self,
+              prices: np.ndarray,
+              dt: datetime) -> List[Tuple[Order, float]]:
+        """
+        Find every open order that is triggered at ``prices``.
+
+        A stop is reached once the price is at or past it, above for a buy
+        and below for a sell. A limit is reached once the price is at or
+        better than it. The limit of a stop limit order only counts once its
+        stop has been reached.
+
+        :param prices: The latest price of every ticker of :attr:`tickers`,
+            see :meth:`prices_for`. NaN prices trigger nothing.
+        :param dt: The time of ``prices``.
+        :return: Every triggered order that is still open along with the
+            price of its ticker, including market orders and orders that
+            triggered on an earlier bar.
+        """
+        crossed = []
+
+        for t, book in enumerate(self.books):
+            price = prices[t]
+
+            # NaN is never in range of a ladder either.
+            if book and not np.isnan(price):
+                crossed += book.rising.pop_at_or_below(price)
+                crossed += book.falling.pop_at_or_above(price)
+
+        if crossed:
+            self._update(crossed, prices, dt)
+
+        if not self.active:
+            return []
+
+        orders = list(self.active.values())
+        rows = np.array([self._rows[order.id] for order in orders],
+                        dtype=np.intp)
+        triggered = []
+        closed = []
+
+        for order, price in zip(orders,
+                                np.take(prices, self.ticker[rows]).tolist()):
+            if order.open:
+                triggered.append((order, price))
+            else:
+                closed.append(order)
+
+        for order in closed:
+            self.discard(order)
+
+        return triggered
+
+    def _update(self,
+                order_ids: List[str],
+                prices: np.ndarray,
+                dt: datetime) -> None:
+        """Reach the triggers of the orders whose ladder price was crossed."""
+        rows = np.array([self._rows[order_id] for order_id in order_ids],
+                        dtype=np.intp)
+        price = np.take(prices, self.ticker[rows])
+        side = self.side[rows]
+        state = self.state[rows]
+
+        # multiplying by the side flips the comparisons of sells.
+        with np.errstate(invalid='ignore'):
+            stop_hit = (price - self.stop[rows]) * side >= 0
+            limit_hit = (self.limit[rows] - price) * side >= 0
+
+        state |= stop_hit.view(np.uint8) * np.uint8(STOP_REACHED)
+        limit_hit &= (state & STOP_REACHED).astype(bool)
+        state |= limit_hit.view(np.uint8) * np.uint8(LIMIT_REACHED)
+        self.state[rows] = state
+
+        for order_id, i, row_state in zip(order_ids, rows.tolist(),
+                                          state.tolist()):
+            order = self._orders[i]
+            del self._where[order_id]
+            self._sync(order, row_state, dt)
+            # a stop limit order moves on to the ladder of its limit.
+            self._rest(order, i)
+
+    def _rest(self, order: Order, i: int) -> None:
+        """File the order of row ``i`` under the trigger it waits on."""
+        state = self.state[i]
+
+        if state == TRIGGERED:
+            self.active[order.id] = order
+            self._where[order.id] = (_ACTIVE, None)
+            return
+
+        book = self.books[self.ticker[i]]
+        buy = self.side[i] > 0
+
+        if not state & STOP_REACHED:
+            price = float(self.stop[i])
+            ladder = book.rising if buy else book.falling
+        else:
+            price = float(self.limit[i])
+            ladder = book.falling if buy else book.rising
+
+        ladder.add(price, order.id)
+        self._where[order.id] = (ladder, price)
+
+    def _grow(self) -> None:
+        capacity = self.capacity * 2
+
+        for name in self._columns:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    @staticmethod
+    def _sync(order: Order, state: int, dt: datetime) -> None:
+        """Copy the trigger state of a row onto its order."""
+        if isinstance(order, StopOrder):
+            order.stop_reached = bool(state & STOP_REACHED)
+
+        if isinstance(order, LimitOrder):
+            order.limit_reached = bool(state & LIMIT_REACHED)
+
+        order.last_updated = dt
+
+
+class ExpiryQueue(object):
+    """
+    A min-heap of ``(expiry, order)``.
+
+    Orders aren't removed when they are filled or cancelled. They are
+    dropped when their expiry comes up instead, so whoever pops them has to
+    check that they are still open.
+    """
+
+    def __init__(self):
+        # (expiry in ns, tie breaker, order)
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def next_expiry(self) -> Optional[int]:
+        """When the next order expires in nanoseconds, ``None`` if never."""
+        return self._heap[0][0] if self._heap else None
+
+    def push(self, expiry: int, order: Order) -> None:
+        """
+        :param expiry: When ``order`` expires in nanoseconds since the epoch.
+        :param order: The order that expires.
+        """
+        heapq.heappush(self._heap, (expiry, next(self._counter), order))
+
+    def pop_expired(self, now: int) -> List[Order]:
+        """
+        Remove every order that expires at or before ``now``.
+
+        :param now: The current time in nanoseconds since the epoch.
+        :return: The orders in the order they expire.
+        """
+        heap = self._heap
+        expired = []
+
+        while heap and heap[0][0] <= now:
+            expired.append(heapq.heappop(heap)[2])
+
+        return expired
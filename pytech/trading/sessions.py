@@ -0,0 +1,117 @@
+"""
+A cached table of the trading sessions of a market calendar.
+
+Building a :mod:`pandas_market_calendars` schedule is slow, far too slow to
+do every time an order is checked. A :class:`SessionTable` builds the
+schedule once, keeps the open and close of every session as arrays of
+nanoseconds and only builds more of it when asked about a date that it
+doesn't cover yet.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+import pytech.utils.dt_utils as dt_utils
+
+logger = logging.getLogger(__name__)
+
+# how much of the calendar to build past the date that was asked for.
+DEFAULT_CHUNK = pd.Timedelta(days=366)
+
+# one table per calendar name, shared by everything using that calendar.
+_TABLES = {}
+
+
+class SessionTable(object):
+    """The open and close of every session of a calendar."""
+
+    def __init__(self, calendar=None, chunk: pd.Timedelta = DEFAULT_CHUNK):
+        """
+        :param calendar: A :mod:`pandas_market_calendars` calendar.
+            Defaults to the NYSE.
+        :param chunk: How far past a date the schedule is built when the
+            table has to grow.
+        """
+        self.logger = logging.getLogger(__name__)
+        self.calendar = calendar if calendar is not None else dt_utils.NYSE
+        self.chunk = chunk
+        # nanoseconds since the epoch in UTC.
+        self.opens = np.zeros(0, dtype=np.int64)
+        self.closes = np.zeros(0, dtype=np.int64)
+        # the days covered, as naive midnight timestamps.
+        self._first = None
+        self._last = None
+
+    @classmethod
+    def for_calendar(cls, calendar=None) -> 'SessionTable':
+        """The table shared by everything that uses ``calendar``."""
+        calendar = calendar if calendar is not None else dt_utils.NYSE
+        key = getattr(calendar, 'name', id(calendar))
+        table = _TABLES.get(key)
+
+        if table is None:
+            table = _TABLES[key] = cls(calendar)
+
+        return table
+
+    def __len__(self):
+        return len(self.closes)
+
+    def next_close(self, when) -> pd.Timestamp:
+        """
+        The close of the session that is open at ``when``, or of the next
+        session if the market is closed.
+
+        :param when: Any time, naive times are taken as UTC.
+        """
+        ns = dt_utils.parse_date(when).value
+        self._cover(ns)
+        i = np.searchsorted(self.closes, ns)
+
+        while i == len(self.closes):
+            # past the last session that was built.
+            self._cover(self._last.value + self.chunk.value)
+            i = np.searchsorted(self.closes, ns)
+
+        return pd.Timestamp(int(self.closes[i]), tz='UTC')
+
+    def is_open(self, when) -> bool:
+        """True if ``when`` is during a session."""
+        ns = dt_utils.parse_date(when).value
+        self._cover(ns)
+        i = np.searchsorted(self.closes, ns)
+        return bool(i < len(self.closes) and self.opens[i] <= ns)
+
+    def _cover(self, ns: int) -> None:
+        """Build the schedule so that it covers the day of ``ns``."""
+        day = pd.Timestamp(ns).normalize()
+
+        if self._first is not None and self._first <= day <= self._last:
+            return
+
+        if self._first is None:
+            first, last = day, day + self.chunk
+        else:
+            first = min(self._first, day)
+            last = max(self._last, day + self.chunk)
+
+        self.logger.debug(f'Building the sessions from {first:%Y-%m-%d} to '
+                          f'{last:%Y-%m-%d}')
+        schedule = self.calendar.schedule(
+                start_date=first.strftime('%Y-%m-%d'),
+                end_date=last.strftime('%Y-%m-%d'))
+        self.opens = _to_ns(schedule['market_open'])
+        self.closes = _to_ns(schedule['market_close'])
+        self._first = first
+        self._last = last
+
+
+def _to_ns(times) -> np.ndarray:
+    """Nanoseconds since the epoch in UTC, naive times are taken as UTC."""
+    index = pd.DatetimeIndex(times)
+
+    if index.tz is not None:
+        index = index.tz_convert(None)
+
+    return np.asarray(index, dtype='datetime64[ns]').view(np.int64)
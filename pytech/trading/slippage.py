@@ -1,33 +1,251 @@
-"""Classes related to slippage and how it affects how orders get processed."""
+"""
+Classes related to slippage and how it affects how orders get processed.
 
+A slippage model decides at what price and for how many shares the orders
+that triggered on a bar are filled. Every model works on arrays with a
+value per order so all of the orders of a bar are filled in one call.
+Models with a ``volume_limit`` never fill more than that fraction of a
+bar's volume, shared by every order for the same ticker in the order the
+orders are given. The rest of an order stays open for the next bar.
+"""
+import logging
 from abc import ABCMeta, abstractmethod
+from typing import Tuple
+
+import numpy as np
+
+import pytech.utils as utils
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VOLUME_LIMIT = .025
+DEFAULT_PRICE_IMPACT = .1
 
 
 class AbstractSlippageModel(metaclass=ABCMeta):
     """
-    Abstract Base Class that defines the interface for defining a slippage model.
+    Abstract Base Class that defines the interface for defining a slippage
+    model.
 
-    Child classes are responsible for implementing a :py:func:`process_order` method.
+    Child classes are responsible for implementing a :py:func:`fill_price`
+    method.
     """
 
-    def __init__(self):
+    def __init__(self, volume_limit: float = None):
+        """
+        :param volume_limit: (optional) The largest fraction of a bar's
+            volume that can be filled. Orders are filled in full if it isn't
+            given or the volume isn't known.
+        """
+        if volume_limit is not None and not 0 < volume_limit <= 1:
+            raise ValueError('volume_limit must be in (0, 1]. '
+                             f'{volume_limit} was provided.')
+
+        self.logger = logging.getLogger(__name__)
+        self.volume_limit = volume_limit
         self._volume_in_tick = 0
 
     @property
     def volume_in_tick(self):
-        """How much volume was traded in a given tick."""
+        """How much volume was filled by the last call to :meth:`fill`."""
         return self._volume_in_tick
 
+    def fill(self,
+             qty: np.ndarray,
+             price: np.ndarray,
+             volume: np.ndarray = None,
+             high: np.ndarray = None,
+             low: np.ndarray = None,
+             ticker: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fill every order that triggered on a bar.
+
+        :param qty: The signed number of shares left to fill of each order,
+            negative to sell.
+        :param price: The price each order triggered at.
+        :param volume: (optional) The volume of the bar of each order's
+            ticker.
+        :param high: (optional) The high of the bar of each order's ticker.
+        :param low: (optional) The low of the bar of each order's ticker.
+        :param ticker: (optional) Any int or str per order that tells which
+            orders are for the same ticker, so they share the volume. Every
+            order gets the whole ``volume_limit`` if it isn't given.
+        :return: The price per share and the signed number of shares each
+            order is filled for. The number of shares may be 0.
+        """
+        qty = np.asarray(qty, dtype=float)
+        price = np.asarray(price, dtype=float)
+        volume = _column(volume, len(qty))
+        high = _column(high, len(qty))
+        low = _column(low, len(qty))
+        fill_qty = self.fill_qty(qty, volume, ticker)
+        self._volume_in_tick = float(np.abs(fill_qty).sum())
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fill_price = self.fill_price(fill_qty, price, volume, high, low)
+
+        return fill_price, fill_qty
+
+    def fill_qty(self,
+                 qty: np.ndarray,
+                 volume: np.ndarray,
+                 ticker: np.ndarray = None) -> np.ndarray:
+        """How many shares of each order can be filled, see :meth:`fill`."""
+        if self.volume_limit is None or not len(qty):
+            return qty.copy()
+
+        size = np.abs(qty)
+        capacity = np.floor(self.volume_limit * volume)
+
+        if ticker is None:
+            allowed = np.minimum(size, capacity)
+        else:
+            # orders for the same ticker are filled first come first served.
+            by_ticker = np.argsort(ticker, kind='mergesort')
+            sorted_ticker = np.asarray(ticker)[by_ticker]
+            sorted_size = size[by_ticker]
+            filled_before = np.cumsum(sorted_size) - sorted_size
+            starts = np.ones(len(qty), dtype=bool)
+            starts[1:] = sorted_ticker[1:] != sorted_ticker[:-1]
+            filled_before -= np.maximum.accumulate(
+                    np.where(starts, filled_before, 0))
+            allowed = np.empty_like(size)
+            allowed[by_ticker] = np.clip(
+                    capacity[by_ticker] - filled_before, 0, sorted_size)
+
+        # without a volume there is nothing to limit the fill by.
+        allowed = np.where(np.isnan(capacity), size, allowed)
+        return np.copysign(allowed, qty)
+
     @abstractmethod
-    def process_order(self, tick_data, order):
+    def fill_price(self,
+                   qty: np.ndarray,
+                   price: np.ndarray,
+                   volume: np.ndarray,
+                   high: np.ndarray,
+                   low: np.ndarray) -> np.ndarray:
+        """
+        The price per share each order is filled at.
+
+        :param qty: The signed number of shares each order is filled for.
+        :param price: The price each order triggered at.
+        :param volume: The volume of the bar, NaN if it isn't known.
+        :param high: The high of the bar, NaN if it isn't known.
+        :param low: The low of the bar, NaN if it isn't known.
+        """
+        raise NotImplementedError(
+                'fill_price must be overridden by child classes')
+
+    def process_order(self, tick_data, order) -> Tuple[float, int]:
         """
-        Process how an order gets filled.
+        Fill a single order.
 
-        :param tick_data: The data for a given tick
+        :param tick_data: The bar the order triggered on.
         :param Order order: The order being processed
-        :return: The trade that came as a result of the order
-        :rtype: Trade
+        :return: The price per share and the signed number of shares the
+            order is filled for.
         """
+        fill_price, fill_qty = self.fill(
+                [order.open_amount],
+                [tick_data[utils.CLOSE_COL]],
+                [tick_data.get(utils.VOL_COL, np.nan)],
+                [tick_data.get(utils.HIGH_COL, np.nan)],
+                [tick_data.get(utils.LOW_COL, np.nan)])
+        return float(fill_price[0]), int(fill_qty[0])
 
-        raise NotImplementedError(
-            'process_order must be overridden by child classes')
+
+class NoSlippage(AbstractSlippageModel):
+    """Fill every order in full at the price it triggered at."""
+
+    def fill_price(self, qty, price, volume, high, low):
+        return price.copy()
+
+
+class FixedBasisPointsSlippage(AbstractSlippageModel):
+    """Buy a fixed number of basis points above the price, sell below it."""
+
+    def __init__(self, bps: float = 5.0, volume_limit: float = None):
+        """:param bps: The slippage in basis points of the price."""
+        super().__init__(volume_limit)
+        self.bps = bps
+
+    def fill_price(self, qty, price, volume, high, low):
+        return price * (1 + np.sign(qty) * self.bps / 10000)
+
+
+class VolumeShareSlippage(AbstractSlippageModel):
+    """
+    The price moves against the order by the square of the share of the
+    bar's volume that it takes, like zipline's model of the same name.
+    """
+
+    def __init__(self,
+                 volume_limit: float = DEFAULT_VOLUME_LIMIT,
+                 price_impact: float = DEFAULT_PRICE_IMPACT):
+        """
+        :param price_impact: An order that takes a share ``s`` of the
+            volume moves the price by ``price_impact * s ** 2`` of it.
+        """
+        super().__init__(volume_limit)
+        self.price_impact = price_impact
+
+    def fill_price(self, qty, price, volume, high, low):
+        share = np.nan_to_num(np.abs(qty) / volume)
+        return price * (1 + np.sign(qty) * self.price_impact * share ** 2)
+
+
+class SquareRootImpactSlippage(AbstractSlippageModel):
+    """
+    The square root market impact model: the price moves against the order
+    by ``impact * sigma * sqrt(qty / volume)``.
+
+    The bar's range, ``high - low``, stands in for the volatility, so no
+    history of prices is needed.
+    """
+
+    def __init__(self, impact: float = 1.0, volume_limit: float = .1):
+        """:param impact: The constant of the model, usually near 1."""
+        super().__init__(volume_limit)
+        self.impact = impact
+
+    def fill_price(self, qty, price, volume, high, low):
+        move = np.nan_to_num(self.impact * (high - low)
+                             * np.sqrt(np.abs(qty) / volume))
+        return price + np.sign(qty) * move
+
+
+class SpreadSlippage(AbstractSlippageModel):
+    """
+    Cross half of the bid ask spread: buy above the price and sell below it.
+
+    The spread is either a fixed number of basis points of the price or a
+    fraction of the bar's range.
+    """
+
+    def __init__(self,
+                 spread_bps: float = None,
+                 range_fraction: float = .1,
+                 volume_limit: float = None):
+        """
+        :param spread_bps: (optional) The full spread in basis points.
+        :param range_fraction: If ``spread_bps`` isn't given the spread is
+            this fraction of ``high - low``.
+        """
+        super().__init__(volume_limit)
+        self.spread_bps = spread_bps
+        self.range_fraction = range_fraction
+
+    def fill_price(self, qty, price, volume, high, low):
+        if self.spread_bps is not None:
+            spread = price * self.spread_bps / 10000
+        else:
+            spread = np.nan_to_num(self.range_fraction * (high - low))
+
+        return price + np.sign(qty) * spread / 2
+
+
+def _column(values, n: int) -> np.ndarray:
+    if values is None:
+        return np.full(n, np.nan)
+
+    return np.asarray(values, dtype=float)
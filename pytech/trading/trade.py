@@ -10,6 +10,8 @@ from pytech.utils import dt_utils as dt_utils
 from pytech.utils.enums import TradeAction
 from pytech.utils.exceptions import UntriggeredTradeError
 
+logger = logging.getLogger(__name__)
+
 
 class Trade(object):
     """
@@ -20,6 +22,13 @@ class Trade(object):
 
     LOGGER_NAME = 'trade'
 
+    __slots__ = ('trade_date', 'action', 'strategy', 'ticker', 'qty',
+                 'price_per_share', 'order', 'commission',
+                 'avg_price_per_share')
+
+    # one logger for every trade.
+    logger = logger
+
     def __init__(self, qty, price_per_share, action, strategy, order,
                  avg_price_per_share, commission=0.0,
                  trade_date=None, ticker=None):
@@ -65,7 +74,14 @@ class Trade(object):
         self.order = order
         self.commission = commission
         self.avg_price_per_share = avg_price_per_share
-        self.logger = logging.getLogger(self.LOGGER_NAME)
+
+    @property
+    def signed_qty(self):
+        """The number of shares traded, negative for a sale."""
+        if self.action is TradeAction.SELL:
+            return -self.qty
+
+        return self.qty
 
     def trade_cost(self):
         """
@@ -74,7 +90,7 @@ class Trade(object):
         If this was a buy order then the impact will be negative.
         """
 
-        return (self.qty * self.price_per_share) + self.commission
+        return -(self.signed_qty * self.price_per_share) - self.commission
 
     def trade_value(self):
         return self.trade_value() * -1
@@ -100,7 +116,7 @@ class Trade(object):
         """
 
         if not order.triggered:
-            raise UntriggeredTradeError(order=order.__dict__.__str__())
+            raise UntriggeredTradeError(order=repr(order))
 
         if strategy is None:
             strategy = order.order_type.name
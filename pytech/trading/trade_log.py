@@ -0,0 +1,317 @@
+"""
+An append-only, columnar log of every trade a blotter makes.
+
+Keeping every :class:`pytech.trading.trade.Trade` in a list keeps every
+trade's order alive too, and any analysis has to walk the list one object
+at a time. A :class:`TradeLog` writes each fill into a handful of growable
+NumPy columns instead, the same way a :class:`pytech.fin.ledger.Ledger`
+stores the holdings of a portfolio. The columns can be handed to Arrow
+without copying them and aggregated per ticker with ``np.bincount``.
+
+`pyarrow <https://arrow.apache.org/docs/python/>`_ is only needed to export
+the log to Arrow or Parquet.
+"""
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pytech.utils.enums import TradeAction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 1024
+
+COLUMNS = ('timestamp', 'ticker', 'side', 'qty', 'price', 'avg_price',
+           'commission', 'order_id')
+
+DTYPES = {
+    # nanoseconds since the epoch in UTC.
+    'timestamp': np.int64,
+    # the position of the ticker in TradeLog.tickers.
+    'ticker': np.int32,
+    # 1 for a buy, -1 for a sale.
+    'side': np.int8,
+    # the number of shares, always positive.
+    'qty': np.int64,
+    # the price per share before commission.
+    'price': np.float64,
+    # the price per share after commission.
+    'avg_price': np.float64,
+    'commission': np.float64,
+    'order_id': np.int64,
+}
+
+
+class TradeLog(object):
+    """Every fill as a row of fixed width columns."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """:param capacity: How many trades to allocate up front."""
+        self.tickers: List[str] = []
+        self.ticker_ids: Dict[str, int] = {}
+        # ids of orders that aren't ints are stored as -1, -2, ...
+        self.named_order_ids: List = []
+        self._order_codes: Dict = {}
+        capacity = max(1, capacity)
+        self._columns = {name: np.zeros(capacity, dtype=DTYPES[name])
+                         for name in COLUMNS}
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def capacity(self) -> int:
+        return len(self._columns['timestamp'])
+
+    def column(self, name: str) -> np.ndarray:
+        """A view of every value written to a column."""
+        return self._columns[name][:self._len]
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        """When every trade happened."""
+        return pd.DatetimeIndex(pd.to_datetime(self.column('timestamp'),
+                                               utc=True))
+
+    @property
+    def signed_qty(self) -> np.ndarray:
+        """The number of shares of every trade, negative for a sale."""
+        return self.column('qty') * self.column('side')
+
+    def ticker_id(self, ticker: str) -> int:
+        t = self.ticker_ids.get(ticker)
+
+        if t is None:
+            t = self.ticker_ids[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+
+        return t
+
+    def order_code(self, order_id) -> int:
+        """The value stored in the ``order_id`` column for ``order_id``."""
+        if isinstance(order_id, (int, np.integer)):
+            return int(order_id)
+
+        code = self._order_codes.get(order_id)
+
+        if code is None:
+            self.named_order_ids.append(order_id)
+            code = self._order_codes[order_id] = -len(self.named_order_ids)
+
+        return code
+
+    def append(self,
+               current_dt,
+               ticker: str,
+               side: int,
+               qty: int,
+               price: float,
+               avg_price: float,
+               commission: float,
+               order_id) -> None:
+        """
+        Add a trade.
+
+        :param current_dt: When the trade happened.
+        :param ticker: The ticker that was traded.
+        :param side: 1 for a buy, -1 for a sale.
+        :param qty: The number of shares.
+        :param price: The price per share before commission.
+        :param avg_price: The price per share after commission.
+        :param commission: The commission paid.
+        :param order_id: The id of the order that was filled.
+        """
+        if self._len == self.capacity:
+            self._grow(self._len + 1)
+
+        i = self._len
+        cols = self._columns
+        cols['timestamp'][i] = pd.Timestamp(current_dt).value
+        cols['ticker'][i] = self.ticker_id(ticker)
+        cols['side'][i] = side
+        cols['qty'][i] = abs(qty)
+        cols['price'][i] = price
+        cols['avg_price'][i] = avg_price
+        cols['commission'][i] = commission
+        cols['order_id'][i] = self.order_code(order_id)
+        self._len += 1
+
+    def append_trade(self, trade) -> None:
+        """Add a :class:`pytech.trading.trade.Trade`."""
+        side = 1 if trade.action is TradeAction.BUY else -1
+        self.append(trade.trade_date, trade.ticker, side, trade.qty,
+                    trade.price_per_share, trade.avg_price_per_share,
+                    trade.commission, trade.order.id)
+
+    def extend(self, rows: Tuple[List[str], List, Dict[str, np.ndarray]]):
+        """
+        Add many trades at once.
+
+        :param rows: The output of :meth:`rows_since` on another log.
+        """
+        tickers, named_order_ids, columns = rows
+        n = len(columns['timestamp'])
+        end = self._len + n
+
+        if end > self.capacity:
+            self._grow(end)
+
+        for name in COLUMNS:
+            self._columns[name][self._len:end] = columns[name]
+
+        # the codes of the other log have to be translated to this one's.
+        ticker_map = np.array([self.ticker_id(t) for t in tickers],
+                              dtype=np.int32)
+        self._columns['ticker'][self._len:end] = ticker_map[
+            columns['ticker']]
+
+        order_ids = self._columns['order_id'][self._len:end]
+        named = order_ids < 0
+
+        if named.any():
+            order_map = np.array([self.order_code(o)
+                                  for o in named_order_ids], dtype=np.int64)
+            order_ids[named] = order_map[-order_ids[named] - 1]
+
+        self._len = end
+
+    def rows_since(self, start: int):
+        """A copy of every trade from ``start`` on, see :meth:`extend`."""
+        return (list(self.tickers), list(self.named_order_ids),
+                {name: self._columns[name][start:self._len].copy()
+                 for name in COLUMNS})
+
+    def order_ids(self) -> np.ndarray:
+        """The ``order_id`` column with the named ids filled back in."""
+        codes = self.column('order_id')
+
+        if not self.named_order_ids:
+            return codes.copy()
+
+        out = codes.astype(object)
+        named = codes < 0
+        out[named] = np.asarray(self.named_order_ids,
+                                dtype=object)[-codes[named] - 1]
+        return out
+
+    def to_frame(self) -> pd.DataFrame:
+        """Every trade as a DataFrame with a row per trade."""
+        return pd.DataFrame({
+            'timestamp': self.dates,
+            'ticker': pd.Categorical.from_codes(self.column('ticker'),
+                                                self.tickers),
+            'side': self.column('side'),
+            'qty': self.column('qty'),
+            'price': self.column('price'),
+            'avg_price': self.column('avg_price'),
+            'commission': self.column('commission'),
+            'order_id': self.order_ids(),
+        }, columns=list(COLUMNS))
+
+    def to_arrow(self):
+        """
+        Every trade as a :class:`pyarrow.Table`.
+
+        The columns share memory with the log instead of being copied.
+        Rows are never changed once written so the table stays valid as
+        more trades are added. ``ticker`` is dictionary encoded with
+        :attr:`tickers` and ids of orders that aren't ints are negative
+        codes into :attr:`named_order_ids`.
+        """
+        import pyarrow as pa
+
+        arrays = [
+            _wrap(pa.timestamp('ns', tz='UTC'), self.column('timestamp')),
+            pa.DictionaryArray.from_arrays(
+                    _wrap(pa.int32(), self.column('ticker')),
+                    pa.array(self.tickers, type=pa.string())),
+        ]
+        arrays.extend(_wrap(pa.from_numpy_dtype(DTYPES[name]),
+                            self.column(name))
+                      for name in COLUMNS[2:])
+
+        return pa.Table.from_arrays(arrays, names=list(COLUMNS))
+
+    def to_parquet(self, path: str, **kwargs) -> None:
+        """
+        Write every trade to a Parquet file.
+
+        :param path: Where to write the file.
+        :param kwargs: Passed to :func:`pyarrow.parquet.write_table`.
+        """
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(), path, **kwargs)
+
+    def by_ticker(self, prices: Dict[str, float] = None) -> pd.DataFrame:
+        """
+        Aggregate the trades of every ticker.
+
+        :param prices: (optional) The latest price of each ticker, to value
+            what is still held.
+        :return: A DataFrame indexed by ticker with the shares bought and
+            sold, the net shares, the cash spent (negative) or received,
+            the commission, the traded value and, if ``prices`` are given,
+            the P&L including what is still held.
+        """
+        n = len(self.tickers)
+        ticker = self.column('ticker')
+        qty = self.column('qty')
+        buy = self.column('side') > 0
+        value = qty * self.column('price')
+        commission = self.column('commission')
+        bought = np.bincount(ticker, weights=qty * buy, minlength=n)
+        sold = np.bincount(ticker, weights=qty * ~buy, minlength=n)
+        # what the trades cost or brought in after commission.
+        cash = np.bincount(ticker, weights=-value * self.column('side')
+                           - commission, minlength=n)
+
+        out = pd.DataFrame({
+            'bought': bought,
+            'sold': sold,
+            'net_qty': bought - sold,
+            'cash': cash,
+            'commission': np.bincount(ticker, weights=commission,
+                                      minlength=n),
+            'traded_value': np.bincount(ticker, weights=value, minlength=n),
+            'trades': np.bincount(ticker, minlength=n),
+        }, index=pd.Index(self.tickers, name='ticker'),
+                columns=['bought', 'sold', 'net_qty', 'cash', 'commission',
+                         'traded_value', 'trades'])
+
+        if prices is not None:
+            last = np.array([prices.get(t, np.nan) for t in self.tickers])
+            out['pnl'] = out['cash'] + out['net_qty'] * last
+
+        return out
+
+    def turnover(self) -> float:
+        """The total value of every trade before commission."""
+        return float(np.dot(self.column('qty'), self.column('price')))
+
+    def _grow(self, needed: int) -> None:
+        capacity = max(needed, self.capacity * 2)
+
+        for name, old in self._columns.items():
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._len] = old[:self._len]
+            self._columns[name] = new
+
+    def __getstate__(self):
+        # don't pickle the unused capacity.
+        state = vars(self).copy()
+        state['_columns'] = {name: self.column(name).copy()
+                             for name in COLUMNS}
+        return state
+
+
+def _wrap(arrow_type, values: np.ndarray):
+    """An Arrow array over the memory of ``values`` without a copy."""
+    import pyarrow as pa
+
+    values = np.ascontiguousarray(values)
+    return pa.Array.from_buffers(arrow_type, len(values),
+                                 [None, pa.py_buffer(values)])
@@ -6,7 +6,10 @@ from pytech.utils.exceptions import (InvalidActionError,
                                      InvalidOrderTypeError,
                                      InvalidPositionError,
                                      InvalidSignalTypeError,
-                                     InvalidEventTypeError)
+                                     InvalidEventTypeError,
+                                     InvalidFillPolicyError,
+                                     InvalidLotMethodError,
+                                     InvalidPersistencePolicyError)
 
 
 class AutoNumber(Enum):
@@ -137,3 +140,65 @@ class Position(AutoNumber):
             return name
         else:
             raise InvalidPositionError(position=value)
+
+
+class FillPolicy(AutoNumber):
+    """
+    What a data handler does for a ticker that has no bar at a time when
+    other tickers do.
+    """
+    # repeat the last close with no volume.
+    FFILL = ()
+    # a bar of NaNs.
+    NAN = ()
+    # nothing, the ticker keeps its last bar.
+    SKIP = ()
+
+    @classmethod
+    def check_if_valid(cls, value):
+        name = super().check_if_valid(value)
+        if name is not None:
+            return name
+        else:
+            raise InvalidFillPolicyError(fill_policy=value)
+
+
+class PersistencePolicy(AutoNumber):
+    """When a portfolio writes its positions and holdings to the DB."""
+    # never.
+    NONE = ()
+    # once, when the backtest finishes.
+    END_OF_RUN = ()
+    # the bars since the last write, every N bars.
+    EVERY_N_BARS = ()
+    # the bars of each session once the next session starts.
+    END_OF_DAY = ()
+    # a new version of every position on every bar. Very slow, the cost of
+    # each write grows with the length of the backtest.
+    SNAPSHOT_PER_BAR = ()
+
+    @classmethod
+    def check_if_valid(cls, value):
+        name = super().check_if_valid(value)
+        if name is not None:
+            return name
+        else:
+            raise InvalidPersistencePolicyError(persistence=value)
+
+
+class LotMethod(AutoNumber):
+    """Which open lots a closing trade is matched against."""
+    # oldest lot first.
+    FIFO = ()
+    # newest lot first.
+    LIFO = ()
+    # the lots picked with :meth:`LotBook.select`, then oldest first.
+    SPECIFIC = ()
+
+    @classmethod
+    def check_if_valid(cls, value):
+        name = super().check_if_valid(value)
+        if name is not None:
+            return name
+        else:
+            raise InvalidLotMethodError(lot_method=value)
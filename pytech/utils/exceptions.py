@@ -109,6 +109,24 @@ class InvalidOrderSubTypeError(ValueError, PyInvestmentError):
            'or "DAY". {order_subtype} was provided.')
 
 
+class InvalidFillPolicyError(ValueError, PyInvestmentError):
+    """Raised when a fill policy is not valid"""
+    msg = ('fill_policy must either be "FFILL", "NAN", or "SKIP". '
+           '{fill_policy} was provided.')
+
+
+class InvalidPersistencePolicyError(ValueError, PyInvestmentError):
+    """Raised when a persistence policy is not valid"""
+    msg = ('persistence must either be "NONE", "END_OF_RUN", "EVERY_N_BARS", '
+           '"END_OF_DAY", or "SNAPSHOT_PER_BAR". {persistence} was provided.')
+
+
+class InvalidLotMethodError(ValueError, PyInvestmentError):
+    """Raised when a lot matching method is not valid"""
+    msg = ('lot_method must either be "FIFO", "LIFO", or "SPECIFIC". '
+           '{lot_method} was provided.')
+
+
 class UntriggeredTradeError(PyInvestmentError):
     """
     Raised when a :class:``pytech.order.Trade`` is made from an order
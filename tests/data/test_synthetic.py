@@ -0,0 +1,128 @@
+import queue
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pytech.utils as utils
+from pytech.data.synthetic import (SimulatedBars, SyntheticBars, make_ohlcv,
+                                   make_tickers)
+
+
+def test_make_tickers():
+    assert make_tickers(3) == ['SYN0', 'SYN1', 'SYN2']
+    assert make_tickers(11)[0] == 'SYN00'
+
+
+def test_make_ohlcv_is_deterministic():
+    first = make_ohlcv(make_tickers(3), periods=100, seed=1)
+    second = make_ohlcv(make_tickers(5), periods=100, seed=1)
+
+    # adding tickers doesn't change the bars of the existing tickers.
+    for t, df in first.items():
+        assert df.equals(second[t])
+
+    other_seed = make_ohlcv(make_tickers(3), periods=100, seed=2)
+    assert not first['SYN0'].equals(other_seed['SYN0'])
+
+    # nor does their order.
+    reversed_ = make_ohlcv(make_tickers(3)[::-1], periods=100, seed=1)
+    assert first['SYN0'].equals(reversed_['SYN0'])
+    assert not first['SYN0'].equals(first['SYN1'])
+
+
+def test_make_ohlcv_bars_are_valid():
+    df = make_ohlcv(['SYN'], periods=500)['SYN']
+
+    assert len(df) == 500
+    assert (df[utils.HIGH_COL] >= df[[utils.OPEN_COL,
+                                      utils.CLOSE_COL]].max(axis=1)).all()
+    assert (df[utils.LOW_COL] <= df[[utils.OPEN_COL,
+                                     utils.CLOSE_COL]].min(axis=1)).all()
+    assert (df[utils.VOL_COL] > 0).all()
+
+
+def test_synthetic_bars():
+    bars = SyntheticBars(queue.Queue(), ['SYN0', 'SYN1'],
+                         '2016-01-04', '2016-02-01')
+
+    while bars.continue_backtest:
+        bars.update_bars()
+
+    assert bars.bar_count == 21
+    assert bars.get_latest_bar_dt('SYN0') == bars.get_latest_bar_dt('SYN1')
+
+
+class TestSimulatedBars(object):
+
+    def test_memory_is_constant(self):
+        bars = SimulatedBars(queue.Queue(), make_tickers(50),
+                             '2000-01-03', '2009-12-31', lookback=20,
+                             batch_size=64)
+        nbytes = bars._history.nbytes
+
+        while bars.continue_backtest:
+            bars.update_bars()
+
+        assert bars.bar_count > 2500
+        assert bars._history.nbytes == nbytes
+        assert len(bars.get_latest_bars('SYN00', 100)) == 20
+        assert bars.get_latest_values(utils.CLOSE_COL, 20).shape == (20, 50)
+
+    def test_correlation(self):
+        corr = np.array([[1, .9], [.9, 1]])
+        bars = SimulatedBars(queue.Queue(), ['A', 'B'], '2000-01-03',
+                             '2003-12-31', correlation=corr, lookback=1000)
+
+        while bars.continue_backtest:
+            bars.update_bars()
+
+        returns = np.diff(np.log(bars.get_latest_values(utils.CLOSE_COL,
+                                                        1000)), axis=0)
+        assert np.corrcoef(returns.T)[0, 1] == pytest.approx(.9, abs=.05)
+
+    def test_same_seed_same_bars(self):
+        def last_close(seed):
+            bars = SimulatedBars(queue.Queue(), ['A', 'B'], '2016-01-04',
+                                 '2016-06-01', seed=seed, correlation=.5,
+                                 jump_intensity=5)
+            while bars.continue_backtest:
+                bars.update_bars()
+            return bars.get_latest_bar_value('A', utils.CLOSE_COL)[0]
+
+        assert last_close(1) == last_close(1)
+        assert last_close(1) != last_close(2)
+
+    def test_intraday(self):
+        bars = SimulatedBars(queue.Queue(), ['A'], '2016-01-04',
+                             '2016-01-05 23:59', freq='30min')
+
+        while bars.continue_backtest:
+            bars.update_bars()
+
+        # 13 half hour bars in each of the 2 sessions.
+        assert bars.bar_count == 26
+        first, second = bars.get_latest_bars('A', 2)
+        assert second.name - first.name == pd.Timedelta('30min')
+
+    def test_latest_ticker_data(self):
+        bars = SimulatedBars(queue.Queue(), ['A', 'B'], '2016-01-04',
+                             '2016-06-01', lookback=5)
+        bars.fast_forward(10)
+        latest = bars.latest_ticker_data
+
+        assert list(latest) == ['A', 'B']
+        assert len(latest['A']) == 5
+        # nothing is rebuilt until the next bar.
+        assert bars.latest_ticker_data is latest
+        assert latest['A'] is latest['A']
+
+        bars.update_bars()
+        assert bars.latest_ticker_data is not latest
+        assert (bars.latest_ticker_data['A'][-1].name
+                == bars.get_latest_bar_dt('A'))
+
+    def test_bad_correlation(self):
+        with pytest.raises(ValueError):
+            SimulatedBars(queue.Queue(), ['A', 'B'], '2016-01-04',
+                          '2016-06-01', correlation=np.ones((3, 3)))
@@ -0,0 +1,88 @@
+import queue
+
+import pandas as pd
+
+import pytech.utils as utils
+from pytech.data.synthetic import SyntheticBars, make_ohlcv
+from pytech.data.timeline import Timeline
+from pytech.utils.enums import FillPolicy
+
+
+def _misaligned():
+    data = make_ohlcv(['A', 'B', 'C'], periods=10)
+    # B lists late, C is halted for 2 bars and delists early.
+    data['B'] = data['B'].iloc[3:]
+    data['C'] = data['C'].drop(data['C'].index[[4, 5]]).iloc[:6]
+    return data
+
+
+class MisalignedBars(SyntheticBars):
+
+    def _get_data(self, tickers=None, **kwargs):
+        return _misaligned()
+
+
+def _run(bars):
+    while bars.continue_backtest:
+        bars.update_bars()
+    return bars
+
+
+class TestTimeline(object):
+
+    def test_union(self):
+        data = _misaligned()
+        steps = list(Timeline(data))
+
+        assert [ts for ts, _ in steps] == list(data['A'].index)
+        assert [t for t, _ in steps[0][1]] == ['A', 'C']
+        assert [t for t, _ in steps[4][1]] == ['A', 'B']
+        assert sum(len(bars) for _, bars in steps) == sum(
+                len(df) for df in data.values())
+
+    def test_calendar(self):
+        data = _misaligned()
+        calendar = data['A'].index[1::2]
+        steps = list(Timeline(data, calendar))
+
+        assert [ts for ts, _ in steps] == list(calendar)
+        # only the latest bar between two calendar steps is kept.
+        ts, bars = steps[0]
+        assert all(bar.name == ts for _, bar in bars)
+
+
+class TestMisalignedBars(object):
+
+    def test_runs_until_every_ticker_ends(self):
+        bars = _run(MisalignedBars(queue.Queue(), ['A', 'B', 'C'],
+                                   '2000-01-03', '2000-02-01'))
+
+        assert bars.bar_count == 10
+        assert bars.current_dt == bars.get_latest_bar('A').name
+        assert len(bars.latest_ticker_data['B']) == 7
+
+    def test_ffill(self):
+        bars = _run(MisalignedBars(queue.Queue(), ['A', 'B', 'C'],
+                                   '2000-01-03', '2000-02-01'))
+        latest = bars.get_latest_bar('C')
+
+        assert len(bars.latest_ticker_data['C']) == 10
+        assert latest.name == bars.current_dt
+        assert latest[utils.OPEN_COL] == latest[utils.CLOSE_COL]
+        assert latest[utils.VOL_COL] == 0
+
+    def test_skip_and_nan(self):
+        bars = _run(MisalignedBars(queue.Queue(), ['A', 'B', 'C'],
+                                   '2000-01-03', '2000-02-01',
+                                   fill_policy={'A': 'skip',
+                                                'C': FillPolicy.NAN}))
+
+        assert len(bars.latest_ticker_data['A']) == 10
+        assert len(bars.latest_ticker_data['C']) == 10
+        assert pd.isnull(bars.get_latest_bar('C')).all()
+
+        bars = _run(MisalignedBars(queue.Queue(), ['A', 'B', 'C'],
+                                   '2000-01-03', '2000-02-01',
+                                   fill_policy='skip'))
+
+        assert len(bars.latest_ticker_data['C']) == 6
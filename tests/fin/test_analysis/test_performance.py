@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pytech.fin.analysis.performance import Tearsheet, clear_cache, tearsheet
+
+
+@pytest.fixture
+def curves():
+    index = pd.bdate_range('2010-01-04', periods=504)
+    returns = np.random.RandomState(0).normal(.0004, .01, (len(index), 5))
+    return pd.DataFrame(100000 * np.cumprod(1 + returns, axis=0),
+                        index=index, columns=list('abcde'))
+
+
+def test_drawdown_table():
+    sheet = Tearsheet(pd.Series([1, 2, 1, 3, 2.5]))
+    table = sheet.drawdown_table()
+
+    assert len(table) == 2
+    assert table['drawdown'].tolist() == pytest.approx([-.5, -1 / 6])
+    assert table['peak'].tolist() == [1, 3]
+    assert table['trough'].tolist() == [2, 4]
+    assert table['recovery'].iloc[0] == 3
+    assert np.isnan(table['recovery'].iloc[1])
+
+
+def test_drawdown_table_many_runs(curves):
+    table = Tearsheet(curves).drawdown_table(top=3)
+
+    for run in curves:
+        values = curves[run].values
+        underwater = values / np.maximum.accumulate(values) - 1
+        worst = table.loc[run].iloc[0]
+
+        assert 1 <= len(table.loc[run]) <= 3
+        assert worst['drawdown'] == pytest.approx(underwater.min())
+        assert worst['trough'] == curves.index[underwater.argmin()]
+
+
+def test_summary(curves):
+    summary = Tearsheet(curves).summary()
+    returns = curves.pct_change().dropna()
+
+    assert list(summary.index) == list(curves.columns)
+    assert summary['sharpe'].values == pytest.approx(
+            (returns.mean() / returns.std() * np.sqrt(252)).values)
+    assert summary['total_return'].values == pytest.approx(
+            (curves.iloc[-1] / curves.iloc[0] - 1).values)
+
+
+def test_rolling(curves):
+    sheet = Tearsheet(curves, benchmark=curves['a'])
+    returns = curves.pct_change().dropna()
+    window = returns.iloc[-63:]
+
+    sharpe = sheet.rolling_sharpe(63)
+    assert sharpe.iloc[:62].isnull().all().all()
+    assert sharpe['b'].iat[-1] == pytest.approx(
+            window['b'].mean() / window['b'].std() * np.sqrt(252))
+
+    beta = sheet.rolling_beta(63)
+    assert beta['a'].iat[-1] == pytest.approx(1)
+    assert beta['b'].iat[-1] == pytest.approx(
+            window['b'].cov(window['a']) / window['a'].var())
+
+
+def test_monthly(curves):
+    sheet = Tearsheet(curves)
+    monthly = sheet.monthly_returns()
+    heatmap = sheet.monthly_heatmap()
+
+    feb = curves.loc['2010-02']
+    jan_end = curves.loc['2010-01'].iloc[-1]
+    assert monthly['c'].iat[1] == pytest.approx(feb['c'].iat[-1]
+                                                / jan_end['c'] - 1)
+    assert heatmap.loc[('c', 2010), 2] == monthly['c'].iat[1]
+    assert heatmap.shape == (5 * 2, 12)
+
+
+def test_tearsheet_cache(curves):
+    clear_cache()
+    sheet = tearsheet(curves)
+
+    assert tearsheet(curves.copy()) is sheet
+    assert tearsheet(curves * 2) is not sheet
+    assert sheet.summary() is sheet.summary()
@@ -1,7 +1,15 @@
 # noinspection PyUnresolvedReferences
+import numpy as np
 import pytest
 
-from pytech.fin.analysis.portfolio import EfficientFrontier
+from pytech.fin.analysis.portfolio import (EfficientFrontier,
+                                           project_capped_simplex,
+                                           solve_tangency)
+
+
+def _estimates(n=30):
+    returns = np.random.RandomState(0).normal(.0005, .01, (500, n))
+    return (1 + returns.mean(axis=0)) ** 252 - 1, np.cov(returns.T) * 252
 
 
 class TestEfficientFrontier(object):
@@ -10,3 +18,44 @@ class TestEfficientFrontier(object):
         result = frontier()
         print(str(result))
         result.plot()
+
+
+class TestSolveTangency(object):
+    def test_warm_start(self):
+        returns, covar = _estimates()
+        cold = solve_tangency(returns, covar, .015)
+        warm = solve_tangency(returns, covar, .015, x0=cold.x)
+
+        assert cold.success and warm.success
+        assert warm.nit <= cold.nit
+        assert warm.fun == pytest.approx(cold.fun, rel=1e-4)
+        assert warm.x.sum() == pytest.approx(1)
+
+    def test_max_weight(self):
+        returns, covar = _estimates()
+        result = solve_tangency(returns, covar, .015, max_weight=.1)
+
+        assert result.x.max() <= .1 + 1e-8
+
+    def test_out_of_time(self):
+        returns, covar = _estimates()
+        result = solve_tangency(returns, covar, .015, max_time=0)
+
+        assert not result.success
+        assert result.timed_out
+        assert len(result.x) == len(returns)
+
+
+def test_project_capped_simplex():
+    # clipping to [0, .4] and then rescaling would give .4 / .7 to the first.
+    weights = project_capped_simplex(np.array([.9, -.2, .2, .1]), .4)
+
+    assert weights.sum() == pytest.approx(1)
+    assert weights.max() <= .4 + 1e-12
+    assert weights.min() >= 0
+    assert weights == pytest.approx([.4, .0, .35, .25])
+
+    # weights that are already feasible don't move.
+    assert project_capped_simplex(np.array([.2, .3, .5]), .5) == (
+            pytest.approx([.2, .3, .5]))
+    assert project_capped_simplex(np.ones(3), .3) is None
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pytech.fin.analysis.resample import (MAX_DRAWDOWN, METRICS, bootstrap,
+                                          equity_returns, path_metrics,
+                                          permute_trades)
+
+
+@pytest.fixture
+def equity():
+    index = pd.bdate_range('2010-01-04', periods=504)
+    returns = np.random.RandomState(0).normal(.0004, .01, len(index))
+    return pd.DataFrame({'total': 100000 * np.cumprod(1 + returns)},
+                        index=index)
+
+
+def test_path_metrics():
+    returns = np.array([[.1, -.5, .2], [.01, .01, .01]])
+    metrics = path_metrics(returns, periods_per_year=3)
+
+    assert metrics[MAX_DRAWDOWN][0] == pytest.approx(-.5)
+    assert metrics[MAX_DRAWDOWN][1] == 0
+    assert metrics['cagr'][1] == pytest.approx(1.01 ** 3 - 1)
+
+
+def test_bootstrap(equity):
+    result = bootstrap(equity, n_samples=500, seed=1, n_jobs=1)
+
+    assert len(result) == 500
+    assert list(result.samples.columns) == list(METRICS)
+    assert (result.samples[MAX_DRAWDOWN] <= 0).all()
+
+    same = bootstrap(equity, n_samples=500, seed=1, n_jobs=2)
+    assert result.samples.equals(same.samples)
+
+    summary = result.summary()
+    assert summary.loc['actual', 'cagr'] == result.actual['cagr']
+
+
+def test_permute_trades(equity):
+    trades = equity.index[::21]
+    result = permute_trades(equity, trades, n_samples=200, seed=1, n_jobs=1)
+
+    # reordering the pieces never changes where the curve ends.
+    assert np.allclose(result.samples['cagr'], result.actual['cagr'])
+    assert result.samples[MAX_DRAWDOWN].nunique() > 1
+
+
+def test_equity_returns_needs_two_values():
+    with pytest.raises(ValueError):
+        equity_returns(pd.Series([1.0]))
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from pytech.backtest.event import MarketEvent
+from pytech.data.synthetic import SyntheticBars, make_tickers
+from pytech.fin.asset.owned_asset import OwnedAsset
+from pytech.fin.balancer import AlwaysBalancedBalancer, MeanVarianceBalancer
+from pytech.fin.portfolio import BasicPortfolio
+from pytech.trading.blotter import Blotter
+from pytech.utils.enums import PersistencePolicy
+from pytech.utils.pandas_utils import ADJ_CLOSE_COL
+
+
+@pytest.fixture
+def portfolio(events):
+    bars = SyntheticBars(events, make_tickers(4), '2016-01-04', '2016-02-01')
+    blotter = Blotter(events)
+    blotter.bars = bars
+    bars.update_bars()
+    portfolio = BasicPortfolio(bars, events, '2016-01-04', blotter,
+                               persistence=PersistencePolicy.NONE)
+    portfolio.update_timeindex(MarketEvent())
+    return portfolio
+
+
+def _ordered(portfolio):
+    return {ticker: sum(o.qty for o in orders.values())
+            for ticker, orders in portfolio.blotter.orders.items()}
+
+
+def test_equal_weight_from_cash(portfolio):
+    balancer = AlwaysBalancedBalancer(portfolio, include_cash=True,
+                                      lot_size=10)
+    delta = balancer.balance()
+    prices = portfolio.bars.get_latest_prices(ADJ_CLOSE_COL)
+
+    assert (delta % 10 == 0).all()
+    assert np.dot(delta, prices) <= portfolio.cash * .9
+    assert (delta * prices == pytest.approx(portfolio.cash * .9 / 4,
+                                            abs=10 * prices.max()))
+    assert _ordered(portfolio) == dict(zip(portfolio.ticker_list,
+                                           delta.tolist()))
+
+
+def test_target_weights_respect_cash_reserves(portfolio):
+    balancer = AlwaysBalancedBalancer(portfolio, include_cash=True,
+                                      cash_reserves=.5,
+                                      target_weights={'SYN0': .6,
+                                                      'SYN1': .4})
+    delta = balancer.balance()
+    prices = portfolio.bars.get_latest_prices(ADJ_CLOSE_COL)
+
+    assert delta[2:].tolist() == [0, 0]
+    assert np.dot(delta, prices) <= portfolio.cash * .5
+
+
+def test_min_trade_threshold(portfolio):
+    prices = portfolio.bars.get_latest_prices(ADJ_CLOSE_COL)
+    portfolio.owned_assets = {
+        'SYN0': OwnedAsset('SYN0', 100, 'LONG', prices[0]),
+        'SYN1': OwnedAsset('SYN1', 101, 'LONG', prices[1]),
+        'SYN3': OwnedAsset('SYN3', 5, 'LONG', prices[3]),
+    }
+    portfolio.marks[:] = prices
+    balancer = AlwaysBalancedBalancer(portfolio, cash_reserves=0,
+                                      universe=['SYN0', 'SYN1'],
+                                      min_trade_value=prices.max() * 20)
+    delta = balancer.balance()
+
+    # the small trades to even out SYN0 and SYN1 are skipped but SYN3 is
+    # still sold since it is no longer wanted.
+    assert delta.tolist()[:3] == [0, 0, 0]
+    assert delta[3] == -5
+
+
+def test_mean_variance(events):
+    bars = SyntheticBars(events, make_tickers(10), '2016-01-04',
+                         '2016-06-01')
+    blotter = Blotter(events)
+    blotter.bars = bars
+    portfolio = BasicPortfolio(bars, events, '2016-01-04', blotter,
+                               persistence=PersistencePolicy.NONE)
+    balancer = MeanVarianceBalancer(portfolio, window=40, include_cash=True,
+                                    max_weight=.3)
+
+    for _ in range(30):
+        bars.update_bars()
+        portfolio.update_timeindex(MarketEvent())
+        balancer.observe()
+
+    # equal weight until the window is full.
+    assert balancer._get_target_weights() == pytest.approx(np.full(10, .1))
+    assert not balancer.solve_times
+
+    for _ in range(20):
+        bars.update_bars()
+        portfolio.update_timeindex(MarketEvent())
+        balancer.observe()
+
+    balancer.balance()
+    first = balancer.weights.copy()
+
+    assert len(balancer.solve_times) == 1
+    assert first.sum() == pytest.approx(1)
+    assert first.max() <= .3 + 1e-8
+    assert portfolio.blotter.orders
+
+    # the weights of a solve that ran out of time still respect max_weight.
+    balancer.max_solve_time = 0
+    balancer.weights = np.array([.9] + [.1 / 9] * 9)
+    balancer._solve()
+
+    assert balancer.weights.sum() == pytest.approx(1)
+    assert balancer.weights.max() <= .3 + 1e-8
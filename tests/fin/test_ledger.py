@@ -0,0 +1,53 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pytech.fin.ledger import Ledger
+
+
+@pytest.fixture
+def ledger():
+    ledger = Ledger(['a', 'b'], capacity=2)
+    for i, dt in enumerate(pd.bdate_range('2016-01-04', periods=5)):
+        ledger.append(dt, [i, i * 10])
+    return ledger
+
+
+class TestLedger(object):
+
+    def test_grows(self, ledger):
+        assert len(ledger) == 5
+        assert ledger.capacity >= 5
+        assert ledger.column('b').tolist() == [0, 10, 20, 30, 40]
+        assert ledger.last('a') == 4
+
+    def test_rows(self, ledger):
+        assert ledger[0]['b'] == 0
+        assert ledger[-1]['a'] == 4
+        assert ledger[-1]['datetime'] == pd.Timestamp('2016-01-08', tz='UTC')
+
+        with pytest.raises(IndexError):
+            ledger[5]
+
+    def test_to_frame(self, ledger):
+        df = ledger.to_frame(start=3)
+
+        assert list(df.columns) == ['a', 'b']
+        assert df.index[0] == pd.Timestamp('2016-01-07', tz='UTC')
+        assert df['a'].tolist() == [3, 4]
+
+    def test_extend(self, ledger):
+        other = Ledger(ledger.columns)
+        other.extend(ledger.rows_since(0))
+
+        np.testing.assert_array_equal(other.values, ledger.values)
+        assert other.index.equals(ledger.index)
+
+    def test_pickle(self, ledger):
+        restored = pickle.loads(pickle.dumps(ledger))
+
+        np.testing.assert_array_equal(restored.values, ledger.values)
+        restored.append('2016-01-11', [5, 50])
+        assert len(restored) == 6
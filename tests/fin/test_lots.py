@@ -0,0 +1,139 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from pytech.fin.lots import LotBook
+from pytech.utils.enums import LotMethod
+
+
+def _book(method=LotMethod.FIFO):
+    book = LotBook(['AAPL', 'MSFT'], method)
+    book.fill('AAPL', 100, 10.0, '2016-01-04')
+    book.fill('AAPL', 100, 20.0, '2016-02-01')
+    book.fill('AAPL', 100, 30.0, '2016-03-01')
+    return book
+
+
+def test_fifo():
+    book = _book()
+    pnl = book.fill('AAPL', -150, 25.0, '2017-03-01')
+
+    assert pnl == pytest.approx(100 * 15 + 50 * 5)
+    assert book['AAPL'].qty.tolist() == [50, 100]
+    assert book['AAPL'].cost.tolist() == [20, 30]
+    assert book.shares.tolist() == [150, 0]
+    assert book.cost_basis[0] == pytest.approx(50 * 20 + 100 * 30)
+
+    closed = book.closed_lots()
+    assert closed['qty'].tolist() == [100, 50]
+    assert closed['lot_id'].tolist() == [0, 1]
+    assert closed['days_held'].iat[0] == 422
+
+
+def test_lifo():
+    book = _book(LotMethod.LIFO)
+    pnl = book.fill('AAPL', -150, 25.0, '2016-03-02')
+
+    assert pnl == pytest.approx(100 * -5 + 50 * 5)
+    assert book['AAPL'].qty.tolist() == [100, 50]
+
+
+def test_specific():
+    book = _book(LotMethod.SPECIFIC)
+    book.select('AAPL', [1])
+    pnl = book.fill('AAPL', -150, 25.0, '2016-03-02')
+
+    # lot 1 first, then the oldest lot.
+    assert pnl == pytest.approx(100 * 5 + 50 * 15)
+    assert book['AAPL'].qty.tolist() == [50, 0, 100]
+    assert len(book['AAPL']) == 2
+
+    # a selected lot that isn't open is skipped.
+    book.select('AAPL', [1, 2])
+    book.fill('AAPL', -100, 25.0, '2016-03-03')
+    assert book['AAPL'].qty.tolist() == [50]
+
+
+def test_flip_to_short():
+    book = LotBook(['AAPL'])
+    book.fill('AAPL', 10, 10.0, '2016-01-04')
+    pnl = book.fill('AAPL', -15, 12.0, '2016-01-05', commission=1.5)
+
+    # the commission is spread over all 15 shares.
+    assert pnl == pytest.approx(10 * (11.9 - 10))
+    assert book['AAPL'].qty.tolist() == [-5]
+    assert book['AAPL'].cost.tolist() == pytest.approx([11.9])
+
+    pnl = book.fill('AAPL', 5, 11.0, '2016-01-06')
+    assert pnl == pytest.approx(5 * .9)
+    assert book.shares[0] == 0
+    assert book.realized_pnl == pytest.approx(19 + 4.5)
+
+
+def test_unrealized_pnl():
+    book = _book()
+    book.fill('MSFT', -10, 50.0, '2016-01-04')
+    prices = np.array([25.0, 40.0])
+
+    unrealized = book.unrealized_pnl(prices)
+    assert unrealized == pytest.approx([100 * 15 + 100 * 5 - 100 * 5, 100])
+    assert book['AAPL'].unrealized_pnl(25.0).sum() == pytest.approx(
+            unrealized[0])
+
+
+def test_many_lots():
+    book = LotBook(['AAPL'], capacity=1)
+
+    for i in range(1000):
+        book.fill('AAPL', 1, float(i), '2016-01-04')
+        if i % 2:
+            book.fill('AAPL', -1, float(i), '2016-01-05')
+
+    assert book.shares[0] == 500
+    assert len(book['AAPL']) == 500
+    assert len(book.closed) == 500
+    # the k-th sale closes lot k at a price of 2k + 1.
+    assert book.realized_pnl == sum(k + 1 for k in range(500))
+    assert book['AAPL'].capacity <= 1024
+
+
+def test_reorder():
+    book = _book()
+    book.fill('AAPL', -100, 25.0, '2016-03-02')
+    book.fill('MSFT', -10, 50.0, '2016-01-04')
+    book.reorder(['MSFT', 'AAPL'])
+
+    assert book.shares.tolist() == [-10, 200]
+    assert book['AAPL'].qty.tolist() == [100, 100]
+    assert book.unrealized_pnl(np.array([40.0, 25.0])) == pytest.approx(
+            [100, 100 * 5 - 100 * 5])
+    assert book.closed_lots()['ticker'].tolist() == ['AAPL']
+
+    with pytest.raises(ValueError):
+        book.reorder(['AAPL'])
+
+
+def test_save_closed_lots_separately():
+    book = _book()
+    book.fill('AAPL', -100, 25.0, '2016-03-02')
+    mark = len(book.closed)
+    book.fill('AAPL', -50, 25.0, '2016-03-03')
+
+    saved = pickle.loads(pickle.dumps(book.without_closed()))
+    assert len(saved.closed) == 0
+    assert len(book.closed) == 2
+    assert saved['AAPL'].qty.tolist() == [50, 100]
+
+    # another book with its tickers in another order.
+    other = LotBook(['MSFT', 'AAPL'])
+    tickers, closed = book.rows_since(0)
+    other.extend((tickers, closed[:mark]))
+    other.extend(book.rows_since(mark))
+    assert other.closed_lots()['qty'].tolist() == [100, 50]
+    assert other.closed_lots()['ticker'].tolist() == ['AAPL', 'AAPL']
+    assert other.closed['ticker'].tolist() == [1, 1]
+
+    saved.extend(book.rows_since(0))
+    saved.fill('AAPL', -50, 25.0, '2016-03-04')
+    assert saved.closed_lots()['lot_id'].tolist() == [0, 1, 1]
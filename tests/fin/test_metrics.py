@@ -0,0 +1,127 @@
+import math
+
+import numpy as np
+import pytest
+
+from pytech.fin.analysis.resample import path_metrics
+from pytech.fin.metrics import (MetricsTracker, RollingCovariance,
+                                RollingWindow, RunningDrawdown, Welford)
+
+
+@pytest.fixture
+def values():
+    returns = np.random.RandomState(0).normal(.0004, .01, 504)
+    return 100000 * np.cumprod(np.concatenate([[1], 1 + returns]))
+
+
+def test_welford():
+    x = np.random.RandomState(1).normal(size=1000)
+    acc = Welford()
+
+    for v in x:
+        acc.update(v)
+
+    assert acc.mean == pytest.approx(x.mean())
+    assert acc.variance == pytest.approx(x.var(ddof=1))
+    assert math.isnan(Welford().variance)
+
+
+def test_rolling_window():
+    x = np.random.RandomState(2).normal(size=100)
+    window = RollingWindow(20)
+
+    for v in x:
+        window.update(v)
+
+    assert window.full
+    assert window.mean == pytest.approx(x[-20:].mean())
+    assert window.std == pytest.approx(x[-20:].std(ddof=1))
+
+
+def test_rolling_covariance():
+    x = np.random.RandomState(3).normal(size=(100, 4))
+    window = RollingCovariance(4, 30)
+
+    for row in x[:45]:
+        window.update(row)
+
+    assert window.mean == pytest.approx(x[15:45].mean(axis=0))
+    assert window.covariance == pytest.approx(np.cov(x[15:45].T))
+
+    # past a full recompute of the sums.
+    for row in x[45:]:
+        window.update(row)
+
+    assert window.covariance == pytest.approx(np.cov(x[-30:].T))
+
+
+def test_running_drawdown():
+    dd = RunningDrawdown()
+
+    for v in (100, 110, 55, 60, 120, 108):
+        dd.update(v)
+
+    assert dd.max_drawdown == pytest.approx(-.5)
+    assert dd.drawdown == pytest.approx(-.1)
+    assert dd.max_duration == 2
+
+
+def test_tracker_matches_path_metrics(values):
+    tracker = MetricsTracker(window=63)
+
+    for v in values:
+        tracker.update(v)
+
+    returns = values[1:] / values[:-1] - 1
+    expected = path_metrics(returns)
+
+    assert tracker.periods == len(returns)
+    assert tracker.sharpe == pytest.approx(expected['sharpe'][0])
+    assert tracker.max_drawdown == pytest.approx(expected['max_drawdown'][0])
+    assert tracker.volatility == pytest.approx(
+            returns.std(ddof=1) * np.sqrt(252))
+    assert tracker.rolling_volatility == pytest.approx(
+            returns[-63:].std(ddof=1) * np.sqrt(252))
+
+    snapshot = tracker.snapshot()
+    assert snapshot['sharpe'] == tracker.sharpe
+    assert 'rolling_sharpe' in snapshot
+
+
+def test_tracker_turnover_and_exposure():
+    tracker = MetricsTracker(periods_per_year=2)
+    tracker.update(100.0)
+    tracker.add_trade(-50.0)
+    tracker.update(100.0, gross_exposure=50.0)
+    tracker.update(100.0, gross_exposure=50.0)
+
+    assert tracker.turnover == pytest.approx(.5)
+    assert tracker.snapshot()['exposure'] == pytest.approx(.5)
+
+
+def test_tracker_abort():
+    tracker = MetricsTracker(max_drawdown=-.2)
+
+    for v in (100, 90, 85):
+        tracker.update(v)
+
+    assert tracker.abort_reason is None
+
+    tracker.update(75)
+    assert 'drawdown' in tracker.abort_reason
+
+    # the first reason sticks.
+    tracker.update(200)
+    assert 'drawdown' in tracker.abort_reason
+
+
+def test_tracker_min_sharpe():
+    tracker = MetricsTracker(min_sharpe=0, min_periods=10)
+    value = 100.0
+
+    for i in range(12):
+        value *= .99 if i % 2 else 1.005
+        tracker.update(value)
+
+    assert tracker.abort_reason is not None
+    assert 'Sharpe' in tracker.abort_reason
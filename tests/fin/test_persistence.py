@@ -0,0 +1,109 @@
+import pytest
+
+from pytech.backtest.event import MarketEvent
+from pytech.data.synthetic import SyntheticBars, make_tickers
+from pytech.fin.persistence import PortfolioWriter
+from pytech.fin.portfolio import BasicPortfolio
+from pytech.trading.blotter import Blotter
+
+
+class FakeLib(object):
+    """Records every write instead of going to the DB."""
+
+    def __init__(self):
+        self.calls = []
+
+    def write(self, symbol, df, prune_previous_version=False):
+        self.calls.append(('write', symbol, len(df)))
+
+    def append(self, symbol, df):
+        self.calls.append(('append', symbol, len(df)))
+
+    def write_snapshot(self, symbol, df, snap_shot):
+        self.calls.append(('write_snapshot', symbol, len(df)))
+
+
+def _portfolio(events, name=None):
+    bars = SyntheticBars(events, make_tickers(4), '2016-01-04', '2016-02-01')
+    blotter = Blotter(events)
+    blotter.bars = bars
+    bars.update_bars()
+    portfolio = BasicPortfolio(bars, events, '2016-01-04', blotter,
+                               name=name)
+    portfolio.lib = FakeLib()
+    return portfolio
+
+
+@pytest.fixture
+def portfolio(events):
+    return _portfolio(events)
+
+
+def _run(portfolio, policy, bars=5, **kwargs):
+    portfolio.writer = PortfolioWriter(portfolio, policy, **kwargs)
+
+    for _ in range(bars):
+        portfolio.update_timeindex(MarketEvent())
+
+    portfolio.close()
+    return portfolio.lib.calls
+
+
+class TestPortfolioWriter(object):
+
+    def test_none(self, portfolio):
+        assert _run(portfolio, 'none') == []
+
+    def test_end_of_run(self, portfolio):
+        calls = _run(portfolio, 'end_of_run')
+        n_tickers = len(portfolio.ticker_list)
+
+        # the starting row plus a row for every bar.
+        assert ('write', portfolio.POSITION_COLLECTION,
+                6 * n_tickers) in calls
+        assert ('write', portfolio.HOLDINGS_COLLECTION, 6) in calls
+        assert ('write', portfolio.TICK_COLLECTION, n_tickers) in calls
+        assert not [c for c in calls if c[0] == 'append']
+
+    def test_every_n_bars_appends_deltas(self, portfolio):
+        calls = _run(portfolio, 'every_n_bars', every_n_bars=2,
+                     background=False)
+        holdings = [c for c in calls
+                    if c[1] == portfolio.HOLDINGS_COLLECTION]
+
+        assert holdings == [('write', portfolio.HOLDINGS_COLLECTION, 2),
+                            ('append', portfolio.HOLDINGS_COLLECTION, 2),
+                            ('append', portfolio.HOLDINGS_COLLECTION, 2)]
+
+    def test_mark_written(self, portfolio):
+        for _ in range(3):
+            portfolio.update_timeindex(MarketEvent())
+
+        portfolio.writer = PortfolioWriter(portfolio, 'end_of_run')
+        portfolio.writer.mark_written()
+
+        for _ in range(2):
+            portfolio.update_timeindex(MarketEvent())
+
+        portfolio.close()
+        holdings = [c for c in portfolio.lib.calls
+                    if c[1] == portfolio.HOLDINGS_COLLECTION]
+
+        assert holdings == [('append', portfolio.HOLDINGS_COLLECTION, 2)]
+
+    def test_snapshot_per_bar(self, portfolio):
+        calls = _run(portfolio, 'snapshot_per_bar')
+        snapshots = [c for c in calls
+                     if c[1] == portfolio.POSITION_COLLECTION]
+
+        assert len(snapshots) == 5
+        assert all(c[0] == 'write_snapshot' for c in snapshots)
+
+    def test_named_portfolios_are_stored_apart(self, events):
+        first = _run(_portfolio(events, 'BuyAndHold'), 'end_of_run')
+        second = _run(_portfolio(events, 'BuyAndHold_1'), 'end_of_run')
+
+        assert {c[1] for c in first} == {'portfolio_BuyAndHold',
+                                         'portfolio_holdings_BuyAndHold',
+                                         'portfolio_tick_BuyAndHold'}
+        assert not {c[1] for c in first} & {c[1] for c in second}
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+
+from pytech.algo.strategy import Strategy
+from pytech.data.synthetic import make_ohlcv
+from pytech.live.feed import ReplayFeed
+from pytech.live.paper import PaperTrader
+
+TICKERS = ['SYN0', 'SYN1']
+
+
+class OrderingStrategy(Strategy):
+    """Buy 10 shares of the first ticker on each of the first 3 bars."""
+
+    def __init__(self, data_handler, events):
+        super().__init__(data_handler, events)
+        self.blotter = None
+        self.bars_seen = 0
+
+    def generate_signals(self, event):
+        self.bars_seen += 1
+
+        if self.bars_seen <= 3:
+            self.blotter.place_order(TICKERS[0], 10, 'BUY', 'MARKET')
+
+
+@pytest.fixture
+def feed():
+    return ReplayFeed(make_ohlcv(TICKERS, periods=20, start='2016-01-04'))
+
+
+def test_replay_feed_yields_every_step(feed):
+    async def collect():
+        return [step async for step in feed]
+
+    steps = asyncio.new_event_loop().run_until_complete(collect())
+
+    assert len(steps) == 20
+    assert all(len(bars) == len(TICKERS) for _, bars in steps)
+
+
+def test_paper_trader(tmpdir):
+    feed = ReplayFeed(make_ohlcv(TICKERS, periods=20, start='2016-01-04'),
+                      interval=.002)
+    # every fill takes several bars to come back.
+    trader = PaperTrader(TICKERS, feed, OrderingStrategy,
+                         execution_latency=.02, persistence='none')
+    trader.strategy.blotter = trader.blotter
+    trader.run()
+    report = trader.report()
+
+    assert report['bars'] == 20
+    # each order is sent to be filled once.
+    assert report['orders'] == 3
+    assert report['fills'] == 3
+    assert trader.portfolio.owned_assets[TICKERS[0]].shares_owned == 30
+    assert len(trader.processing) == 20
+    assert report['bar_to_order']['count'] == 3
+    assert report['bar_to_order']['max_ms'] > 0
+
+    path = str(tmpdir.join('latency.json'))
+    trader.export_latency(path)
+
+    with open(path) as f:
+        assert json.load(f)['bars'] == 20
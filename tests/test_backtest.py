@@ -1,8 +1,88 @@
+import functools
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
 import pytest
 from pytech.backtest.backtest import Backtest
 from pytech.algo.strategy import BuyAndHold, CrossOverStrategy
+from pytech.backtest.scheduler import MonthStart
+from pytech.data.synthetic import SyntheticBars, make_tickers
+from pytech.fin.balancer import AlwaysBalancedBalancer
+from pytech.trading.slippage import FixedBasisPointsSlippage
+from pytech.utils.enums import PersistencePolicy
+from tests.fin.test_persistence import FakeLib
 import datetime as dt
 
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# deterministic bars that need neither a database nor a network.
+SYNTHETIC_TICKERS = make_tickers(4)
+SYNTHETIC_BARS = functools.partial(SyntheticBars, seed=0)
+
+# runs a backtest, or resumes it, and prints the portfolio by ticker and
+# where the order ids got to.
+RESUME_SCRIPT = textwrap.dedent('''
+    import datetime as dt
+    import functools
+    import json
+    import sys
+
+    from pytech.algo.strategy import BuyAndHold
+    from pytech.backtest.backtest import Backtest
+    from pytech.data.synthetic import SyntheticBars, make_tickers
+    from pytech.trading.order import next_order_id
+    from pytech.utils.enums import PersistencePolicy
+
+    path, mode = sys.argv[1:]
+
+    if mode == 'run':
+        backtest = Backtest(
+                ticker_list=set(make_tickers(8)),
+                initial_capital=100000,
+                start_date=dt.datetime(2016, 3, 10),
+                end_date=dt.datetime(2016, 6, 10),
+                strategy=BuyAndHold,
+                data_handler=functools.partial(SyntheticBars, seed=0),
+                checkpoint_path=path,
+                checkpoint_freq=10,
+                persistence=PersistencePolicy.NONE)
+        # ids of orders that are closed by the time of the checkpoint.
+        for _ in range(3):
+            next_order_id()
+        backtest._run()
+    else:
+        backtest = Backtest.resume(path, run=False)
+
+    portfolio = backtest.portfolio
+    holdings = portfolio.all_holdings_mv[-1]
+    tickers = list(portfolio.ticker_list)
+    print(json.dumps({
+        'marks': dict(zip(tickers, portfolio.marks.tolist())),
+        'holdings': {t: holdings[t] for t in tickers},
+        'prices': dict(zip(tickers, backtest.data_handler.get_latest_prices(
+                'close').tolist())),
+        'order_ids': [next_order_id.last, next_order_id.namespace.hex],
+    }))
+''')
+
+
+class MonthlyStrategy(BuyAndHold):
+    signals_every_bar = False
+
+    def __init__(self, data_handler, events):
+        super().__init__(data_handler, events)
+        self.rebalance_dates = []
+
+    def schedule_callbacks(self, scheduler):
+        scheduler.schedule(self.rebalance, MonthStart())
+
+    def rebalance(self, current_dt):
+        self.rebalance_dates.append(current_dt)
+
 
 class TestBacktest(object):
 
@@ -19,4 +99,207 @@ class TestBacktest(object):
         assert isinstance(backtest, Backtest)
         backtest._run()
 
+    def test_multiple_strategies(self):
+        start_date = dt.datetime(year=2016, month=3, day=10)
+        backtest = Backtest(ticker_list=SYNTHETIC_TICKERS,
+                            initial_capital=100000,
+                            start_date=start_date,
+                            end_date=dt.datetime(year=2016, month=6, day=10),
+                            strategy=[BuyAndHold, CrossOverStrategy,
+                                      BuyAndHold],
+                            data_handler=SYNTHETIC_BARS,
+                            persistence=PersistencePolicy.NONE)
+
+        assert backtest.num_strats == 3
+        assert [c.name for c in backtest.contexts] == ['BuyAndHold',
+                                                       'CrossOverStrategy',
+                                                       'BuyAndHold_1']
+        # every strategy shares the same data handler
+        for context in backtest.contexts:
+            assert context.strategy.bars is backtest.data_handler
+            assert context.blotter.bars is backtest.data_handler
+
+        assert (backtest.contexts[0].portfolio
+                is not backtest.contexts[1].portfolio)
+
+        backtest._run()
+        results = backtest.results()
+        assert list(results.index) == ['BuyAndHold', 'CrossOverStrategy',
+                                       'BuyAndHold_1']
+
+    def test_orders_are_filled(self):
+        def run(slippage_model):
+            backtest = Backtest(
+                    ticker_list=SYNTHETIC_TICKERS,
+                    initial_capital=100000,
+                    start_date=dt.datetime(year=2016, month=3, day=10),
+                    end_date=dt.datetime(year=2016, month=6, day=10),
+                    strategy=MonthlyStrategy,
+                    balancer=functools.partial(AlwaysBalancedBalancer,
+                                               include_cash=True),
+                    data_handler=SYNTHETIC_BARS,
+                    persistence=PersistencePolicy.NONE)
+            backtest.blotter.slippage_model = slippage_model
+            backtest._run()
+            return backtest
+
+        backtest = run(FixedBasisPointsSlippage(bps=10))
+        portfolio = backtest.portfolio
+        trades = backtest.blotter.trades
+
+        assert backtest.fills > 0
+        assert len(trades) == backtest.fills
+        assert not backtest.blotter.in_flight
+        # the default commission is a flat fee per order.
+        assert (trades.column('commission') == 5.0).all()
+        assert portfolio.total_commission == 5.0 * len(trades)
+        # buys cost cash and sales bring it in.
+        assert (trades.column('side') == -1).any()
+        assert portfolio.cash == pytest.approx(
+                100000 - np.dot(trades.signed_qty, trades.column('price'))
+                - portfolio.total_commission)
+        # the open lots add up to the positions.
+        lots = portfolio.lots
+        assert portfolio.shares.any()
+        for i, ticker in enumerate(portfolio.ticker_list):
+            assert lots[ticker].qty.sum() == portfolio.shares[i]
+            assert lots.shares[lots.ticker_index[ticker]] == (
+                    portfolio.shares[i])
+
+        # the first rebalance places the same orders without slippage,
+        # buys then fill 10 bps above the close and sales 10 bps below it.
+        no_slippage = run(FixedBasisPointsSlippage(bps=0)).blotter.trades
+        first = trades.column('timestamp') == trades.column('timestamp')[0]
+        np.testing.assert_allclose(
+                trades.column('price')[first],
+                no_slippage.column('price')[first]
+                * (1 + trades.column('side')[first] / 1000))
+
+    def test_checkpoint_and_resume(self, tmpdir):
+        path = str(tmpdir.join('backtest.ckpt'))
+        start_date = dt.datetime(year=2016, month=3, day=10)
+        end_date = dt.datetime(year=2016, month=6, day=10)
+        backtest = Backtest(ticker_list=SYNTHETIC_TICKERS,
+                            initial_capital=100000,
+                            start_date=start_date,
+                            end_date=end_date,
+                            strategy=BuyAndHold,
+                            checkpoint_path=path,
+                            checkpoint_freq=10,
+                            data_handler=SYNTHETIC_BARS,
+                            persistence=PersistencePolicy.NONE)
+        backtest._run()
+
+        resumed = Backtest.resume(path, run=False)
+        assert (resumed.data_handler.bar_count
+                == backtest.data_handler.bar_count)
+        assert resumed.portfolio.cash == backtest.portfolio.cash
+        assert (len(resumed.portfolio.all_holdings_mv)
+                == len(backtest.portfolio.all_holdings_mv))
+        assert resumed.strategy.bought == backtest.strategy.bought
+
+    def test_resume_lots(self, tmpdir):
+        path = str(tmpdir.join('backtest.ckpt'))
+        backtest = Backtest(ticker_list=SYNTHETIC_TICKERS,
+                            initial_capital=100000,
+                            start_date=dt.datetime(year=2016, month=3, day=10),
+                            end_date=dt.datetime(year=2016, month=9, day=10),
+                            strategy=MonthlyStrategy,
+                            balancer=functools.partial(AlwaysBalancedBalancer,
+                                                       include_cash=True),
+                            checkpoint_path=path,
+                            checkpoint_freq=10,
+                            data_handler=SYNTHETIC_BARS,
+                            persistence=PersistencePolicy.NONE)
+        backtest._run()
+        lots = backtest.portfolio.lots
+        assert len(lots.closed) > 0
+
+        resumed = Backtest.resume(path, run=False).portfolio.lots
+        np.testing.assert_array_equal(resumed.closed, lots.closed)
+        np.testing.assert_array_equal(resumed.shares, lots.shares)
+        assert resumed.realized_pnl == lots.realized_pnl
+
+    def test_resume_with_another_hash_seed(self, tmpdir):
+        path = str(tmpdir.join('backtest.ckpt'))
+
+        def run(mode, hash_seed):
+            env = dict(os.environ, PYTHONHASHSEED=str(hash_seed))
+            out = subprocess.run(
+                    [sys.executable, '-c', RESUME_SCRIPT, path, mode],
+                    env=env, cwd=PROJECT_DIR, stdout=subprocess.PIPE,
+                    check=True)
+            return json.loads(out.stdout.decode().splitlines()[-1])
+
+        # the tickers are a set, so their order changes with the hash seed.
+        original = run('run', 1)
+        resumed = run('resume', 7)
+
+        assert resumed == original
+
+    def test_extend(self, tmpdir):
+        path = str(tmpdir.join('backtest.ckpt'))
+        start_date = dt.datetime(year=2016, month=3, day=10)
+        backtest = Backtest(ticker_list=SYNTHETIC_TICKERS,
+                            initial_capital=100000,
+                            start_date=start_date,
+                            end_date=dt.datetime(year=2016, month=6, day=10),
+                            strategy=BuyAndHold,
+                            checkpoint_path=path,
+                            data_handler=SYNTHETIC_BARS,
+                            persistence=PersistencePolicy.NONE)
+        backtest._run()
+        bars_run = backtest.data_handler.bar_count
+        holdings_run = len(backtest.portfolio.all_holdings_mv)
+
+        extended = Backtest.extend(
+                path, end_date=dt.datetime(year=2016, month=7, day=10),
+                run=False)
+        # the history was stored by the first run, only new rows are.
+        writer = extended.portfolio.writer
+        writer.policy = PersistencePolicy.END_OF_RUN
+        writer.background = False
+        extended.portfolio.lib = FakeLib()
+        extended._run()
+
+        new_bars = extended.data_handler.bar_count - bars_run
+        assert new_bars > 0
+        assert (len(extended.portfolio.all_holdings_mv)
+                == holdings_run + new_bars)
+        assert [c for c in extended.portfolio.lib.calls
+                if c[1] == writer.holdings_symbol] == [
+                   ('append', writer.holdings_symbol, new_bars)]
+
+    def test_profile(self):
+        start_date = dt.datetime(year=2016, month=3, day=10)
+        backtest = Backtest(ticker_list=SYNTHETIC_TICKERS,
+                            initial_capital=100000,
+                            start_date=start_date,
+                            end_date=dt.datetime(year=2016, month=6, day=10),
+                            strategy=BuyAndHold,
+                            profile=True,
+                            data_handler=SYNTHETIC_BARS,
+                            persistence=PersistencePolicy.NONE)
+        backtest._run()
+        report = backtest.profile_report
+
+        assert report.bars == backtest.data_handler.bar_count
+        assert 'update_bars' in report.phases.index
+        assert 'event.market' in report.phases.index
+        # the wrappers are removed when the backtest finishes
+        assert 'update_bars' not in vars(backtest.data_handler)
+
+    def test_scheduled_callbacks(self):
+        backtest = Backtest(ticker_list=SYNTHETIC_TICKERS,
+                            initial_capital=100000,
+                            start_date=dt.datetime(year=2016, month=3, day=10),
+                            end_date=dt.datetime(year=2016, month=6, day=10),
+                            strategy=MonthlyStrategy,
+                            data_handler=SYNTHETIC_BARS,
+                            persistence=PersistencePolicy.NONE)
+        backtest._run()
 
+        dates = backtest.strategy.rebalance_dates
+        assert [d.month for d in dates] == [4, 5, 6]
+        # generate_signals is never called so nothing is ever bought.
+        assert backtest.signals == 0
@@ -1,5 +1,13 @@
+import pandas as pd
+import pytest
+
 import pytech.trading.order as ord
-from pytech.utils.enums import OrderStatus, OrderType, TradeAction
+from pytech.data.synthetic import SyntheticBars
+from pytech.trading.blotter import Blotter
+from pytech.trading.slippage import FixedBasisPointsSlippage
+from pytech.utils import CLOSE_COL
+from pytech.utils.enums import (OrderStatus, OrderSubType, OrderType,
+                                TradeAction)
 
 
 class TestBlotter(object):
@@ -85,3 +93,145 @@ class TestBlotter(object):
 
         both_none = blotter._filter_on_price(order, None, None)
         assert both_none is False
+
+    def test_find_order(self, populated_blotter):
+        order = populated_blotter._find_order('three')
+
+        assert order.ticker == 'MSFT'
+        assert populated_blotter['three'] is order
+        assert populated_blotter._find_order('three', 'AAPL') is None
+        assert populated_blotter._find_order('five') is None
+
+    def test_set_and_delete_orders(self, populated_blotter):
+        blotter = populated_blotter
+        msft = ord.MarketOrder('MSFT', TradeAction.BUY, 10, order_id='five')
+
+        blotter['MSFT'] = {'five': msft}
+
+        assert blotter['five'] is msft
+        assert blotter._index.get('three') is None
+        # the other tickers are untouched.
+        assert blotter['one'].ticker == 'AAPL'
+        assert len(blotter._index) == 4
+
+        del blotter['MSFT']
+
+        assert 'MSFT' not in blotter.orders
+        assert blotter._index.get('five') is None
+        assert len(blotter._index) == 3
+
+        with pytest.raises(KeyError):
+            del blotter['MSFT']
+
+    def test_check_order_triggers(self, blotter, events):
+        bars = SyntheticBars(events, ['AAPL', 'MSFT'], '2017-01-03',
+                             '2017-02-01', seed=0)
+        bars.update_bars()
+        blotter.bars = bars
+        price = bars.get_latest_prices(CLOSE_COL)[0]
+
+        blotter.place_order('AAPL', 50, 'BUY', 'LIMIT',
+                            limit_price=price + 1, order_id='one')
+        blotter.place_order('AAPL', 50, 'BUY', 'LIMIT',
+                            limit_price=price - 1, order_id='two')
+        blotter.place_order('MSFT', -50, 'SELL', 'STOP', stop_price=.01,
+                            order_id='three')
+
+        while not events.empty():
+            events.get()
+
+        blotter.check_order_triggers()
+
+        triggered = []
+        while not events.empty():
+            triggered.append(events.get().order_id)
+
+        assert triggered == ['one']
+
+    def test_in_flight_orders_are_not_resent(self, blotter, events):
+        bars = SyntheticBars(events, ['AAPL'], '2017-01-03', '2017-02-01',
+                             seed=0)
+        bars.update_bars()
+        blotter.bars = bars
+        order = blotter.place_order('AAPL', 50, 'BUY', 'MARKET',
+                                    order_id='one')
+
+        def trades():
+            out = []
+            while not events.empty():
+                event = events.get()
+                if getattr(event, 'order_id', None) == 'one':
+                    out.append(event)
+            return out
+
+        trades()
+        blotter.check_order_triggers()
+        sent = trades()
+        assert [e.qty for e in sent] == [50]
+        assert blotter.in_flight == {'one'}
+
+        # the fill hasn't come back by the next bar.
+        bars.update_bars()
+        blotter.check_order_triggers()
+        assert trades() == []
+
+        trade = blotter.make_trade(order, sent[0].price, sent[0].dt, 50)
+        assert trade.qty == 50
+        assert not blotter.in_flight
+        # a late duplicate fill has nothing left to fill.
+        assert blotter.make_trade(order, sent[0].price, sent[0].dt,
+                                  50) is None
+
+    def test_expire_orders(self, blotter, events):
+        bars = SyntheticBars(events, ['AAPL'], '2017-01-03', '2017-02-01',
+                             seed=0)
+        bars.update_bars()
+        blotter.bars = bars
+
+        day = blotter.place_order('AAPL', 50, 'BUY', 'LIMIT',
+                                  limit_price=.01, order_id='day')
+        gtc = blotter.place_order(
+                'AAPL', 50, 'BUY', 'LIMIT', limit_price=.01,
+                order_subtype=OrderSubType.GOOD_TIL_CANCELED,
+                max_days_open=5, order_id='gtc')
+
+        # both are placed at the time of the latest bar.
+        assert day.created == pd.Timestamp('2017-01-03', tz='UTC')
+        assert blotter.expire_orders() == []
+
+        bars.update_bars()
+        assert blotter.expire_orders() == [day]
+        assert day.status is OrderStatus.CANCELLED
+
+        # the GTC order is open from the 4th through Monday the 9th.
+        for _ in range(4):
+            blotter.check_order_triggers()
+            assert gtc.open
+            bars.update_bars()
+
+        blotter.check_order_triggers()
+        assert gtc.status is OrderStatus.CANCELLED
+        assert blotter.expire_orders() == []
+
+    def test_slippage_model(self, events):
+        blotter = Blotter(events,
+                          slippage_model=FixedBasisPointsSlippage(bps=10))
+        bars = SyntheticBars(events, ['AAPL'], '2017-01-03', '2017-02-01',
+                             seed=0)
+        bars.update_bars()
+        blotter.bars = bars
+        price = bars.get_latest_prices(CLOSE_COL)[0]
+
+        blotter.place_order('AAPL', 50, 'BUY', 'MARKET', order_id='one')
+
+        while not events.empty():
+            events.get()
+
+        blotter.check_order_triggers()
+        event = events.get()
+
+        assert event.price == pytest.approx(price * 1.001)
+        assert event.qty == 50
+
+        with pytest.raises(TypeError):
+            Blotter(events, slippage_model=object())
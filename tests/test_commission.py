@@ -0,0 +1,107 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+
+import pytech.trading.commission as com
+import pytech.trading.order as ord
+from pytech.utils.enums import TradeAction
+
+
+def test_per_order():
+    order = ord.MarketOrder('AAPL', TradeAction.BUY, 100)
+    model = com.PerOrderCommissionModel(cost=5)
+
+    assert model.calculate(order, 10.0) == 5.0
+
+    order.commission = 5.0
+    assert model.calculate(order, 10.0) == 0.0
+
+
+def test_per_share_and_percent():
+    qty = np.array([100, -200])
+    price = np.array([10.0, 50.0])
+
+    np.testing.assert_allclose(
+            com.PerShareCommissionModel(.01).calculate_many(qty, price),
+            [1.0, 2.0])
+    np.testing.assert_allclose(
+            com.PercentCommissionModel(.001).calculate_many(qty, price),
+            [1.0, 10.0])
+
+
+def test_tiered():
+    model = com.TieredCommissionModel([(0, .01), (1000, .005)])
+    dates = [dt.datetime(2017, 1, 3), dt.datetime(2017, 1, 4),
+             dt.datetime(2017, 1, 5)]
+
+    commission = model.calculate_many([600, 600, 100], [1, 1, 1], dates)
+    # the second fill is still in the first tier, it only starts after it.
+    np.testing.assert_allclose(commission, [6.0, 6.0, .5])
+    assert model.monthly_volume == 1300
+
+    # the volume carries over to the next call.
+    commission = model.calculate_many([100], [1],
+                                      [dt.datetime(2017, 1, 6)])
+    np.testing.assert_allclose(commission, [.5])
+
+    # and starts over in a new month, even within one call.
+    dates = [dt.datetime(2017, 1, 31), dt.datetime(2017, 2, 1),
+             dt.datetime(2017, 2, 2)]
+    commission = model.calculate_many([100, 900, 100], [1, 1, 1], dates)
+    np.testing.assert_allclose(commission, [.5, 9.0, 1.0])
+    assert model.monthly_volume == 1000
+
+
+def test_tiered_matches_one_at_a_time():
+    rs = np.random.RandomState(0)
+    qty = rs.randint(1, 50000, 500)
+    dates = [dt.datetime(2017, 1, 1) + dt.timedelta(hours=4 * i)
+             for i in range(len(qty))]
+    batch = com.TieredCommissionModel().calculate_many(qty, qty, dates)
+
+    model = com.TieredCommissionModel()
+    one_at_a_time = [model.calculate_many([q], [q], [d])[0]
+                     for q, d in zip(qty, dates)]
+
+    np.testing.assert_allclose(batch, one_at_a_time)
+
+
+def test_tiered_bad_tiers():
+    with pytest.raises(ValueError):
+        com.TieredCommissionModel([(100, .01)])
+
+
+def test_capped():
+    model = com.CappedCommissionModel(com.PerShareCommissionModel(.005),
+                                      minimum=1.0, maximum_rate=.01)
+    commission = model.calculate_many([10, 1000, 100], [1.0, 50.0, 50.0],
+                                      paid=[0.0, 0.0, 1.0])
+
+    # the minimum is capped by the rate, and counts what the order paid.
+    np.testing.assert_allclose(commission, [.1, 5.0, .5])
+
+    model = com.CappedCommissionModel(com.PercentCommissionModel(.01),
+                                      maximum=3.0)
+    order = ord.MarketOrder('AAPL', TradeAction.SELL, 100)
+    assert model.calculate(order, 10.0) == 3.0
+    assert model.calculate(order, 10.0, qty=10) == pytest.approx(1.0)
+
+    with pytest.raises(TypeError):
+        com.CappedCommissionModel(object())
+
+
+def test_calculate_only():
+    class HalfPercent(com.AbstractCommissionModel):
+        def calculate(self, order, execution_price):
+            return abs(order.qty) * execution_price * .005
+
+    model = HalfPercent()
+    order = ord.MarketOrder('AAPL', TradeAction.BUY, 100)
+
+    assert model.calculate(order, 10.0) == pytest.approx(5.0)
+    np.testing.assert_allclose(
+            model.calculate_many([100, -200], [10.0, 50.0]), [5.0, 50.0])
+
+    with pytest.raises(NotImplementedError):
+        com.AbstractCommissionModel().calculate(order, 10.0)
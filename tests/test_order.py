@@ -0,0 +1,89 @@
+import datetime as dt
+import uuid
+
+import pandas as pd
+import pytest
+
+import pytech.trading.order as ord
+from pytech.utils.enums import OrderStatus, OrderSubType, TradeAction
+
+
+def test_order_ids():
+    first = ord.MarketOrder('AAPL', TradeAction.BUY, 10)
+    second = ord.LimitOrder('AAPL', TradeAction.BUY, 10, limit_price=100.0)
+
+    assert isinstance(first.id, int)
+    assert second.id > first.id
+    assert ord.MarketOrder('AAPL', TradeAction.BUY, 10,
+                           order_id='one').id == 'one'
+
+
+def test_skip_past():
+    ids = ord.OrderIds()
+    ids()
+    ids.skip_past(10)
+    ids.skip_past(5)
+    ids.skip_past('one')
+
+    assert ids() == 11
+
+
+def test_uuid():
+    order = ord.MarketOrder('AAPL', TradeAction.BUY, 10)
+    other = ord.MarketOrder('AAPL', TradeAction.BUY, 10)
+
+    assert order.uuid == order.uuid
+    assert order.uuid != other.uuid
+    assert len(order.uuid) == 32
+
+
+def test_restore():
+    order = ord.MarketOrder('AAPL', TradeAction.BUY, 10)
+    before = order.uuid
+    namespace = ord.next_order_id.namespace
+
+    # as if it was a new process.
+    ord.next_order_id.namespace = uuid.uuid4()
+    assert order.uuid != before
+
+    ord.next_order_id.restore(order.id + 10, namespace)
+    assert order.uuid == before
+    assert ord.MarketOrder('AAPL', TradeAction.BUY, 10).id == order.id + 11
+
+
+def test_slots():
+    order = ord.StopLimitOrder('AAPL', TradeAction.SELL, 10, stop_price=100.0,
+                               limit_price=98.0)
+
+    assert not hasattr(order, '__dict__')
+    assert order.logger is ord.logger
+
+    with pytest.raises(AttributeError):
+        order.not_an_attribute = 1
+
+
+def test_expires_at():
+    day = ord.LimitOrder('AAPL', TradeAction.BUY, 10, limit_price=100.0,
+                         created=dt.datetime(2017, 1, 3, 15))
+    gtc = ord.LimitOrder('AAPL', TradeAction.BUY, 10, limit_price=100.0,
+                         order_subtype=OrderSubType.GOOD_TIL_CANCELED,
+                         max_days_open=5, created=dt.datetime(2017, 1, 3))
+    aon = ord.MarketOrder('AAPL', TradeAction.BUY, 10,
+                          order_subtype=OrderSubType.ALL_OR_NONE)
+
+    assert day.expires_at() == pd.Timestamp('2017-01-03 21:00', tz='UTC')
+    # 5 days later is a Sunday.
+    assert gtc.expires_at() == pd.Timestamp('2017-01-09 21:00', tz='UTC')
+    assert aon.expires_at() is None
+
+
+def test_check_order_expiration():
+    order = ord.LimitOrder('AAPL', TradeAction.BUY, 10, limit_price=100.0,
+                           created=dt.datetime(2017, 1, 3, 15))
+
+    assert not order.check_order_expiration(dt.datetime(2017, 1, 3, 20))
+    assert order.status is OrderStatus.OPEN
+
+    assert order.check_order_expiration(dt.datetime(2017, 1, 4))
+    assert order.status is OrderStatus.CANCELLED
+    assert order.reason == 'Market closed without executing order.'
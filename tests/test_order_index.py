@@ -0,0 +1,147 @@
+import datetime as dt
+
+import numpy as np
+
+import pytech.trading.order as ord
+from pytech.trading.order_index import ExpiryQueue, OrderIndex
+from pytech.utils.enums import OrderStatus, TradeAction
+
+DT = dt.datetime(2017, 1, 3)
+
+
+def _ids(triggered):
+    return {order.id for order, _ in triggered}
+
+
+def test_check():
+    buy_limit = ord.LimitOrder('AAPL', TradeAction.BUY, 10,
+                               limit_price=100.0, order_id='buy_limit')
+    sell_stop = ord.StopOrder('AAPL', TradeAction.SELL, 10,
+                              stop_price=95.0, order_id='sell_stop')
+    buy_stop = ord.StopOrder('AAPL', TradeAction.BUY, 10,
+                             stop_price=110.0, order_id='buy_stop')
+    sell_limit = ord.LimitOrder('AAPL', TradeAction.SELL, 10,
+                                limit_price=105.0, order_id='sell_limit')
+    index = OrderIndex([buy_limit, sell_stop, buy_stop, sell_limit],
+                       capacity=1)
+
+    assert index.check(np.array([102.0]), DT) == []
+    assert len(index) == 4
+
+    triggered = index.check(np.array([99.0]), DT)
+    assert triggered == [(buy_limit, 99.0)]
+    assert buy_limit.limit_reached
+    assert buy_limit.last_updated == DT
+
+    # triggered orders keep being returned until they are no longer open.
+    triggered = index.check(np.array([111.0]), DT)
+    assert _ids(triggered) == {'buy_limit', 'buy_stop', 'sell_limit'}
+
+    buy_limit.filled = buy_limit.qty
+    triggered = index.check(np.array([90.0]), DT)
+    assert _ids(triggered) == {'buy_stop', 'sell_limit', 'sell_stop'}
+    assert len(index) == 3
+    assert 'buy_limit' in index
+
+
+def test_check_many_tickers():
+    index = OrderIndex()
+
+    for i, ticker in enumerate(('A', 'B', 'C')):
+        index.add(ord.StopOrder(ticker, TradeAction.SELL, 10,
+                                stop_price=10.0 * (i + 1), order_id=ticker))
+
+    triggered = index.check(np.array([9.0, 25.0, np.nan]), DT)
+    assert _ids(triggered) == {'A'}
+
+
+def test_check_only_crossed_orders():
+    orders = [ord.LimitOrder('AAPL', TradeAction.BUY, 10,
+                             limit_price=float(price), order_id=str(price))
+              for price in range(90, 100)]
+    index = OrderIndex(orders)
+
+    assert _ids(index.check(np.array([97.5]), DT)) == {'98', '99'}
+    assert len(index.books[0]) == 8
+    assert set(index.active) == {'98', '99'}
+    # the orders that weren't crossed are never looked at.
+    assert all(order.last_updated != DT for order in orders[:8])
+
+    index.discard(orders[9])
+    index.discard(orders[0])
+    assert len(index.books[0]) == 7
+    assert _ids(index.check(np.array([96.0]), DT)) == {'96', '97', '98'}
+
+
+def test_stop_limit():
+    order = ord.StopLimitOrder('AAPL', TradeAction.SELL, 10,
+                               stop_price=100.0, limit_price=98.0,
+                               order_id='one')
+    index = OrderIndex([order])
+
+    # the limit doesn't count before the stop is reached.
+    assert index.check(np.array([101.0]), DT) == []
+    assert not order.limit_reached
+
+    # the stop is reached but the price is under the limit.
+    assert index.check(np.array([97.0]), DT) == []
+    assert order.stop_reached
+    assert index.check(np.array([99.0]), DT) == [(order, 99.0)]
+
+
+def test_discard():
+    stop = ord.StopOrder('AAPL', TradeAction.SELL, 10, stop_price=95.0,
+                         order_id='one')
+    market = ord.MarketOrder('AAPL', TradeAction.BUY, 10, order_id='two')
+    limit = ord.LimitOrder('AAPL', TradeAction.BUY, 10, limit_price=80.0,
+                           order_id='three')
+    index = OrderIndex([stop, market, limit])
+
+    stop.cancel()
+    index.discard(stop)
+
+    assert len(index) == 2
+    assert index.check(np.array([90.0]), DT) == [(market, 90.0)]
+    assert index.get('one') is stop
+
+    market.status = OrderStatus.CANCELLED
+    assert index.check(np.array([90.0]), DT) == []
+    assert len(index) == 1
+    assert index.check(np.array([75.0]), DT) == [(limit, 75.0)]
+
+
+def test_remove():
+    market = ord.MarketOrder('AAPL', TradeAction.BUY, 10, order_id='one')
+    index = OrderIndex([market])
+
+    index.remove(market)
+
+    assert len(index) == 0
+    assert 'one' not in index
+    # removing it again does nothing.
+    index.remove(market)
+
+
+def test_prices_for():
+    index = OrderIndex([
+        ord.MarketOrder('MSFT', TradeAction.BUY, 10),
+        ord.MarketOrder('FB', TradeAction.BUY, 10),
+    ])
+    ticker_index = {'AAPL': 0, 'MSFT': 1}
+    prices = index.prices_for(np.array([1.0, 2.0]), ticker_index)
+
+    np.testing.assert_array_equal(prices, [2.0, np.nan])
+
+
+def test_expiry_queue():
+    orders = [ord.MarketOrder('AAPL', TradeAction.BUY, 10) for _ in range(4)]
+    queue = ExpiryQueue()
+
+    for expiry, order in zip((30, 10, 20, 10), orders):
+        queue.push(expiry, order)
+
+    assert queue.next_expiry == 10
+    assert queue.pop_expired(5) == []
+    assert queue.pop_expired(20) == [orders[1], orders[3], orders[2]]
+    assert len(queue) == 1
+    assert queue.next_expiry == 30
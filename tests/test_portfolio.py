@@ -1,5 +1,12 @@
+import pytest
+
 from pytech.backtest.event import MarketEvent
+from pytech.data.synthetic import SimulatedBars, SyntheticBars, make_tickers
+from pytech.fin.asset.owned_asset import OwnedAsset
 from pytech.fin.portfolio import BasicPortfolio, Portfolio
+from pytech.trading.blotter import Blotter
+from pytech.utils.enums import PersistencePolicy
+from pytech.utils.pandas_utils import ADJ_CLOSE_COL
 
 
 class TestPortfolio(object):
@@ -33,3 +40,55 @@ class TestBasicPortfolio(object):
         assert basic_portfolio.owned_assets == {}
         assert basic_portfolio.all_holdings_mv[0]['AAPL'] == 0.0
         basic_portfolio.update_timeindex(MarketEvent())
+        assert len(basic_portfolio.all_holdings_mv) == 3
+        assert basic_portfolio.total_value == basic_portfolio.cash
+
+        positions = basic_portfolio.positions_df
+        assert list(positions.columns) == ['shares', 'market_value']
+        assert len(positions) == 3 * len(basic_portfolio.ticker_list)
+
+
+class TestValuation(object):
+
+    @pytest.fixture
+    def portfolio(self, events):
+        bars = SyntheticBars(events, make_tickers(3), '2016-01-04',
+                             '2016-02-01')
+        blotter = Blotter(events)
+        blotter.bars = bars
+        bars.update_bars()
+        return BasicPortfolio(bars, events, '2016-01-04', blotter,
+                              persistence=PersistencePolicy.NONE)
+
+    def test_mark_to_market(self, portfolio):
+        portfolio.owned_assets = {
+            'SYN1': OwnedAsset('SYN1', 10, 'LONG', 100.0),
+        }
+        assert portfolio.shares.tolist() == [0, 10, 0]
+
+        portfolio.bars.update_bars()
+        portfolio.update_timeindex(MarketEvent())
+        price = portfolio.bars.get_latest_bar_value('SYN1', ADJ_CLOSE_COL)[-1]
+
+        assert portfolio.total_asset_mv == pytest.approx(10 * price)
+        assert portfolio.total_value == pytest.approx(portfolio.cash
+                                                      + 10 * price)
+        # the owned asset is only brought up to date when it is looked at.
+        asset = portfolio.owned_assets['SYN1']
+        assert asset.total_position_value == pytest.approx(10 * price)
+
+    def test_metrics_follow_the_bar_frequency(self, portfolio, events):
+        assert portfolio.metrics.periods_per_year == 252
+
+        bars = SimulatedBars(events, make_tickers(3), '2016-01-04',
+                             '2016-02-01', freq='30min')
+        blotter = Blotter(events)
+        blotter.bars = bars
+        bars.update_bars()
+        intraday = BasicPortfolio(bars, events, '2016-01-04', blotter,
+                                  persistence=PersistencePolicy.NONE)
+
+        # 13 half hour bars a session.
+        assert intraday.metrics.periods_per_year == 252 * 13
+        assert intraday.track_metrics(
+                periods_per_year=12).periods_per_year == 12
@@ -0,0 +1,55 @@
+import pytest
+
+from pytech.backtest.profiling import Profiler, TimedMethod
+
+
+class _Phases(object):
+    def work(self, x):
+        return x * 2
+
+    def handle(self, event_name):
+        return self.work(1)
+
+
+class TestProfiler(object):
+
+    def test_wrap_and_unwrap(self):
+        phases = _Phases()
+        profiler = Profiler()
+        profiler.wrap(phases, 'work')
+        assert isinstance(phases.work, TimedMethod)
+
+        # wrapping twice should be a no-op
+        profiler.wrap(phases, 'work')
+        assert not isinstance(phases.work.func, TimedMethod)
+
+        profiler.unwrap_all()
+        assert 'work' not in vars(phases)
+
+    def test_report(self):
+        phases = _Phases()
+        profiler = Profiler()
+        profiler.wrap(phases, 'work')
+        profiler.wrap(phases, 'handle', key=lambda e: f'event.{e}')
+        profiler.start()
+
+        for i in range(10):
+            profiler.start_bar()
+            phases.handle('market')
+            if i % 2:
+                phases.handle('signal')
+            profiler.end_bar()
+
+        profiler.stop()
+        report = profiler.report()
+
+        assert report.bars == 10
+        assert report.events == 15
+        assert report.phases.loc['work', 'calls'] == 15
+        assert report.phases.loc['event.signal', 'calls'] == 5
+        assert report.events_per_sec > 0
+        assert 'work' not in vars(phases)
+
+    def test_bad_mode(self):
+        with pytest.raises(ValueError):
+            Profiler('not a mode')
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from pytech.backtest.scheduler import (EverySession, MarketClose, MarketOpen,
+                                       MonthEnd, MonthStart, Scheduler)
+from pytech.utils.dt_utils import NYSE
+
+
+def _run(scheduler, bars):
+    for bar in bars:
+        scheduler.fire(bar)
+
+
+def _sessions(start, end):
+    return NYSE.schedule(start_date=start, end_date=end).index
+
+
+class TestScheduler(object):
+
+    def test_month_start_and_end(self):
+        scheduler = Scheduler()
+        starts, ends = [], []
+        scheduler.schedule(starts.append, MonthStart())
+        scheduler.schedule(ends.append, MonthEnd())
+        scheduler.start('2016-03-10', '2016-06-15')
+        _run(scheduler, _sessions('2016-03-10', '2016-06-15'))
+
+        assert [d.strftime('%Y-%m-%d') for d in starts] == [
+            '2016-04-01', '2016-05-02', '2016-06-01']
+        assert [d.strftime('%Y-%m-%d') for d in ends] == [
+            '2016-03-31', '2016-04-29', '2016-05-31']
+
+    def test_every_n_sessions(self):
+        scheduler = Scheduler()
+        calls = []
+        scheduler.schedule(calls.append, EverySession(5, offset=1))
+        scheduler.start('2016-03-10', '2016-06-15')
+        sessions = _sessions('2016-03-10', '2016-06-15')
+        _run(scheduler, sessions)
+
+        assert list(calls) == list(sessions[1::5])
+
+    def test_intraday_time_rules(self):
+        scheduler = Scheduler(intraday=True)
+        opens, closes = [], []
+        scheduler.schedule(opens.append, time_rule=MarketOpen(minutes=30))
+        scheduler.schedule(closes.append, time_rule=MarketClose(minutes=30))
+        scheduler.start('2016-03-10', '2016-03-12')
+        bars = pd.date_range('2016-03-10 14:30', '2016-03-11 21:00',
+                             freq='30min', tz='UTC')
+        _run(scheduler, bars)
+
+        assert [d.strftime('%d %H:%M') for d in opens] == ['10 15:00',
+                                                           '11 15:00']
+        assert [d.strftime('%d %H:%M') for d in closes] == ['10 20:30',
+                                                            '11 20:30']
+
+    def test_missed_triggers_fire_once(self):
+        scheduler = Scheduler()
+        calls = []
+        scheduler.schedule(calls.append)
+        scheduler.start('2016-03-10', '2016-03-31')
+        scheduler.fire('2016-03-31')
+
+        assert len(calls) == 1
+        assert scheduler.fire('2016-03-31') == 0
+
+    def test_after(self):
+        scheduler = Scheduler()
+        calls = []
+        scheduler.schedule(calls.append, MonthStart())
+        scheduler.start('2016-01-04', '2016-06-15', after='2016-04-01')
+        _run(scheduler, _sessions('2016-04-01', '2016-06-15'))
+
+        assert len(calls) == 2
+
+    def test_bad_every_session(self):
+        with pytest.raises(ValueError):
+            EverySession(0)
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from pytech.trading.sessions import SessionTable
+from pytech.utils.dt_utils import NYSE
+
+
+def _ts(s):
+    return pd.Timestamp(s, tz='UTC')
+
+
+def test_next_close():
+    sessions = SessionTable(NYSE)
+
+    assert sessions.next_close('2017-01-03 15:00') == _ts('2017-01-03 21:00')
+    # after the close the next session's close is used.
+    assert sessions.next_close('2017-01-03 22:00') == _ts('2017-01-04 21:00')
+    # over a weekend and Martin Luther King Jr. Day.
+    assert sessions.next_close('2017-01-14') == _ts('2017-01-17 21:00')
+
+
+def test_grows():
+    sessions = SessionTable(NYSE, chunk=pd.Timedelta(days=10))
+    sessions.next_close('2017-01-03')
+    built = len(sessions)
+
+    assert sessions.next_close('2017-06-01 12:00') == _ts('2017-06-01 20:00')
+    assert sessions.next_close('2016-12-30') == _ts('2016-12-30 21:00')
+    assert len(sessions) > built
+
+
+def test_is_open():
+    sessions = SessionTable(NYSE)
+
+    assert sessions.is_open('2017-01-03 15:00')
+    assert not sessions.is_open('2017-01-03 22:00')
+    assert not sessions.is_open('2017-01-07 15:00')
+
+
+def test_for_calendar():
+    assert SessionTable.for_calendar() is SessionTable.for_calendar(NYSE)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pytech.trading.order as ord
+import pytech.trading.slippage as slip
+from pytech.utils.enums import TradeAction
+
+QTY = np.array([100, -100, 300, 50])
+PRICE = np.array([10.0, 20.0, 10.0, 30.0])
+VOLUME = np.array([10000, 10000, 10000, np.nan])
+HIGH = np.array([11.0, 21.0, 11.0, 31.0])
+LOW = np.array([9.0, 19.0, 9.0, 29.0])
+TICKER = np.array([0, 1, 0, 2])
+
+
+def test_no_slippage():
+    price, qty = slip.NoSlippage().fill(QTY, PRICE, VOLUME, HIGH, LOW)
+
+    np.testing.assert_array_equal(price, PRICE)
+    np.testing.assert_array_equal(qty, QTY)
+
+
+def test_fixed_bps():
+    model = slip.FixedBasisPointsSlippage(bps=10)
+    price, qty = model.fill(QTY, PRICE)
+
+    np.testing.assert_allclose(price, PRICE * [1.001, .999, 1.001, 1.001])
+    np.testing.assert_array_equal(qty, QTY)
+
+
+def test_volume_limit_is_shared():
+    model = slip.FixedBasisPointsSlippage(bps=0, volume_limit=.025)
+    _, qty = model.fill(QTY, PRICE, VOLUME, ticker=TICKER)
+
+    # 250 shares of ticker 0 can be filled, the first order comes first.
+    np.testing.assert_array_equal(qty, [100, -100, 150, 50])
+    assert model.volume_in_tick == 400
+
+    _, qty = model.fill(QTY, PRICE, VOLUME)
+    np.testing.assert_array_equal(qty, [100, -100, 250, 50])
+
+
+def test_volume_share():
+    model = slip.VolumeShareSlippage(volume_limit=.025, price_impact=.1)
+    price, qty = model.fill(QTY, PRICE, VOLUME, ticker=TICKER)
+
+    assert price[0] == pytest.approx(10 * (1 + .1 * .01 ** 2))
+    assert price[1] == pytest.approx(20 * (1 - .1 * .01 ** 2))
+    # no volume, no impact.
+    assert price[3] == 30.0
+
+
+def test_square_root_impact():
+    model = slip.SquareRootImpactSlippage(impact=1.0, volume_limit=.1)
+    price, _ = model.fill(QTY, PRICE, VOLUME, HIGH, LOW)
+
+    assert price[0] == pytest.approx(10 + 2 * np.sqrt(.01))
+    assert price[1] == pytest.approx(20 - 2 * np.sqrt(.01))
+    assert price[3] == 30.0
+
+
+def test_spread():
+    price, _ = slip.SpreadSlippage(range_fraction=.1).fill(
+            QTY, PRICE, VOLUME, HIGH, LOW)
+    np.testing.assert_allclose(price, PRICE + [.1, -.1, .1, .1])
+
+    price, _ = slip.SpreadSlippage(spread_bps=20).fill(QTY, PRICE)
+    np.testing.assert_allclose(price, PRICE * [1.001, .999, 1.001, 1.001])
+
+
+def test_process_order():
+    order = ord.MarketOrder('AAPL', TradeAction.SELL, 500)
+    bar = pd.Series({'close': 10.0, 'high': 11.0, 'low': 9.0,
+                     'volume': 10000})
+    model = slip.FixedBasisPointsSlippage(bps=10, volume_limit=.025)
+
+    assert model.process_order(bar, order) == (pytest.approx(9.99), -250)
+
+
+def test_bad_volume_limit():
+    with pytest.raises(ValueError):
+        slip.VolumeShareSlippage(volume_limit=2)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pytech.trading.trade_log import TradeLog
+
+
+@pytest.fixture
+def log():
+    log = TradeLog(capacity=2)
+    log.append('2017-01-03', 'AAPL', 1, 10, 100.0, 100.1, 1.0, 1)
+    log.append('2017-01-04', 'MSFT', -1, 5, 50.0, 49.9, .5, 'two')
+    log.append('2017-01-05', 'AAPL', -1, 4, 110.0, 109.9, .4, 3)
+    return log
+
+
+def test_append(log):
+    assert len(log) == 3
+    assert log.capacity >= 3
+    assert log.tickers == ['AAPL', 'MSFT']
+    np.testing.assert_array_equal(log.signed_qty, [10, -5, -4])
+    assert list(log.order_ids()) == [1, 'two', 3]
+    assert log.dates[0] == pd.Timestamp('2017-01-03', tz='UTC')
+
+
+def test_to_frame(log):
+    df = log.to_frame()
+
+    assert list(df['ticker']) == ['AAPL', 'MSFT', 'AAPL']
+    assert df['commission'].sum() == pytest.approx(1.9)
+
+
+def test_by_ticker(log):
+    df = log.by_ticker({'AAPL': 120.0, 'MSFT': 40.0})
+
+    assert df.loc['AAPL', 'net_qty'] == 6
+    assert df.loc['AAPL', 'cash'] == pytest.approx(-1001 + 439.6)
+    assert df.loc['AAPL', 'pnl'] == pytest.approx(-561.4 + 720)
+    assert df.loc['MSFT', 'pnl'] == pytest.approx(249.5 - 200)
+    assert log.turnover() == pytest.approx(1000 + 250 + 440)
+
+
+def test_rows_since_and_extend(log):
+    other = TradeLog()
+    other.append('2017-01-02', 'FB', 1, 1, 1.0, 1.0, 0.0, 'one')
+    other.extend(log.rows_since(1))
+
+    assert len(other) == 3
+    assert list(other.to_frame()['ticker']) == ['FB', 'MSFT', 'AAPL']
+    assert list(other.order_ids()) == ['one', 'two', 3]
+
+
+def test_to_arrow(log):
+    pytest.importorskip('pyarrow')
+    table = log.to_arrow()
+
+    assert table.num_rows == 3
+    assert table.column('qty').to_pylist() == [10, 5, 4]
+    assert table.column('ticker').to_pylist() == ['AAPL', 'MSFT', 'AAPL']
+
+    # appending doesn't change what was exported.
+    log.append('2017-01-06', 'FB', 1, 1, 1.0, 1.0, 0.0, 4)
+    assert table.num_rows == 3